@@ -0,0 +1,72 @@
+"""白板接口 JSON 与 MessagePack 编码对比
+
+生成与 /api/whiteboard/all 相同结构的数据，比较两种编码的体积与编解码耗时：
+    python app-for-test/bench_msgpack.py --items 200 --rounds 500
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+import msgpack
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.time_utils import format_china_time, to_epoch
+
+def build_payload(count, timestamps):
+    convert = to_epoch if timestamps == 'epoch' else format_china_time
+    now = datetime(2024, 1, 10, 8, 0, 0)
+    data = []
+    for i in range(count):
+        created_at = now - timedelta(minutes=i)
+        data.append({
+            'type': 'task',
+            'id': i + 1,
+            'title': f'任务 {i + 1}',
+            'description': '完成课本第 3 章练习题，并在课前提交',
+            'priority': i % 3 + 1,
+            'action_id': 0,
+            'due_date': convert(created_at + timedelta(days=1)),
+            'is_acknowledged': i % 2 == 0,
+            'is_completed': i % 5 == 0,
+            'created_at': convert(created_at)
+        })
+    return {'success': True, 'data': data, 'count': count}
+
+def bench(name, encode, decode, payload, rounds):
+    encoded = encode(payload)
+    encode_time = timeit.timeit(lambda: encode(payload), number=rounds) / rounds
+    decode_time = timeit.timeit(lambda: decode(encoded), number=rounds) / rounds
+    print(f'{name:<10} {len(encoded):>10} 字节 {encode_time * 1e6:>10.1f} us {decode_time * 1e6:>10.1f} us')
+    return len(encoded)
+
+def main():
+    parser = argparse.ArgumentParser(description='JSON / MessagePack 编码对比')
+    parser.add_argument('--items', type=int, default=200, help='条目数')
+    parser.add_argument('--rounds', type=int, default=500, help='重复次数')
+    args = parser.parse_args()
+
+    json_payload = build_payload(args.items, 'string')
+    msgpack_payload = build_payload(args.items, 'epoch')
+
+    print(f'{"编码":<10} {"体积":>13} {"编码耗时":>10} {"解码耗时":>10}')
+    json_size = bench(
+        'JSON',
+        lambda data: json.dumps(data).encode('utf-8'),
+        json.loads,
+        json_payload,
+        args.rounds
+    )
+    msgpack_size = bench(
+        'MessagePack',
+        lambda data: msgpack.packb(data, use_bin_type=True),
+        lambda data: msgpack.unpackb(data, raw=False),
+        msgpack_payload,
+        args.rounds
+    )
+    print(f'体积减少 {(1 - msgpack_size / json_size) * 100:.1f}%')
+
+if __name__ == '__main__':
+    main()
@@ -17,4 +17,16 @@ data = {
 }
 
 response = requests.post(url, headers=headers, files=files, data=data)
-print(response.json())
\ No newline at end of file
+print(response.json())
+
+# 删除刚上传的笔记，删除后再查询应返回 404
+note_id = response.json()["note_id"]
+note_url = f"http://localhost:5000/api/whiteboard/notes/{note_id}"
+
+response = requests.delete(note_url, headers=headers)
+print(response.status_code, response.json())
+assert response.status_code == 200, "删除笔记失败"
+
+response = requests.get(note_url, headers=headers)
+assert response.status_code == 404, "笔记删除后仍然存在"
+print("笔记删除成功")
\ No newline at end of file
@@ -37,6 +37,8 @@ def create_app():
         from blueprints.notes import notes_bp
         from blueprints.web_notes import web_notes_bp
         from blueprints.developer import developer_bp
+        from blueprints.broadcasts import broadcasts_bp
+        from blueprints.search import search_bp
 
         app.register_blueprint(auth_bp)
         app.register_blueprint(main_bp)
@@ -50,11 +52,65 @@ def create_app():
         app.register_blueprint(notes_bp)
         app.register_blueprint(web_notes_bp)
         app.register_blueprint(developer_bp)
+        app.register_blueprint(broadcasts_bp)
+        app.register_blueprint(search_bp)
+
+    # 初始化上传目录核对
+    from utils.reconciler import reconciler
+    reconciler.init_app(app)
 
     # 初始化定时任务
     from utils.scheduler import scheduler_manager
     scheduler_manager.init_app(app)
 
+    # 初始化白板连接准入控制
+    from utils.connect_admission import connect_admission
+    connect_admission.init_app(app)
+
+    # 初始化实时事件流
+    from utils.event_stream import event_stream
+    event_stream.init_app(app)
+
+    # 初始化Socket.IO出站队列
+    from utils.outbound_queue import outbound_queue
+    outbound_queue.init_app(app)
+
+    # 初始化笔记文件存储
+    from utils.storage import storage
+    storage.init_app(app)
+
+    # 初始化笔记分片上传
+    from utils.chunked_upload import chunked_uploads
+    chunked_uploads.init_app(app)
+
+    # 初始化Socket事件分发器
+    from utils.emit_dispatcher import emit_dispatcher
+    emit_dispatcher.init_app(app)
+
+    # 初始化笔记缩略图生成
+    from utils.thumbnails import thumbnails
+    thumbnails.init_app(app)
+
+    # 初始化笔记下载计数缓冲
+    from utils.download_counter import download_counter
+    download_counter.init_app(app)
+
+    # 初始化分页总数缓存
+    from utils.pagination import count_cache
+    count_cache.init_app(app)
+
+    # 初始化全文搜索索引
+    from utils.search_index import search_index
+    search_index.init_app(app)
+
+    # 初始化笔记存储配额
+    from utils.note_quota import note_quota
+    note_quota.init_app(app)
+
+    # 初始化笔记上传后处理队列
+    from utils.note_jobs import note_jobs
+    note_jobs.init_app(app)
+
     # 注册错误处理器
     from utils.error_handlers import register_error_handlers
     register_error_handlers(app)
@@ -70,4 +126,6 @@ from models import *
 from events import socketio_events
 
 if __name__ == '__main__':
+    from utils.note_jobs import note_jobs
+    note_jobs.start_workers()
     socketio.run(app, debug=True)
\ No newline at end of file
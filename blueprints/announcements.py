@@ -1,9 +1,10 @@
 from flask import Blueprint, request, jsonify, session
-from extensions import db, socketio
+from extensions import db
 from models.user import User
 from models.whiteboard import Whiteboard
 from models.announcement import Announcement
 from utils.auth_utils import login_required, teacher_required
+from utils.emit_dispatcher import emit_dispatcher
 from utils.time_utils import format_china_time
 
 announcements_bp = Blueprint('announcements', __name__)
@@ -36,18 +37,20 @@ def create_announcement(whiteboard_id):
     
     try:
         db.session.add(announcement)
-        db.session.commit()
+        db.session.flush()
         
-        socketio.emit('new_announcement', {
+        emit_dispatcher.emit_stream(f"whiteboard_{whiteboard_id}", 'new_announcement', {
             'id': announcement.id,
             'title': announcement.title,
             'content': announcement.content,
             'is_long_term': announcement.is_long_term,
-            'created_at': format_china_time(announcement.created_at),
+            'created_at': announcement.created_at,
             'teacher_name': announcement.teacher.username
-        }, room=f"whiteboard_{whiteboard_id}")
+        })
+        announcement_id = announcement.id
+        db.session.commit()
         
-        return jsonify({'success': True, 'announcement_id': announcement.id})
+        return jsonify({'success': True, 'announcement_id': announcement_id})
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': '创建公告失败'}), 500
@@ -65,8 +68,8 @@ def delete_announcement(announcement_id):
     try:
         whiteboard_id = announcement.whiteboard_id
         db.session.delete(announcement)
+        emit_dispatcher.emit_stream(f"whiteboard_{whiteboard_id}", 'delete_announcement', {'announcement_id': announcement_id})
         db.session.commit()
-        socketio.emit('delete_announcement', {'announcement_id': announcement_id}, room=f"whiteboard_{whiteboard_id}")
         return jsonify({'success': True})
     except Exception as e:
         db.session.rollback()
@@ -1,6 +1,6 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from datetime import timedelta
-from extensions import db, socketio
+from extensions import db
 from models.user import User
 from models.whiteboard import Whiteboard, WhiteboardStatusHistory
 from models.developer import DeveloperApp
@@ -8,72 +8,123 @@ from models.task import Task
 from models.assignment import Assignment
 from models.announcement import Announcement
 from utils.auth_utils import whiteboard_auth_required, user_token_auth_required
-from utils.time_utils import parse_china_time, format_china_time, get_china_time
+from utils.emit_dispatcher import emit_dispatcher
+from utils.serialization import api_response
+from utils.field_selection import FieldSpec, column, parse_fields
+from utils.time_utils import format_china_time, format_china_date, get_china_time, parse_date_range, group_by_day
 
 api_bp = Blueprint('api', __name__, url_prefix='/api/whiteboard')
 
+# 白板接口可通过 fields= 选择返回的字段
+ASSIGNMENT_FIELDS = FieldSpec(Assignment, {
+    'id': column('id'),
+    'title': column('title'),
+    'description': column('description'),
+    'subject': column('subject'),
+    'due_date': column('due_date'),
+    'created_at': column('created_at')
+})
+
+TASK_FIELDS = FieldSpec(Task, {
+    'id': column('id'),
+    'title': column('title'),
+    'description': column('description'),
+    'priority': column('priority'),
+    'action_id': column('action_id'),
+    'due_date': column('due_date'),
+    'is_acknowledged': column('is_acknowledged'),
+    'is_completed': column('is_completed'),
+    'created_at': column('created_at')
+})
+
+ANNOUNCEMENT_FIELDS = FieldSpec(Announcement, {
+    'id': column('id'),
+    'title': column('title'),
+    'content': column('content'),
+    'is_long_term': column('is_long_term'),
+    'created_at': column('created_at')
+})
+
+def parse_feed_range():
+    """解析 date= 或 from=/to= 参数，返回 (开始时间, 结束时间, 是否为范围查询)"""
+    return parse_date_range(
+        request.args.get('date'),
+        request.args.get('from'),
+        request.args.get('to'),
+        current_app.config.get('FEED_MAX_RANGE_DAYS', 31)
+    )
+
+def feed_payload(rows, start, end, ranged, **extra):
+    """生成列表响应；范围查询时按天分组返回
+
+    rows 为按输出顺序排列的 (分组时间, 数据) 列表。
+    """
+    payload = {'success': True}
+    if ranged:
+        payload['from'] = format_china_date(start)
+        payload['to'] = format_china_date(end - timedelta(days=1))
+        payload['days'] = group_by_day(rows, start, end)
+    else:
+        payload['data'] = [item for _, item in rows]
+    payload['count'] = len(rows)
+    payload.update(extra)
+    return payload
+
 @api_bp.route('/assignments', methods=['GET'])
 @whiteboard_auth_required
 def get_whiteboard_assignments():
-    date_str = request.args.get('date')
     subject = request.args.get('subject')
     
+    names, cache_key, error = parse_fields(request.args.get('fields'), ASSIGNMENT_FIELDS)
+    if error:
+        return jsonify({'error': error}), 400
+    selected = ASSIGNMENT_FIELDS.resolve(names)
+    
+    try:
+        start, end, ranged = parse_feed_range()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
     query = Assignment.query.filter_by(whiteboard_id=request.whiteboard.id)
     
-    if date_str:
-        try:
-            target_date = parse_china_time(date_str + ' 00:00:00')
-            next_date = target_date + timedelta(days=1)
-            
-            query = query.filter(
-                Assignment.due_date >= target_date,
-                Assignment.due_date < next_date
-            )
-        except ValueError:
-            return jsonify({'error': '日期格式无效，请使用YYYY-MM-DD格式'}), 400
+    if start:
+        query = query.filter(
+            Assignment.due_date >= start,
+            Assignment.due_date < end
+        )
     
     if subject:
         query = query.filter(Assignment.subject == subject)
     
-    assignments = query.order_by(Assignment.created_at.desc()).all()
-    
-    assignments_data = []
-    for assignment in assignments:
-        assignments_data.append({
-            'id': assignment.id,
-            'title': assignment.title,
-            'description': assignment.description,
-            'subject': assignment.subject,
-            'due_date': format_china_time(assignment.due_date),
-            'created_at': format_china_time(assignment.created_at)
-        })
+    assignments = query.options(*ASSIGNMENT_FIELDS.options(selected, extra_columns=('due_date',))).order_by(Assignment.created_at.desc()).all()
     
-    return jsonify({
-        'success': True,
-        'data': assignments_data,
-        'count': len(assignments_data)
-    })
+    rows = [(assignment.due_date, ASSIGNMENT_FIELDS.serialize(assignment, selected)) for assignment in assignments]
+    
+    return api_response(feed_payload(rows, start, end, ranged), cache_key=cache_key)
 
 @api_bp.route('/tasks', methods=['GET'])
 @whiteboard_auth_required
 def get_whiteboard_tasks():
-    date_str = request.args.get('date')
     priority = request.args.get('priority')
     status = request.args.get('status')
     
+    names, cache_key, error = parse_fields(request.args.get('fields'), TASK_FIELDS)
+    if error:
+        return jsonify({'error': error}), 400
+    selected = TASK_FIELDS.resolve(names)
+    
+    try:
+        start, end, ranged = parse_feed_range()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
     query = Task.query.filter_by(whiteboard_id=request.whiteboard.id)
     
-    if date_str:
-        try:
-            target_date = parse_china_time(date_str + ' 00:00:00')
-            next_date = target_date + timedelta(days=1)
-            
-            query = query.filter(
-                Task.created_at >= target_date,
-                Task.created_at < next_date
-            )
-        except ValueError:
-            return jsonify({'error': '日期格式无效，请使用YYYY-MM-DD格式'}), 400
+    if start:
+        query = query.filter(
+            Task.created_at >= start,
+            Task.created_at < end
+        )
     
     if priority and priority.isdigit():
         query = query.filter(Task.priority == int(priority))
@@ -83,47 +134,34 @@ def get_whiteboard_tasks():
     elif status == 'completed':
         query = query.filter(Task.is_completed == True)
     
-    tasks = query.order_by(Task.created_at.desc()).all()
+    tasks = query.options(*TASK_FIELDS.options(selected, extra_columns=('created_at',))).order_by(Task.created_at.desc()).all()
     
-    tasks_data = []
-    for task in tasks:
-        tasks_data.append({
-            'id': task.id,
-            'title': task.title,
-            'description': task.description,
-            'priority': task.priority,
-            'action_id': task.action_id,
-            'due_date': format_china_time(task.due_date) if task.due_date else None,
-            'is_acknowledged': task.is_acknowledged,
-            'is_completed': task.is_completed,
-            'created_at': format_china_time(task.created_at)
-        })
+    rows = [(task.created_at, TASK_FIELDS.serialize(task, selected)) for task in tasks]
     
-    return jsonify({
-        'success': True,
-        'data': tasks_data,
-        'count': len(tasks_data)
-    })
+    return api_response(feed_payload(rows, start, end, ranged), cache_key=cache_key)
 
 @api_bp.route('/announcements', methods=['GET'])
 @whiteboard_auth_required
 def get_whiteboard_announcements():
-    date_str = request.args.get('date')
     long_term = request.args.get('long_term')
     
+    names, cache_key, error = parse_fields(request.args.get('fields'), ANNOUNCEMENT_FIELDS)
+    if error:
+        return jsonify({'error': error}), 400
+    selected = ANNOUNCEMENT_FIELDS.resolve(names)
+    
+    try:
+        start, end, ranged = parse_feed_range()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
     query = Announcement.query.filter_by(whiteboard_id=request.whiteboard.id)
     
-    if date_str:
-        try:
-            target_date = parse_china_time(date_str + ' 00:00:00')
-            next_date = target_date + timedelta(days=1)
-            
-            query = query.filter(
-                Announcement.created_at >= target_date,
-                Announcement.created_at < next_date
-            )
-        except ValueError:
-            return jsonify({'error': '日期格式无效，请使用YYYY-MM-DD格式'}), 400
+    if start:
+        query = query.filter(
+            Announcement.created_at >= start,
+            Announcement.created_at < end
+        )
     
     if long_term is not None:
         if long_term.lower() == 'true':
@@ -131,108 +169,58 @@ def get_whiteboard_announcements():
         elif long_term.lower() == 'false':
             query = query.filter(Announcement.is_long_term == False)
     
-    announcements = query.order_by(Announcement.created_at.desc()).all()
+    announcements = query.options(*ANNOUNCEMENT_FIELDS.options(selected, extra_columns=('created_at',))).order_by(Announcement.created_at.desc()).all()
     
-    announcements_data = []
-    for announcement in announcements:
-        announcements_data.append({
-            'id': announcement.id,
-            'title': announcement.title,
-            'content': announcement.content,
-            'is_long_term': announcement.is_long_term,
-            'created_at': format_china_time(announcement.created_at)
-        })
+    rows = [(announcement.created_at, ANNOUNCEMENT_FIELDS.serialize(announcement, selected)) for announcement in announcements]
     
-    return jsonify({
-        'success': True,
-        'data': announcements_data,
-        'count': len(announcements_data)
-    })
+    return api_response(feed_payload(rows, start, end, ranged), cache_key=cache_key)
 
 @api_bp.route('/all', methods=['GET'])
 @whiteboard_auth_required
 def get_whiteboard_all():
-    date_str = request.args.get('date')
-    
-    tasks_query = Task.query.filter_by(whiteboard_id=request.whiteboard.id)
-    announcements_query = Announcement.query.filter_by(whiteboard_id=request.whiteboard.id)
-    assignments_query = Assignment.query.filter_by(whiteboard_id=request.whiteboard.id)
-    
-    if date_str:
-        try:
-            target_date = parse_china_time(date_str + ' 00:00:00')
-            next_date = target_date + timedelta(days=1)
-            
-            tasks_query = tasks_query.filter(
-                Task.created_at >= target_date,
-                Task.created_at < next_date
-            )
-            
-            announcements_query = announcements_query.filter(
-                Announcement.created_at >= target_date,
-                Announcement.created_at < next_date
-            )
-            
-            assignments_query = assignments_query.filter(
-                Assignment.due_date >= target_date,
-                Assignment.due_date < next_date
-            )
-        except ValueError:
-            return jsonify({'error': '日期格式无效，请使用YYYY-MM-DD格式'}), 400
-    
-    tasks = tasks_query.order_by(Task.created_at.desc()).all()
-    announcements = announcements_query.order_by(Announcement.created_at.desc()).all()
-    assignments = assignments_query.order_by(Assignment.created_at.desc()).all()
-    
-    tasks_data = []
-    for task in tasks:
-        tasks_data.append({
-            'type': 'task',
-            'id': task.id,
-            'title': task.title,
-            'description': task.description,
-            'priority': task.priority,
-            'action_id': task.action_id,
-            'due_date': format_china_time(task.due_date) if task.due_date else None,
-            'is_acknowledged': task.is_acknowledged,
-            'is_completed': task.is_completed,
-            'created_at': format_china_time(task.created_at)
-        })
-    
-    announcements_data = []
-    for announcement in announcements:
-        announcements_data.append({
-            'type': 'announcement',
-            'id': announcement.id,
-            'title': announcement.title,
-            'content': announcement.content,
-            'is_long_term': announcement.is_long_term,
-            'created_at': format_china_time(announcement.created_at)
-        })
-    
-    assignments_data = []
-    for assignment in assignments:
-        assignments_data.append({
-            'type': 'assignment',
-            'id': assignment.id,
-            'title': assignment.title,
-            'description': assignment.description,
-            'subject': assignment.subject,
-            'due_date': format_china_time(assignment.due_date),
-            'created_at': format_china_time(assignment.created_at)
-        })
+    names, cache_key, error = parse_fields(request.args.get('fields'), TASK_FIELDS, ANNOUNCEMENT_FIELDS, ASSIGNMENT_FIELDS)
+    if error:
+        return jsonify({'error': error}), 400
     
-    all_data = tasks_data + announcements_data + assignments_data
-    all_data.sort(key=lambda x: x['created_at'], reverse=True)
-    
-    return jsonify({
-        'success': True,
-        'data': all_data,
-        'count': len(all_data),
-        'tasks_count': len(tasks_data),
-        'announcements_count': len(announcements_data),
-        'assignments_count': len(assignments_data)
-    })
+    try:
+        start, end, ranged = parse_feed_range()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # 每类内容一次范围查询：任务和公告按创建时间，作业按截止时间
+    feeds = [
+        ('task', TASK_FIELDS, Task.created_at),
+        ('announcement', ANNOUNCEMENT_FIELDS, Announcement.created_at),
+        ('assignment', ASSIGNMENT_FIELDS, Assignment.due_date)
+    ]
+    
+    counts = {}
+    rows = []
+    for item_type, spec, day_column in feeds:
+        model = spec.model
+        query = model.query.filter_by(whiteboard_id=request.whiteboard.id)
+        if start:
+            query = query.filter(day_column >= start, day_column < end)
+        
+        # 按创建时间合并排序，created_at 未被选择时也需要加载
+        selected = spec.resolve(names)
+        options = spec.options(selected, extra_columns=('created_at', day_column.key))
+        items = query.options(*options).order_by(model.created_at.desc()).all()
+        counts[item_type] = len(items)
+        for item in items:
+            item_data = {'type': item_type}
+            item_data.update(spec.serialize(item, selected))
+            rows.append((item.created_at, getattr(item, day_column.key), item_data))
+    
+    rows.sort(key=lambda row: row[0], reverse=True)
+    
+    return api_response(feed_payload(
+        [(day, item_data) for _, day, item_data in rows],
+        start, end, ranged,
+        tasks_count=counts['task'],
+        announcements_count=counts['announcement'],
+        assignments_count=counts['assignment']
+    ), cache_key=cache_key)
 
 @api_bp.route('/tasks/<int:task_id>/acknowledge', methods=['POST'])
 @whiteboard_auth_required
@@ -247,14 +235,15 @@ def acknowledge_task(task_id):
     
     try:
         task.is_acknowledged = True
-        db.session.commit()
         
-        socketio.emit('task_updated', {
+        emit_dispatcher.emit('task_updated', {
             'id': task.id,
+            'whiteboard_id': task.whiteboard_id,
             'title': task.title,
             'is_acknowledged': task.is_acknowledged,
             'is_completed': task.is_completed
-        }, room=f"teacher_{task.whiteboard.class_obj.teacher_id}")
+        }, room=f"class_teachers_{task.whiteboard.class_id}", coalesce_key=f"task:{task.id}")
+        db.session.commit()
         
         return jsonify({'success': True})
     except Exception as e:
@@ -275,14 +264,15 @@ def complete_task(task_id):
     try:
         task.is_acknowledged = True
         task.is_completed = True
-        db.session.commit()
         
-        socketio.emit('task_updated', {
+        emit_dispatcher.emit('task_updated', {
             'id': task.id,
+            'whiteboard_id': task.whiteboard_id,
             'title': task.title,
             'is_acknowledged': task.is_acknowledged,
             'is_completed': task.is_completed
-        }, room=f"teacher_{task.whiteboard.class_obj.teacher_id}")
+        }, room=f"class_teachers_{task.whiteboard.class_id}", coalesce_key=f"task:{task.id}")
+        db.session.commit()
         
         return jsonify({'success': True})
     except Exception as e:
@@ -305,13 +295,12 @@ def whiteboard_heartbeat():
         )
         db.session.add(status_history)
         
-        db.session.commit()
-        
-        socketio.emit('whiteboard_status_update', {
+        emit_dispatcher.emit('whiteboard_status_update', {
             'whiteboard_id': whiteboard.id,
             'is_online': True,
             'last_heartbeat': format_china_time(current_time)
-        }, room=f"teacher_{whiteboard.class_obj.teacher_id}")
+        }, room=f"class_teachers_{whiteboard.class_id}", coalesce_key=f"whiteboard_status:{whiteboard.id}")
+        db.session.commit()
         
         return jsonify({'success': True, 'message': '心跳接收成功'})
     except Exception as e:
@@ -1,10 +1,11 @@
 from flask import Blueprint, request, jsonify, session
-from extensions import db, socketio
+from extensions import db
 from models.user import User
 from models.whiteboard import Whiteboard
 from models.assignment import Assignment
 from models.class_models import TeacherClass, ClassSubject
 from utils.auth_utils import login_required, teacher_required
+from utils.emit_dispatcher import emit_dispatcher
 from utils.time_utils import parse_datetime_local, parse_china_date, parse_china_time, format_china_time, get_china_time, format_china_date
 from utils.classworkskv_utils import ClassworksKVClient
 from datetime import timedelta
@@ -159,20 +160,21 @@ def create_assignment(whiteboard_id):
             
             # 更新白板同步时间
             whiteboard.classworkskv_last_sync = get_china_time().replace(tzinfo=None)
-            db.session.commit()
             
-            socketio.emit('new_assignment', {
+            emit_dispatcher.emit_stream(f"whiteboard_{whiteboard_id}", 'new_assignment', {
                 'id': assignment.id,
                 'title': assignment.title,
                 'description': assignment.description,
                 'subject': assignment.subject,
-                'due_date': format_china_time(assignment.due_date),
-                'created_at': format_china_time(assignment.created_at),
+                'due_date': assignment.due_date,
+                'created_at': assignment.created_at,
                 'teacher_name': assignment.teacher.username,
                 'storage_type': 'classworkskv'
-            }, room=f"whiteboard_{whiteboard_id}")
+            })
+            assignment_id = assignment.id
+            db.session.commit()
             
-            return jsonify({'success': True, 'assignment_id': assignment.id, 'storage_type': 'classworkskv'})
+            return jsonify({'success': True, 'assignment_id': assignment_id, 'storage_type': 'classworkskv'})
         else:
             # 使用Dlass存储
             today = get_china_time().replace(tzinfo=None)
@@ -195,20 +197,21 @@ def create_assignment(whiteboard_id):
                 existing_assignment.description = description
                 existing_assignment.due_date = due_date
                 existing_assignment.updated_at = get_china_time().replace(tzinfo=None)
-                db.session.commit()
                 
-                socketio.emit('update_assignment', {
+                emit_dispatcher.emit_stream(f"whiteboard_{whiteboard_id}", 'update_assignment', {
                     'id': existing_assignment.id,
                     'title': existing_assignment.title,
                     'description': existing_assignment.description,
                     'subject': existing_assignment.subject,
-                    'due_date': format_china_time(existing_assignment.due_date),
-                    'updated_at': format_china_time(existing_assignment.updated_at),
+                    'due_date': existing_assignment.due_date,
+                    'updated_at': existing_assignment.updated_at,
                     'teacher_name': existing_assignment.teacher.username,
                     'storage_type': 'local'
-                }, room=f"whiteboard_{whiteboard_id}")
+                })
+                assignment_id = existing_assignment.id
+                db.session.commit()
                 
-                return jsonify({'success': True, 'assignment_id': existing_assignment.id, 'is_update': True, 'storage_type': 'local'})
+                return jsonify({'success': True, 'assignment_id': assignment_id, 'is_update': True, 'storage_type': 'local'})
             else:
                 assignment = Assignment(
                     title=title,
@@ -219,20 +222,22 @@ def create_assignment(whiteboard_id):
                     teacher_id=user.id
                 )
                 db.session.add(assignment)
-                db.session.commit()
+                db.session.flush()
                 
-                socketio.emit('new_assignment', {
+                emit_dispatcher.emit_stream(f"whiteboard_{whiteboard_id}", 'new_assignment', {
                     'id': assignment.id,
                     'title': assignment.title,
                     'description': assignment.description,
                     'subject': assignment.subject,
-                    'due_date': format_china_time(assignment.due_date),
-                    'created_at': format_china_time(assignment.created_at),
+                    'due_date': assignment.due_date,
+                    'created_at': assignment.created_at,
                     'teacher_name': assignment.teacher.username,
                     'storage_type': 'local'
-                }, room=f"whiteboard_{whiteboard_id}")
+                })
+                assignment_id = assignment.id
+                db.session.commit()
                 
-                return jsonify({'success': True, 'assignment_id': assignment.id, 'storage_type': 'local'})
+                return jsonify({'success': True, 'assignment_id': assignment_id, 'storage_type': 'local'})
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': f'操作失败: {str(e)}'}), 500
@@ -345,8 +350,8 @@ def delete_assignment(assignment_id):
                     client.save_homework_data(date_str, update_data)
         
         db.session.delete(assignment)
+        emit_dispatcher.emit_stream(f"whiteboard_{whiteboard_id}", 'delete_assignment', {'assignment_id': assignment_id})
         db.session.commit()
-        socketio.emit('delete_assignment', {'assignment_id': assignment_id}, room=f"whiteboard_{whiteboard_id}")
         return jsonify({'success': True})
     except Exception as e:
         db.session.rollback()
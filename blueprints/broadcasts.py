@@ -0,0 +1,218 @@
+from flask import Blueprint, request, jsonify, session
+from extensions import db
+from models.user import User
+from models.class_models import Class
+from models.whiteboard import Whiteboard
+from models.task import Task
+from models.announcement import Announcement
+from utils.auth_utils import login_required, teacher_required
+from utils.emit_dispatcher import emit_dispatcher
+from utils.time_utils import parse_datetime_local
+
+broadcasts_bp = Blueprint('broadcasts', __name__, url_prefix='/broadcasts')
+
+def resolve_target_classes(user, data):
+    """根据请求解析广播目标班级（仅限当前用户担任班主任的班级）
+
+    支持 class_id（单个班级）、class_ids（班级列表）、tag（班级标签）
+    和 all（全部班级）四种方式，返回 (班级列表, 错误信息, 状态码)。
+    """
+    query = Class.query.filter_by(teacher_id=user.id)
+
+    if data.get('class_id') is not None:
+        class_ids = [data.get('class_id')]
+    elif data.get('class_ids') is not None:
+        class_ids = data.get('class_ids')
+    else:
+        class_ids = None
+
+    if class_ids is not None:
+        if not isinstance(class_ids, list) or not class_ids or not all(isinstance(cid, int) for cid in class_ids):
+            return None, '班级ID格式无效', 400
+        classes = query.filter(Class.id.in_(class_ids)).all()
+        if len(classes) != len(set(class_ids)):
+            return None, '只有班主任可以向班级发布广播', 403
+        return classes, None, None
+
+    tag = (data.get('tag') or '').strip()
+    if tag:
+        # 先用 LIKE 缩小范围，再精确匹配标签
+        candidates = query.filter(Class.tags.like(f'%{tag}%')).all()
+        classes = [class_obj for class_obj in candidates if tag in class_obj.get_tags_list()]
+        if not classes:
+            return None, f'没有带有标签"{tag}"的班级', 404
+        return classes, None, None
+
+    if data.get('all'):
+        classes = query.all()
+        if not classes:
+            return None, '您还没有创建班级', 404
+        return classes, None, None
+
+    return None, '需要指定 class_id、class_ids、tag 或 all', 400
+
+def get_class_whiteboards(classes):
+    """一次查询获取多个班级的全部可用白板，按班级分组"""
+    whiteboards = Whiteboard.query.filter(
+        Whiteboard.class_id.in_([class_obj.id for class_obj in classes]),
+        Whiteboard.is_active == True
+    ).order_by(Whiteboard.id).all()
+
+    grouped = {class_obj.id: [] for class_obj in classes}
+    for whiteboard in whiteboards:
+        grouped[whiteboard.class_id].append(whiteboard)
+    return grouped
+
+@broadcasts_bp.route('/announcements', methods=['POST'])
+@login_required
+@teacher_required
+def broadcast_announcement():
+    """向多个班级的所有白板发布同一条公告"""
+    user = db.session.get(User, session['user_id'])
+    data = request.get_json() or {}
+
+    title = data.get('title')
+    content = data.get('content')
+    is_long_term = data.get('is_long_term', False)
+
+    if not title or not content:
+        return jsonify({'error': '标题和内容不能为空'}), 400
+
+    classes, error, status = resolve_target_classes(user, data)
+    if error:
+        return jsonify({'error': error}), status
+
+    grouped = get_class_whiteboards(classes)
+
+    announcements = {}
+    for class_id, whiteboards in grouped.items():
+        announcements[class_id] = [Announcement(
+            title=title,
+            content=content,
+            is_long_term=is_long_term,
+            whiteboard_id=whiteboard.id,
+            teacher_id=user.id
+        ) for whiteboard in whiteboards]
+
+    rows = [announcement for items in announcements.values() for announcement in items]
+    if not rows:
+        return jsonify({'error': '目标班级中没有可用的白板'}), 400
+
+    try:
+        # 所有白板的记录在同一个事务中批量插入，flush 后即可拿到ID，
+        # 避免提交后逐行刷新过期对象；推送在事务提交后由分发器发出
+        db.session.add_all(rows)
+        db.session.flush()
+
+        created = {
+            class_id: [{'whiteboard_id': item.whiteboard_id, 'id': item.id} for item in items]
+            for class_id, items in announcements.items() if items
+        }
+        created_at = rows[0].created_at
+        teacher_name = user.username
+
+        for class_id, items in created.items():
+            emit_dispatcher.emit_stream(f"class_{class_id}", 'broadcast_announcement', {
+                'class_id': class_id,
+                'items': items,
+                'title': title,
+                'content': content,
+                'is_long_term': is_long_term,
+                'created_at': created_at,
+                'teacher_name': teacher_name
+            })
+        db.session.commit()
+
+        return jsonify({
+            'success': True,
+            'class_count': len(classes),
+            'whiteboard_count': len(rows),
+            'announcements': created
+        })
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': '发布广播公告失败'}), 500
+
+@broadcasts_bp.route('/tasks', methods=['POST'])
+@login_required
+@teacher_required
+def broadcast_task():
+    """向多个班级的所有白板发布同一个任务"""
+    user = db.session.get(User, session['user_id'])
+    data = request.get_json() or {}
+
+    title = data.get('title')
+    description = data.get('description')
+    priority = data.get('priority', 1)
+    action_id = data.get('action_id', 0)
+    subject = data.get('subject')
+    due_date_str = data.get('due_date')
+
+    if not title:
+        return jsonify({'error': '任务标题不能为空'}), 400
+
+    due_date = None
+    if due_date_str:
+        try:
+            due_date = parse_datetime_local(due_date_str)
+        except ValueError as e:
+            return jsonify({'error': f'日期格式无效: {str(e)}'}), 400
+
+    classes, error, status = resolve_target_classes(user, data)
+    if error:
+        return jsonify({'error': error}), status
+
+    grouped = get_class_whiteboards(classes)
+
+    tasks = {}
+    for class_id, whiteboards in grouped.items():
+        tasks[class_id] = [Task(
+            title=title,
+            description=description,
+            priority=priority,
+            action_id=action_id,
+            due_date=due_date,
+            subject=subject,
+            whiteboard_id=whiteboard.id,
+            teacher_id=user.id
+        ) for whiteboard in whiteboards]
+
+    rows = [task for items in tasks.values() for task in items]
+    if not rows:
+        return jsonify({'error': '目标班级中没有可用的白板'}), 400
+
+    try:
+        db.session.add_all(rows)
+        db.session.flush()
+
+        created = {
+            class_id: [{'whiteboard_id': item.whiteboard_id, 'id': item.id} for item in items]
+            for class_id, items in tasks.items() if items
+        }
+        created_at = rows[0].created_at
+        teacher_name = user.username
+
+        for class_id, items in created.items():
+            emit_dispatcher.emit_stream(f"class_{class_id}", 'broadcast_task', {
+                'class_id': class_id,
+                'items': items,
+                'title': title,
+                'description': description,
+                'priority': priority,
+                'action_id': action_id,
+                'subject': subject,
+                'due_date': due_date,
+                'created_at': created_at,
+                'teacher_name': teacher_name
+            })
+        db.session.commit()
+
+        return jsonify({
+            'success': True,
+            'class_count': len(classes),
+            'whiteboard_count': len(rows),
+            'tasks': created
+        })
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': '发布广播任务失败'}), 500
@@ -1,10 +1,14 @@
-from flask import Blueprint, send_from_directory, render_template, redirect, url_for, abort, session
+from flask import Blueprint, render_template, redirect, url_for, abort, session, request, current_app, Response
 from extensions import db, socketio
 from models.user import User
 from models.class_models import Class, TeacherClass
 from utils.auth_utils import login_required, teacher_required
 from utils.time_utils import format_china_time
-import os
+from utils.metrics import metrics
+from utils.file_serving import send_stored_file
+from utils.signed_urls import verify_file_signature
+from utils.storage import storage, note_key
+import posixpath
 
 main_bp = Blueprint('main', __name__)
 
@@ -67,27 +71,48 @@ def serve_uploaded_file(class_id, filename):
     if not has_permission:
         abort(403, description="您没有权限访问该班级的文件")
     
-    # 构建完整的文件路径
-    uploads_dir = os.path.join(
-        os.path.dirname(os.path.dirname(__file__)), 
-        'uploads', 
-        str(class_id)
-    )
-    
-    file_path = os.path.join(uploads_dir, filename)
-    
-    # 安全检查：确保请求的文件在uploads目录内
-    uploads_dir_abs = os.path.abspath(uploads_dir)
-    file_path_abs = os.path.abspath(file_path)
+    return send_stored_file(upload_file_key(class_id, filename))
+
+@main_bp.route('/files/<int:class_id>/<path:filename>')
+def serve_signed_file(class_id, filename):
+    """通过签名链接访问上传的文件
+
+    签名中包含班级、路径和过期时间，校验不访问数据库，也不需要登录会话。
+    """
+    if not verify_file_signature(class_id, filename, request.args.get('expires'), request.args.get('sig')):
+        abort(403, description="链接无效或已过期")
     
-    if not file_path_abs.startswith(uploads_dir_abs):
+    return send_stored_file(upload_file_key(class_id, filename))
+
+def upload_file_key(class_id, filename):
+    """返回班级文件在存储中的键，路径越界或文件不存在时中止请求"""
+    # 安全检查：规范化后的路径必须仍在班级目录内
+    relative_path = posixpath.normpath(filename.replace('\\', '/'))
+    if relative_path in ('.', '..') or relative_path.startswith(('../', '/')):
         abort(403, description="无效的文件路径")
     
-    if not os.path.isfile(file_path_abs):
+    file_key = note_key(class_id, relative_path)
+    if not storage.exists(file_key):
         abort(404, description="文件不存在")
     
-    return send_from_directory(uploads_dir, filename)
+    return file_key
 
 @main_bp.route('/favicon.ico')
 def favicon():
-    return '', 204
\ No newline at end of file
+    return '', 204
+
+@main_bp.route('/metrics')
+def metrics_endpoint():
+    """以 Prometheus 文本格式导出运行指标
+    
+    配置了 METRICS_TOKEN 时校验 Bearer 令牌，否则只允许已登录的开发者账号访问
+    """
+    token = current_app.config.get('METRICS_TOKEN')
+    if token:
+        if request.headers.get('Authorization') != f'Bearer {token}':
+            abort(401)
+    else:
+        user = db.session.get(User, session['user_id']) if 'user_id' in session else None
+        if user is None or user.organization != 'developer':
+            abort(403)
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
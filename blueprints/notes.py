@@ -1,14 +1,31 @@
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, request, jsonify, current_app
+from itsdangerous import URLSafeTimedSerializer, BadSignature
 import os
 import mimetypes
-from werkzeug.utils import secure_filename
+import string
 from extensions import db
 from models.whiteboard import Whiteboard
 from models.class_models import Class, TeacherClass
-from models.note import Note
+from models.note import Note, NoteBlob, NOTE_FIELDS
 from models.user import User
 from utils.auth_utils import whiteboard_auth_required, login_required, teacher_required
 from utils.time_utils import get_china_time, format_china_time
+from utils.serialization import api_response
+from utils.field_selection import parse_fields
+from utils.chunked_upload import chunked_uploads, UploadError
+from utils.blob_store import (
+    save_stream_to_temp, store_blob, discard_source, register_uploaded_blob, blob_relative_path,
+    note_file_key, delete_note as delete_note_record, remove_files
+)
+from utils.file_serving import send_stored_file, send_note_thumbnail, is_full_download
+from utils.storage import storage, note_key
+from utils.search_index import search_index
+from utils.note_tags import set_note_tags, filter_by_tag, tag_cloud
+from utils.note_stats import record_note_added, count_notes
+from utils.note_jobs import note_jobs
+from utils.note_quota import note_quota, QuotaExceeded
+from utils.pagination import keyset_page, count_cache, CursorError
+from utils.signed_urls import signed_file_url
 
 notes_bp = Blueprint('notes', __name__, url_prefix='/api/whiteboard')
 
@@ -28,40 +45,74 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def get_upload_path(whiteboard, filename):
-    """生成文件保存路径"""
-    current_time = get_china_time()
-    
-    # 基础上传目录（包含班级ID）
-    base_dir = os.path.join(
-        os.path.dirname(os.path.dirname(__file__)), 
-        'uploads',
-        str(whiteboard.class_id)  # 按班级ID分开
-    )
+def file_extension_of(filename):
+    return filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+
+def create_note_record(whiteboard, original_filename, blob, deduplicated, metadata):
+    """为已存入去重存储的文件创建笔记记录，返回 (笔记, 响应数据)"""
+    # 构建文件URL
+    file_url = f"/uploads/{whiteboard.class_id}/{blob.file_path}"
     
-    # 按白板ID/年/月/日组织目录
-    upload_path = os.path.join(
-        base_dir,
-        str(whiteboard.id),
-        str(current_time.year),
-        f"{current_time.month:02d}",
-        f"{current_time.day:02d}"
-    )
+    # 获取文件信息
+    file_extension = file_extension_of(original_filename)
+    mime_type = mimetypes.guess_type(original_filename)[0] or 'application/octet-stream'
     
-    # 确保目录存在
-    os.makedirs(upload_path, exist_ok=True)
+    # 创建笔记记录
+    note = Note(
+        filename=os.path.basename(blob.file_path),
+        original_filename=original_filename,
+        file_path=blob.file_path,
+        file_size=blob.file_size,
+        file_type=file_extension,
+        mime_type=mime_type,
+        blob=blob,
+        whiteboard_id=whiteboard.id,
+        class_id=whiteboard.class_id,
+        uploaded_by=whiteboard.class_obj.teacher_id,  # 使用班级创建者的ID
+        title=metadata.get('title', ''),
+        description=metadata.get('description', '')
+    )
     
-    # 生成安全的文件名（添加时间戳避免重名）
-    name, ext = os.path.splitext(secure_filename(filename))
-    timestamp = int(current_time.timestamp())
-    safe_filename = f"{name}_{timestamp}{ext}"
+    db.session.add(note)
+    set_note_tags(note, metadata.get('tags', ''))
+    db.session.flush()
+    record_note_added(note)
+    note_quota.charge(note)
+    # 类型识别、文本提取和缩略图等处理在提交后由后台队列完成
+    note_jobs.enqueue(note)
     
-    return os.path.join(upload_path, safe_filename)
+    return note, {
+        'success': True,
+        'message': '文件上传成功',
+        'note_id': note.id,
+        'filename': original_filename,
+        'file_path': blob.file_path,
+        'file_url': file_url,
+        'signed_url': signed_file_url(whiteboard.class_id, blob.file_path),
+        'file_size': blob.file_size,
+        'sha256': blob.sha256,
+        'deduplicated': deduplicated,
+        'processing_status': note.processing_status,
+        'uploaded_at': format_china_time(get_china_time()),
+        'class_id': whiteboard.class_id,
+        'whiteboard_id': whiteboard.id
+    }
 
 @notes_bp.route('/upload_note', methods=['POST'])
 @whiteboard_auth_required
 def upload_note():
     """上传白板笔记文件"""
+    max_size = current_app.config.get('NOTE_SIMPLE_UPLOAD_MAX_SIZE', 10 * 1024 * 1024)
+    
+    # 读取请求体之前先按 Content-Length 拒绝过大的请求（预留表单字段的空间）
+    if request.content_length and request.content_length > max_size + 64 * 1024:
+        return jsonify({'error': f'文件大小不能超过{max_size // (1024 * 1024)}MB，请使用分片上传'}), 413
+    
+    # 读取请求体之前按 Content-Length 检查配额（减去表单字段的空间，文件保存前再按实际大小检查）
+    try:
+        note_quota.check(request.whiteboard, max((request.content_length or 0) - 64 * 1024, 0))
+    except QuotaExceeded as e:
+        return upload_error_response(e)
     
     # 检查是否有文件被上传
     if 'file' not in request.files:
@@ -80,74 +131,393 @@ def upload_note():
             'allowed_types': list(ALLOWED_EXTENSIONS)
         }), 400
     
-    # 检查文件大小（限制为10MB）
+    # 检查文件大小
     file.seek(0, os.SEEK_END)
     file_length = file.tell()
     file.seek(0)
     
-    if file_length > 10 * 1024 * 1024:  # 10MB
-        return jsonify({'error': '文件大小不能超过10MB'}), 400
+    if file_length > max_size:
+        return jsonify({'error': f'文件大小不能超过{max_size // (1024 * 1024)}MB，请使用分片上传'}), 400
     
+    temp_path = None
+    stored_key = None
     try:
-        # 生成保存路径
-        save_path = get_upload_path(request.whiteboard, file.filename)
-        
-        # 保存文件
-        file.save(save_path)
-        
-        # 获取相对路径用于URL访问
-        base_upload_dir = os.path.join(
-            os.path.dirname(os.path.dirname(__file__)), 
-            'uploads',
-            str(request.whiteboard.class_id)
-        )
-        relative_path = os.path.relpath(save_path, base_upload_dir)
-        
-        # 将Windows路径分隔符转换为URL路径分隔符
-        url_safe_path = relative_path.replace('\\', '/')
-        
-        # 构建文件URL
-        file_url = f"/uploads/{request.whiteboard.class_id}/{url_safe_path}"
-        
-        # 获取文件信息
-        file_extension = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else ''
-        mime_type = mimetypes.guess_type(file.filename)[0] or 'application/octet-stream'
-        
-        # 创建笔记记录
-        note = Note(
-            filename=os.path.basename(save_path),
-            original_filename=file.filename,
-            file_path=url_safe_path,
-            file_size=file_length,
-            file_type=file_extension,
-            mime_type=mime_type,
-            whiteboard_id=request.whiteboard.id,
-            class_id=request.whiteboard.class_id,
-            uploaded_by=request.whiteboard.class_obj.teacher_id,  # 使用班级创建者的ID
-            title=request.form.get('title', ''),
-            description=request.form.get('description', ''),
-            tags=request.form.get('tags', '')
+        # 写入临时文件的同时计算哈希，相同内容只保存一份
+        temp_path, file_length, digest = save_stream_to_temp(file.stream)
+        note_quota.check(request.whiteboard, file_length)
+        blob, deduplicated = store_blob(
+            request.whiteboard.class_id, temp_path, digest, file_length, file_extension_of(file.filename)
         )
+        if not deduplicated:
+            stored_key = note_key(request.whiteboard.class_id, blob.file_path)
         
-        db.session.add(note)
+        note, result = create_note_record(request.whiteboard, file.filename, blob, deduplicated, request.form)
         db.session.commit()
+        discard_source(temp_path)
         
         # 记录上传日志
-        print(f"白板笔记上传成功: {file.filename} -> {save_path}")
+        print(f"白板笔记上传成功: {file.filename} -> {blob.file_path}")
+        
+        return jsonify(result)
+        
+    except QuotaExceeded as e:
+        db.session.rollback()
+        discard_source(temp_path)
+        # 回滚后新保存的文件不再被任何记录引用
+        if stored_key:
+            storage.delete(stored_key)
+        return upload_error_response(e)
+    except Exception as e:
+        db.session.rollback()
+        discard_source(temp_path)
+        if stored_key:
+            storage.delete(stored_key)
+        print(f"文件上传失败: {str(e)}")
+        return jsonify({'error': '文件上传失败'}), 500
+
+@notes_bp.route('/upload_notes', methods=['POST'])
+@whiteboard_auth_required
+def upload_notes_batch():
+    """一次上传多个白板笔记文件
+    
+    先检查全部文件，任何一个不符合要求时整批拒绝；文件依次写入临时目录后，
+    所有笔记记录在同一个事务中创建，返回每个文件的结果。
+    请求体由 Werkzeug 完整解析后才能检查各个文件，因此先按 Content-Length 限制总大小。
+    """
+    max_size = current_app.config.get('NOTE_SIMPLE_UPLOAD_MAX_SIZE', 10 * 1024 * 1024)
+    max_files = current_app.config.get('NOTE_BATCH_MAX_FILES', 50)
+    max_total = current_app.config.get('NOTE_BATCH_MAX_SIZE', 100 * 1024 * 1024)
+    whiteboard = request.whiteboard
+    
+    # 读取请求体之前先按 Content-Length 检查总大小和配额
+    if request.content_length and request.content_length > max_total + 64 * 1024:
+        return jsonify({'error': f'单次批量上传不能超过{max_total // (1024 * 1024)}MB'}), 413
+    try:
+        note_quota.check(whiteboard, max((request.content_length or 0) - 64 * 1024, 0), files=0)
+    except QuotaExceeded as e:
+        return upload_error_response(e)
+    
+    files = [file for file in request.files.getlist('files') if file.filename]
+    if not files:
+        return jsonify({'error': '没有文件被上传'}), 400
+    if len(files) > max_files:
+        return jsonify({'error': f'单次最多上传{max_files}个文件'}), 400
+    
+    # 检查所有文件的类型和大小
+    errors = []
+    total_size = 0
+    for index, file in enumerate(files):
+        file.seek(0, os.SEEK_END)
+        file_length = file.tell()
+        file.seek(0)
+        total_size += file_length
+        
+        if not allowed_file(file.filename):
+            errors.append({'index': index, 'filename': file.filename, 'error': '不支持的文件类型'})
+        elif file_length > max_size:
+            errors.append({
+                'index': index,
+                'filename': file.filename,
+                'error': f'文件大小不能超过{max_size // (1024 * 1024)}MB，请使用分片上传'
+            })
+    if errors:
+        return jsonify({
+            'error': '部分文件不符合要求，未上传任何文件',
+            'files': errors,
+            'allowed_types': list(ALLOWED_EXTENSIONS)
+        }), 400
+    
+    # titles 与 files 按顺序对应，未提供时以文件名（不含扩展名）作为标题
+    titles = request.form.getlist('titles')
+    
+    temp_files = []
+    stored_keys = []
+    try:
+        note_quota.check(whiteboard, total_size, files=len(files))
+        
+        # 写入临时文件并计算哈希
+        for file in files:
+            temp_files.append(save_stream_to_temp(file.stream))
+        
+        results = []
+        for index, (file, (temp_path, file_length, digest)) in enumerate(zip(files, temp_files)):
+            blob, deduplicated = store_blob(
+                whiteboard.class_id, temp_path, digest, file_length, file_extension_of(file.filename)
+            )
+            if not deduplicated:
+                stored_keys.append(note_key(whiteboard.class_id, blob.file_path))
+            title = titles[index].strip() if index < len(titles) else ''
+            metadata = {
+                'title': title or os.path.splitext(file.filename)[0],
+                'description': request.form.get('description', ''),
+                'tags': request.form.get('tags', '')
+            }
+            note, result = create_note_record(whiteboard, file.filename, blob, deduplicated, metadata)
+            results.append(result)
+        db.session.commit()
+        for temp_path, _, _ in temp_files:
+            discard_source(temp_path)
         
+        print(f"白板笔记批量上传成功: {len(results)} 个文件")
         return jsonify({
             'success': True,
-            'message': '文件上传成功',
-            'note_id': note.id,
-            'filename': file.filename,
-            'file_path': url_safe_path,
-            'file_url': file_url,
-            'file_size': file_length,
-            'uploaded_at': format_china_time(get_china_time()),
-            'class_id': request.whiteboard.class_id,
-            'whiteboard_id': request.whiteboard.id
+            'message': f'已上传{len(results)}个文件',
+            'count': len(results),
+            'results': results
         })
         
+    except Exception as e:
+        db.session.rollback()
+        # 删除尚未移走的临时文件和本批新保存、已不被任何记录引用的文件
+        for temp_path, _, _ in temp_files:
+            discard_source(temp_path)
+        for key in stored_keys:
+            storage.delete(key)
+        if isinstance(e, QuotaExceeded):
+            return upload_error_response(e)
+        print(f"批量上传失败: {str(e)}")
+        return jsonify({'error': '文件上传失败'}), 500
+
+def upload_error_response(error):
+    body = {'error': error.message}
+    body.update(error.extra)
+    return jsonify(body), error.status
+
+@notes_bp.route('/uploads', methods=['POST'])
+@whiteboard_auth_required
+def create_chunked_upload():
+    """创建分片上传会话"""
+    data = request.get_json() or {}
+    filename = data.get('filename') or ''
+    
+    if not filename:
+        return jsonify({'error': '没有选择文件'}), 400
+    
+    if not allowed_file(filename):
+        return jsonify({
+            'error': '不支持的文件类型',
+            'allowed_types': list(ALLOWED_EXTENSIONS)
+        }), 400
+    
+    metadata = {key: data.get(key, '') for key in ('title', 'description', 'tags')}
+    
+    try:
+        # 开始上传前按声明的大小检查配额
+        size = data.get('size')
+        note_quota.check(request.whiteboard, size if isinstance(size, int) else 0)
+        meta = chunked_uploads.create(request.whiteboard, filename, data.get('size'), metadata, data.get('sha256'))
+    except UploadError as e:
+        return upload_error_response(e)
+    
+    result = chunked_uploads.status(meta)
+    result['success'] = True
+    result['chunk_size'] = current_app.config.get('NOTE_UPLOAD_CHUNK_SIZE', 5 * 1024 * 1024)
+    return jsonify(result), 201
+
+@notes_bp.route('/uploads/<upload_id>', methods=['GET'])
+@whiteboard_auth_required
+def get_chunked_upload(upload_id):
+    """查询分片上传进度，断线后据此从 offset 继续"""
+    try:
+        meta = chunked_uploads.get(upload_id, request.whiteboard.id)
+    except UploadError as e:
+        return upload_error_response(e)
+    
+    result = chunked_uploads.status(meta)
+    result['success'] = True
+    return jsonify(result)
+
+@notes_bp.route('/uploads/<upload_id>', methods=['PUT'])
+@whiteboard_auth_required
+def append_chunked_upload(upload_id):
+    """追加一个分片，请求体为原始字节，偏移量通过 Upload-Offset 请求头指定"""
+    offset = request.headers.get('Upload-Offset', '')
+    if not offset.isdigit():
+        return jsonify({'error': '缺少有效的 Upload-Offset'}), 400
+    
+    chunk_limit = current_app.config.get('NOTE_UPLOAD_CHUNK_SIZE', 5 * 1024 * 1024)
+    if request.content_length and request.content_length > chunk_limit:
+        return jsonify({'error': f'单个分片不能超过{chunk_limit // (1024 * 1024)}MB'}), 413
+    
+    try:
+        meta = chunked_uploads.append(
+            upload_id,
+            request.whiteboard.id,
+            int(offset),
+            request.content_length,
+            request.stream
+        )
+    except UploadError as e:
+        return upload_error_response(e)
+    
+    result = chunked_uploads.status(meta)
+    result['success'] = True
+    return jsonify(result)
+
+@notes_bp.route('/uploads/<upload_id>/finalize', methods=['POST'])
+@whiteboard_auth_required
+def finalize_chunked_upload(upload_id):
+    """完成分片上传，校验后移动到上传目录并创建笔记记录"""
+    whiteboard = request.whiteboard
+    
+    def complete(meta, digest, part_path):
+        note_quota.check(whiteboard, meta['size'])
+        blob, deduplicated = store_blob(
+            whiteboard.class_id, part_path, digest, meta['size'], file_extension_of(meta['filename'])
+        )
+        try:
+            note, result = create_note_record(whiteboard, meta['filename'], blob, deduplicated, meta['metadata'])
+            db.session.commit()
+        except Exception:
+            # 回滚后新保存的文件不再被任何记录引用
+            db.session.rollback()
+            if not deduplicated:
+                storage.delete(note_key(whiteboard.class_id, blob.file_path))
+            raise
+        print(f"白板笔记分片上传完成: {meta['filename']} -> {blob.file_path}")
+        return result
+    
+    try:
+        result = chunked_uploads.finalize(upload_id, whiteboard.id, complete)
+        return jsonify(result)
+    except UploadError as e:
+        db.session.rollback()
+        return upload_error_response(e)
+    except Exception as e:
+        db.session.rollback()
+        print(f"文件上传失败: {str(e)}")
+        return jsonify({'error': '文件上传失败'}), 500
+
+@notes_bp.route('/uploads/<upload_id>', methods=['DELETE'])
+@whiteboard_auth_required
+def abort_chunked_upload(upload_id):
+    """取消分片上传并删除已上传的数据"""
+    try:
+        chunked_uploads.get(upload_id, request.whiteboard.id)
+    except UploadError as e:
+        return upload_error_response(e)
+    
+    chunked_uploads.discard(upload_id)
+    return jsonify({'success': True})
+
+def direct_upload_serializer():
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt='note-direct-upload')
+
+@notes_bp.route('/uploads/direct', methods=['POST'])
+@whiteboard_auth_required
+def create_direct_upload():
+    """申请直传对象存储的预签名链接，文件内容不经过应用服务器
+    
+    内容已存在（SHA-256 相同）时直接创建笔记，不需要上传。
+    """
+    if not storage.supports_direct_upload:
+        return jsonify({'error': '当前存储不支持直传，请使用分片上传'}), 400
+    
+    data = request.get_json() or {}
+    filename = data.get('filename') or ''
+    size = data.get('size')
+    digest = (data.get('sha256') or '').lower()
+    
+    if not filename:
+        return jsonify({'error': '没有选择文件'}), 400
+    
+    if not allowed_file(filename):
+        return jsonify({
+            'error': '不支持的文件类型',
+            'allowed_types': list(ALLOWED_EXTENSIONS)
+        }), 400
+    
+    max_size = current_app.config.get('NOTE_MAX_FILE_SIZE', 200 * 1024 * 1024)
+    if not isinstance(size, int) or size <= 0:
+        return jsonify({'error': '文件大小无效'}), 400
+    if size > max_size:
+        return jsonify({'error': f'文件大小不能超过{max_size // (1024 * 1024)}MB'}), 413
+    
+    if len(digest) != 64 or not all(c in string.hexdigits for c in digest):
+        return jsonify({'error': '缺少有效的 sha256'}), 400
+    
+    whiteboard = request.whiteboard
+    metadata = {key: data.get(key, '') for key in ('title', 'description', 'tags')}
+    file_extension = file_extension_of(filename)
+    
+    try:
+        note_quota.check(whiteboard, size)
+        
+        if NoteBlob.query.filter_by(class_id=whiteboard.class_id, sha256=digest).first() is not None:
+            blob, deduplicated = register_uploaded_blob(whiteboard.class_id, digest, size, file_extension)
+            note, result = create_note_record(whiteboard, filename, blob, deduplicated, metadata)
+            db.session.commit()
+            result['upload_required'] = False
+            return jsonify(result)
+        
+        # 直接上传到内容寻址的键下，签名中的 SHA-256 由对象存储校验
+        mime_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        upload_url, headers = storage.upload_url(
+            note_key(whiteboard.class_id, blob_relative_path(digest, file_extension)), size, digest, mime_type
+        )
+        upload_token = direct_upload_serializer().dumps({
+            'whiteboard_id': whiteboard.id,
+            'filename': filename,
+            'size': size,
+            'sha256': digest,
+            'metadata': metadata
+        })
+        
+        return jsonify({
+            'success': True,
+            'upload_required': True,
+            'upload_url': upload_url,
+            'method': 'PUT',
+            'headers': headers,
+            'upload_token': upload_token,
+            'expires_in': storage.url_ttl
+        }), 201
+        
+    except QuotaExceeded as e:
+        db.session.rollback()
+        return upload_error_response(e)
+    except Exception as e:
+        db.session.rollback()
+        print(f"创建直传失败: {str(e)}")
+        return jsonify({'error': '创建直传失败'}), 500
+
+@notes_bp.route('/uploads/direct/complete', methods=['POST'])
+@whiteboard_auth_required
+def complete_direct_upload():
+    """直传完成后创建笔记记录"""
+    data = request.get_json() or {}
+    
+    try:
+        # 凭证比上传链接多保留一小时，留出上传大文件的时间
+        upload = direct_upload_serializer().loads(data.get('upload_token') or '', max_age=storage.url_ttl + 3600)
+    except BadSignature:
+        return jsonify({'error': '上传凭证无效或已过期'}), 400
+    
+    whiteboard = request.whiteboard
+    if upload['whiteboard_id'] != whiteboard.id:
+        return jsonify({'error': '上传凭证无效或已过期'}), 400
+    
+    file_extension = file_extension_of(upload['filename'])
+    file_key = note_key(whiteboard.class_id, blob_relative_path(upload['sha256'], file_extension))
+    
+    try:
+        if storage.size(file_key) != upload['size']:
+            return jsonify({'error': '文件尚未上传完成'}), 409
+        
+        note_quota.check(whiteboard, upload['size'])
+        blob, deduplicated = register_uploaded_blob(whiteboard.class_id, upload['sha256'], upload['size'], file_extension)
+        note, result = create_note_record(whiteboard, upload['filename'], blob, deduplicated, upload['metadata'])
+        db.session.commit()
+        
+        print(f"白板笔记直传完成: {upload['filename']} -> {blob.file_path}")
+        return jsonify(result)
+        
+    except QuotaExceeded as e:
+        db.session.rollback()
+        # 已上传的对象没有被任何记录引用时删除
+        if NoteBlob.query.filter_by(class_id=whiteboard.class_id, sha256=upload['sha256']).first() is None:
+            storage.delete(file_key)
+        return upload_error_response(e)
     except Exception as e:
         db.session.rollback()
         print(f"文件上传失败: {str(e)}")
@@ -167,8 +537,13 @@ def get_notes_list():
         sort_by = request.args.get('sort_by', 'created_at')
         sort_order = request.args.get('sort_order', 'desc')
         
-        # 构建查询
-        query = Note.query.filter_by(whiteboard_id=request.whiteboard.id)
+        names, cache_key, error = parse_fields(request.args.get('fields'), NOTE_FIELDS)
+        if error:
+            return jsonify({'error': error}), 400
+        selected = NOTE_FIELDS.resolve(names)
+        
+        # 构建查询，只加载所选字段需要的列和关系
+        query = Note.query.filter_by(whiteboard_id=request.whiteboard.id).options(*NOTE_FIELDS.options(selected))
         
         # 文件类型筛选
         if file_type:
@@ -176,18 +551,14 @@ def get_notes_list():
         
         # 标签筛选
         if tag:
-            query = query.filter(Note.tags.like(f'%{tag}%'))
+            query = filter_by_tag(query, request.whiteboard.class_id, tag)
         
-        # 搜索筛选（标题、描述、文件名）
+        # 搜索筛选（标题、描述、标签、文件名和文件内容）
         if search:
-            search_pattern = f'%{search}%'
-            query = query.filter(
-                db.or_(
-                    Note.title.like(search_pattern),
-                    Note.description.like(search_pattern),
-                    Note.original_filename.like(search_pattern),
-                    Note.tags.like(search_pattern)
-                )
+            query = search_index.filter_query(
+                query, 'note', search,
+                (Note.title, Note.description, Note.original_filename),
+                whiteboard_id=request.whiteboard.id
             )
         
         # 排序
@@ -198,8 +569,50 @@ def get_notes_list():
         elif sort_by == 'download_count':
             order_field = Note.download_count
         else:  # 默认按创建时间
+            sort_by = 'created_at'
             order_field = Note.created_at
         
+        # 传入 cursor 参数（第一页为空）时使用游标分页，不统计总数、不使用 OFFSET
+        if 'cursor' in request.args:
+            total = None
+            if request.args.get('with_total') in ('1', 'true'):
+                if tag or search:
+                    total = count_cache.get(
+                        ('whiteboard_notes', request.whiteboard.id, file_type, tag, search),
+                        lambda: query.order_by(None).count()
+                    )
+                else:
+                    total = count_notes(request.whiteboard.class_id, request.whiteboard.id, file_type)
+            
+            # 旧数据的下载次数可能为空，按 0 比较
+            sort_expression = db.func.coalesce(Note.download_count, 0) if sort_by == 'download_count' else order_field
+            per_page = min(max(1, per_page), 100)
+            notes, next_cursor = keyset_page(
+                query, Note.id, f'{sort_by}:{sort_order}', sort_expression,
+                sort_order != 'asc', request.args.get('cursor'), per_page
+            )
+            
+            pagination_data = {
+                'per_page': per_page,
+                'next_cursor': next_cursor,
+                'has_next': next_cursor is not None
+            }
+            if total is not None:
+                pagination_data['total'] = total
+            
+            return api_response({
+                'success': True,
+                'notes': [NOTE_FIELDS.serialize(note, selected) for note in notes],
+                'pagination': pagination_data,
+                'filters': {
+                    'file_type': file_type,
+                    'tag': tag,
+                    'search': search,
+                    'sort_by': sort_by,
+                    'sort_order': sort_order
+                }
+            }, cache_key=cache_key)
+        
         if sort_order == 'asc':
             query = query.order_by(order_field.asc())
         else:
@@ -212,9 +625,9 @@ def get_notes_list():
             error_out=False
         )
         
-        notes_data = [note.to_dict() for note in pagination.items]
+        notes_data = [NOTE_FIELDS.serialize(note, selected) for note in pagination.items]
         
-        return jsonify({
+        return api_response({
             'success': True,
             'notes': notes_data,
             'pagination': {
@@ -232,8 +645,10 @@ def get_notes_list():
                 'sort_by': sort_by,
                 'sort_order': sort_order
             }
-        })
+        }, cache_key=cache_key)
         
+    except CursorError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"获取笔记列表失败: {str(e)}")
         return jsonify({'error': '获取笔记列表失败'}), 500
@@ -281,7 +696,7 @@ def update_note(note_id):
         if 'description' in data:
             note.description = data['description']
         if 'tags' in data:
-            note.tags = data['tags']
+            set_note_tags(note, data['tags'])
         if 'is_public' in data:
             note.is_public = bool(data['is_public'])
         
@@ -311,22 +726,10 @@ def delete_note(note_id):
         if not note:
             return jsonify({'error': '笔记不存在'}), 404
         
-        # 构建完整文件路径
-        file_path = os.path.join(
-            os.path.dirname(os.path.dirname(__file__)),
-            'uploads',
-            str(note.class_id),
-            note.file_path
-        )
-        
-        # 删除数据库记录
-        db.session.delete(note)
+        # 删除数据库记录，文件的最后一个引用被移除后才删除物理文件
+        paths = delete_note_record(note)
         db.session.commit()
-        
-        # 删除物理文件
-        if os.path.exists(file_path):
-            os.remove(file_path)
-            print(f"已删除文件: {file_path}")
+        remove_files(paths)
         
         return jsonify({
             'success': True,
@@ -351,32 +754,63 @@ def download_note(note_id):
         if not note:
             return jsonify({'error': '笔记不存在'}), 404
         
-        # 构建完整文件路径
-        file_path = os.path.join(
-            os.path.dirname(os.path.dirname(__file__)),
-            'uploads',
-            str(note.class_id),
-            note.file_path
-        )
+        file_key = note_file_key(note)
         
-        if not os.path.exists(file_path):
+        if not storage.exists(file_key):
             return jsonify({'error': '文件不存在'}), 404
         
-        # 增加下载计数
-        note.increment_download_count()
-        
         # 发送文件
-        return send_file(
-            file_path,
+        response = send_stored_file(
+            file_key,
             as_attachment=True,
             download_name=note.original_filename,
             mimetype=note.mime_type
         )
         
+        # 增加下载计数（续传的分段请求和缓存验证不计入）
+        if is_full_download(response):
+            note.increment_download_count()
+        
+        return response
+        
     except Exception as e:
         print(f"下载笔记失败: {str(e)}")
         return jsonify({'error': '下载笔记失败'}), 500
 
+@notes_bp.route('/notes/<int:note_id>/thumbnail', methods=['GET'])
+@whiteboard_auth_required
+def get_note_thumbnail(note_id):
+    """获取笔记缩略图（图片缩小，PDF 渲染首页）"""
+    note = Note.query.filter_by(
+        id=note_id, 
+        whiteboard_id=request.whiteboard.id
+    ).first()
+    
+    if not note:
+        return jsonify({'error': '笔记不存在'}), 404
+    
+    return send_note_thumbnail(note_file_key(note), note.file_type, processing=note.processing_status == 'pending')
+
+@notes_bp.route('/notes/tags', methods=['GET'])
+@whiteboard_auth_required
+def get_notes_tag_cloud():
+    """获取本班级笔记的标签及使用次数"""
+    limit = request.args.get('limit', type=int)
+    return api_response({
+        'success': True,
+        'tags': tag_cloud(request.whiteboard.class_id, limit)
+    })
+
+@notes_bp.route('/notes/usage', methods=['GET'])
+@whiteboard_auth_required
+def get_notes_usage():
+    """获取本班级和本白板的存储用量与配额"""
+    whiteboard = request.whiteboard
+    return api_response({
+        'success': True,
+        'usage': note_quota.usage(whiteboard.class_id, whiteboard.id)
+    })
+
 @notes_bp.route('/notes/stats', methods=['GET'])
 @whiteboard_auth_required
 def get_notes_stats():
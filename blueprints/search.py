@@ -0,0 +1,111 @@
+from flask import Blueprint, request, jsonify, session
+from extensions import db
+from models.user import User
+from utils.auth_utils import login_required, teacher_required, whiteboard_auth_required
+from utils.search_index import search_index, ENTITIES
+
+search_bp = Blueprint('search', __name__)
+
+def parse_entity_types(raw):
+    """解析 types= 参数，返回 (类型列表, 错误信息)"""
+    if not raw:
+        return list(ENTITIES), None
+    types = [name.strip() for name in raw.split(',') if name.strip()]
+    invalid = sorted(set(types) - set(ENTITIES))
+    if invalid:
+        return None, f'无效的类型: {", ".join(invalid)}'
+    return types, None
+
+def search_response(class_ids, whiteboard_id=None):
+    """执行搜索并加载结果对应的记录，按相关度排序"""
+    query = (request.args.get('q') or '').strip()
+    if not query:
+        return jsonify({'error': '请输入搜索内容'}), 400
+
+    if not search_index.available:
+        return jsonify({'error': '搜索功能不可用'}), 503
+
+    entity_types, error = parse_entity_types(request.args.get('types'))
+    if error:
+        return jsonify({'error': error}), 400
+
+    try:
+        page = max(1, int(request.args.get('page', 1)))
+        per_page = min(max(1, int(request.args.get('per_page', 20))), 100)
+    except ValueError:
+        return jsonify({'error': '分页参数无效'}), 400
+
+    try:
+        total, hits = search_index.search(
+            query,
+            entity_types=entity_types,
+            class_ids=class_ids,
+            whiteboard_id=whiteboard_id,
+            page=page,
+            per_page=per_page
+        )
+
+        # 每种类型一次查询加载记录
+        records = {}
+        for entity_type in {hit[0] for hit in hits}:
+            model = ENTITIES[entity_type][0]
+            ids = [entity_id for hit_type, entity_id, _ in hits if hit_type == entity_type]
+            for obj in model.query.filter(model.id.in_(ids)):
+                records[(entity_type, obj.id)] = obj
+
+        results = []
+        for entity_type, entity_id, score in hits:
+            obj = records.get((entity_type, entity_id))
+            if obj is None:
+                continue
+            results.append({
+                'type': entity_type,
+                'id': entity_id,
+                'score': score,
+                'item': obj.to_dict()
+            })
+
+        pages = (total + per_page - 1) // per_page
+        return jsonify({
+            'success': True,
+            'query': query,
+            'results': results,
+            'pagination': {
+                'page': page,
+                'per_page': per_page,
+                'total': total,
+                'pages': pages,
+                'has_prev': page > 1,
+                'has_next': page < pages
+            }
+        })
+
+    except Exception as e:
+        print(f"搜索失败: {str(e)}")
+        return jsonify({'error': '搜索失败'}), 500
+
+@search_bp.route('/web/search', methods=['GET'])
+@login_required
+@teacher_required
+def web_search():
+    """教师搜索所在班级的笔记、任务、公告和作业"""
+    user = db.session.get(User, session['user_id'])
+    class_ids = user.get_accessible_class_ids()
+
+    class_id = request.args.get('class_id', type=int)
+    if class_id is not None:
+        if class_id not in class_ids:
+            return jsonify({'error': '无权限访问该班级'}), 403
+        class_ids = [class_id]
+
+    return search_response(class_ids)
+
+@search_bp.route('/api/whiteboard/search', methods=['GET'])
+@whiteboard_auth_required
+def whiteboard_search():
+    """白板搜索本白板的笔记、任务、公告和作业"""
+    whiteboard = getattr(request, 'whiteboard', None)
+    if whiteboard is None:
+        # 用户token认证：搜索该教师可以访问的班级
+        return search_response(request.user.get_accessible_class_ids())
+    return search_response([whiteboard.class_id], whiteboard_id=whiteboard.id)
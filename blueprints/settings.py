@@ -146,6 +146,34 @@ def update_class_subjects(class_id):
     
     return redirect(url_for('settings.class_settings', class_id=class_id))
 
+@settings_bp.route('/classes/<int:class_id>/tags', methods=['POST'])
+@login_required
+@teacher_required
+def update_class_tags(class_id):
+    class_obj = Class.query.get_or_404(class_id)
+    user = db.session.get(User, session['user_id'])
+    
+    if class_obj.teacher_id != user.id:
+        flash('只有班主任可以修改班级标签', 'error')
+        return redirect(url_for('settings.class_settings', class_id=class_id))
+    
+    tags_str = request.form.get('tags', '')
+    tags_list = []
+    for tag in tags_str.split(','):
+        tag = tag.strip()
+        if tag and tag not in tags_list:
+            tags_list.append(tag)
+    
+    try:
+        class_obj.tags = ','.join(tags_list) or None
+        db.session.commit()
+        flash('班级标签已更新', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash('更新班级标签失败', 'error')
+    
+    return redirect(url_for('settings.class_settings', class_id=class_id))
+
 @settings_bp.route('/classes/<int:class_id>/invite', methods=['POST'])
 @login_required
 @teacher_required
@@ -1,10 +1,11 @@
 from flask import Blueprint, request, jsonify, session
-from extensions import db, socketio
+from extensions import db
 from models.user import User
 from models.whiteboard import Whiteboard
 from models.task import Task
 from models.class_models import TeacherClass, ClassSubject
 from utils.auth_utils import login_required, teacher_required
+from utils.emit_dispatcher import emit_dispatcher
 from utils.time_utils import parse_datetime_local, format_china_time
 
 tasks_bp = Blueprint('tasks', __name__)
@@ -71,21 +72,23 @@ def create_task(whiteboard_id):
     
     try:
         db.session.add(task)
-        db.session.commit()
+        db.session.flush()
         
-        socketio.emit('new_task', {
+        emit_dispatcher.emit_stream(f"whiteboard_{whiteboard_id}", 'new_task', {
             'id': task.id,
             'title': task.title,
             'description': task.description,
             'priority': task.priority,
             'action_id': task.action_id,
             'subject': task.subject,
-            'due_date': format_china_time(task.due_date),
-            'created_at': format_china_time(task.created_at),
+            'due_date': task.due_date,
+            'created_at': task.created_at,
             'teacher_name': task.teacher.username
-        }, room=f"whiteboard_{whiteboard_id}")
+        })
+        task_id = task.id
+        db.session.commit()
         
-        return jsonify({'success': True, 'task_id': task.id})
+        return jsonify({'success': True, 'task_id': task_id})
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': f'创建任务失败: {str(e)}'}), 500
@@ -103,8 +106,8 @@ def delete_task(task_id):
     try:
         whiteboard_id = task.whiteboard_id
         db.session.delete(task)
+        emit_dispatcher.emit_stream(f"whiteboard_{whiteboard_id}", 'delete_task', {'task_id': task_id})
         db.session.commit()
-        socketio.emit('delete_task', {'task_id': task_id}, room=f"whiteboard_{whiteboard_id}")
         return jsonify({'success': True})
     except Exception as e:
         db.session.rollback()
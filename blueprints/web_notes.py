@@ -1,14 +1,70 @@
-from flask import Blueprint, render_template, redirect, url_for, session, request, flash, jsonify, send_file
-import os
+from flask import Blueprint, render_template, redirect, url_for, session, request, flash, jsonify, current_app, Response
+from sqlalchemy.orm import joinedload
 from extensions import db
 from models.user import User
 from models.class_models import Class, TeacherClass
 from models.note import Note
 from models.whiteboard import Whiteboard
 from utils.auth_utils import login_required, teacher_required
+from utils.blob_store import note_file_key, delete_note, remove_files
+from utils.file_serving import send_stored_file, send_note_thumbnail, is_full_download
+from utils.storage import storage, content_disposition
+from utils.search_index import search_index
+from utils.note_tags import filter_by_tag, tag_cloud
+from utils.note_stats import class_note_stats, count_notes
+from utils.note_quota import note_quota
+from utils.pagination import keyset_page, count_cache, CursorError
+from utils.time_utils import parse_date_range
+from utils.zip_stream import stream_zip, zip_entry_name
 
 web_notes_bp = Blueprint('web_notes', __name__, url_prefix='/web/notes')
 
+def filter_class_notes(query, class_id):
+    """按请求参数筛选班级笔记：白板、文件类型、标签、搜索和上传日期（date 或 from/to）
+    
+    返回 (查询, 统计表筛选条件)；带标签或搜索时统计表无法计算总数，筛选条件为 None。
+    日期参数无效时抛出 ValueError。
+    """
+    whiteboard_id = request.args.get('whiteboard_id', type=int)
+    file_type = request.args.get('file_type')
+    tag = request.args.get('tag')
+    search = request.args.get('search')
+    start, end, _ = parse_date_range(
+        request.args.get('date'),
+        request.args.get('from'),
+        request.args.get('to'),
+        current_app.config.get('NOTE_MAX_RANGE_DAYS', 366)
+    )
+    
+    # 白板筛选
+    if whiteboard_id:
+        query = query.filter(Note.whiteboard_id == whiteboard_id)
+    
+    # 文件类型筛选
+    if file_type:
+        query = query.filter(Note.file_type == file_type.lower())
+    
+    # 标签筛选
+    if tag:
+        query = filter_by_tag(query, class_id, tag)
+    
+    # 搜索筛选
+    if search:
+        query = search_index.filter_query(
+            query, 'note', search,
+            (Note.title, Note.description, Note.original_filename),
+            class_ids=[class_id]
+        )
+    
+    # 上传日期筛选
+    if start is not None:
+        query = query.filter(Note.created_at >= start, Note.created_at < end)
+    
+    stats_filters = None
+    if not tag and not search:
+        stats_filters = {'whiteboard_id': whiteboard_id, 'file_type': file_type, 'start': start, 'end': end}
+    return query, stats_filters
+
 @web_notes_bp.route('/classes/<int:class_id>/notes', methods=['GET'])
 @login_required
 @teacher_required
@@ -38,40 +94,51 @@ def get_class_notes(class_id):
         # 获取查询参数
         page = int(request.args.get('page', 1))
         per_page = int(request.args.get('per_page', 20))
-        whiteboard_id = request.args.get('whiteboard_id')
-        file_type = request.args.get('file_type')
-        search = request.args.get('search')
         
         # 构建查询
-        query = Note.query.filter_by(class_id=class_id)
-        
-        # 白板筛选
-        if whiteboard_id:
-            query = query.filter(Note.whiteboard_id == whiteboard_id)
-        
-        # 文件类型筛选
-        if file_type:
-            query = query.filter(Note.file_type == file_type.lower())
+        try:
+            query, stats_filters = filter_class_notes(Note.query.filter_by(class_id=class_id), class_id)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # 搜索筛选
-        if search:
-            search_pattern = f'%{search}%'
-            query = query.filter(
-                db.or_(
-                    Note.title.like(search_pattern),
-                    Note.description.like(search_pattern),
-                    Note.original_filename.like(search_pattern)
-                )
+        # 传入 cursor 参数（第一页为空）时使用游标分页，不统计总数、不使用 OFFSET
+        if 'cursor' in request.args:
+            per_page = min(max(1, per_page), 100)
+            notes, next_cursor = keyset_page(
+                query, Note.id, 'created_at:desc', Note.created_at, True, request.args.get('cursor'), per_page
             )
+            pagination_data = {
+                'per_page': per_page,
+                'next_cursor': next_cursor,
+                'has_next': next_cursor is not None
+            }
+            
+            if request.args.get('with_total') in ('1', 'true'):
+                if stats_filters is not None:
+                    pagination_data['total'] = count_notes(class_id, **stats_filters)
+                else:
+                    pagination_data['total'] = count_cache.get(
+                        ('class_notes', class_id) + tuple(
+                            request.args.get(name) for name in ('whiteboard_id', 'file_type', 'tag', 'search', 'date', 'from', 'to')
+                        ),
+                        lambda: query.order_by(None).count()
+                    )
+        else:
+            # 分页
+            pagination = query.order_by(Note.created_at.desc()).paginate(
+                page=page, 
+                per_page=per_page, 
+                error_out=False
+            )
+            notes = pagination.items
+            pagination_data = {
+                'page': page,
+                'per_page': per_page,
+                'total': pagination.total,
+                'pages': pagination.pages
+            }
         
-        # 分页
-        pagination = query.order_by(Note.created_at.desc()).paginate(
-            page=page, 
-            per_page=per_page, 
-            error_out=False
-        )
-        
-        notes_data = [note.to_dict() for note in pagination.items]
+        notes_data = [note.to_dict() for note in notes]
         
         # 获取班级的所有白板
         whiteboards = Whiteboard.query.filter_by(class_id=class_id).all()
@@ -84,18 +151,179 @@ def get_class_notes(class_id):
             'success': True,
             'notes': notes_data,
             'whiteboards': whiteboards_data,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': pagination.total,
-                'pages': pagination.pages
-            }
+            'pagination': pagination_data
         })
         
+    except CursorError as e:
+        return jsonify({'error': str(e)}), 400
+        
     except Exception as e:
         print(f"获取班级笔记失败: {str(e)}")
         return jsonify({'error': '获取班级笔记失败'}), 500
 
+@web_notes_bp.route('/classes/<int:class_id>/export.zip', methods=['GET'])
+@login_required
+@teacher_required
+def export_class_notes(class_id):
+    """将班级笔记打包为 ZIP 下载，筛选参数与笔记列表相同
+    
+    压缩包边读文件边生成，按白板分目录；图片、PDF、Office 等已压缩的格式直接存储。
+    """
+    user = db.session.get(User, session['user_id'])
+    
+    # 检查权限
+    class_obj = Class.query.get_or_404(class_id)
+    has_permission = False
+    
+    if class_obj.teacher_id == user.id:
+        has_permission = True
+    else:
+        teacher_class = TeacherClass.query.filter_by(
+            class_id=class_id,
+            teacher_id=user.id,
+            is_approved=True
+        ).first()
+        if teacher_class:
+            has_permission = True
+    
+    if not has_permission:
+        return jsonify({'error': '无权限访问该班级的笔记'}), 403
+    
+    try:
+        query, _ = filter_class_notes(Note.query.filter_by(class_id=class_id), class_id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # 开始输出前读取所需的全部信息，生成压缩包时不再访问数据库
+    notes = query.options(joinedload(Note.whiteboard)) \
+        .order_by(Note.whiteboard_id, Note.created_at).all()
+    if not notes:
+        return jsonify({'error': '没有符合条件的笔记'}), 404
+    
+    used_names = set()
+    entries = []
+    for note in notes:
+        folder = (note.whiteboard.name if note.whiteboard else '未知白板').replace('/', '_').replace('\\', '_')
+        filename = note.original_filename.replace('/', '_').replace('\\', '_')
+        file_key = note_file_key(note)
+        entries.append((
+            zip_entry_name(f"{folder}/{filename}", used_names),
+            note.file_size,
+            note.created_at,
+            lambda file_key=file_key: storage.open(file_key)
+        ))
+    
+    response = Response(stream_zip(entries), mimetype='application/zip')
+    response.headers['Content-Disposition'] = content_disposition(f"{class_obj.name}-笔记.zip", True)
+    # 让 nginx 边生成边发送，不缓冲整个响应
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@web_notes_bp.route('/classes/<int:class_id>/tags', methods=['GET'])
+@login_required
+@teacher_required
+def get_class_tag_cloud(class_id):
+    """获取班级笔记的标签及使用次数（标签云）"""
+    user = db.session.get(User, session['user_id'])
+    
+    # 检查权限
+    class_obj = Class.query.get_or_404(class_id)
+    has_permission = False
+    
+    if class_obj.teacher_id == user.id:
+        has_permission = True
+    else:
+        teacher_class = TeacherClass.query.filter_by(
+            class_id=class_id,
+            teacher_id=user.id,
+            is_approved=True
+        ).first()
+        if teacher_class:
+            has_permission = True
+    
+    if not has_permission:
+        return jsonify({'error': '无权限访问该班级的笔记'}), 403
+    
+    limit = request.args.get('limit', type=int)
+    return jsonify({
+        'success': True,
+        'tags': tag_cloud(class_id, limit)
+    })
+
+@web_notes_bp.route('/classes/<int:class_id>/stats', methods=['GET'])
+@login_required
+@teacher_required
+def get_class_notes_stats(class_id):
+    """获取班级笔记统计（按文件类型、白板和日期汇总），读取增量维护的统计表"""
+    user = db.session.get(User, session['user_id'])
+    
+    # 检查权限
+    class_obj = Class.query.get_or_404(class_id)
+    has_permission = False
+    
+    if class_obj.teacher_id == user.id:
+        has_permission = True
+    else:
+        teacher_class = TeacherClass.query.filter_by(
+            class_id=class_id,
+            teacher_id=user.id,
+            is_approved=True
+        ).first()
+        if teacher_class:
+            has_permission = True
+    
+    if not has_permission:
+        return jsonify({'error': '无权限访问该班级的笔记'}), 403
+    
+    days = min(max(1, request.args.get('days', 30, type=int)), current_app.config.get('NOTE_MAX_RANGE_DAYS', 366))
+    
+    try:
+        stats = class_note_stats(class_id, days)
+        stats['total_size_formatted'] = Note(file_size=stats['total_size']).format_file_size()
+        return jsonify({
+            'success': True,
+            'stats': stats
+        })
+        
+    except Exception as e:
+        print(f"获取笔记统计失败: {str(e)}")
+        return jsonify({'error': '获取笔记统计失败'}), 500
+
+@web_notes_bp.route('/classes/<int:class_id>/usage', methods=['GET'])
+@login_required
+@teacher_required
+def get_class_notes_usage(class_id):
+    """获取班级及各白板的笔记存储用量与配额"""
+    user = db.session.get(User, session['user_id'])
+    
+    # 检查权限
+    class_obj = Class.query.get_or_404(class_id)
+    has_permission = False
+    
+    if class_obj.teacher_id == user.id:
+        has_permission = True
+    else:
+        teacher_class = TeacherClass.query.filter_by(
+            class_id=class_id,
+            teacher_id=user.id,
+            is_approved=True
+        ).first()
+        if teacher_class:
+            has_permission = True
+    
+    if not has_permission:
+        return jsonify({'error': '无权限访问该班级的笔记'}), 403
+    
+    try:
+        return jsonify({
+            'success': True,
+            'usage': note_quota.class_usage(class_id)
+        })
+        
+    except Exception as e:
+        print(f"获取存储用量失败: {str(e)}")
+        return jsonify({'error': '获取存储用量失败'}), 500
+
 @web_notes_bp.route('/notes/<int:note_id>', methods=['DELETE'])
 @login_required
 @teacher_required
@@ -123,21 +351,10 @@ def delete_class_note(note_id):
         return jsonify({'error': '无权限删除该笔记'}), 403
     
     try:
-        # 构建完整文件路径
-        file_path = os.path.join(
-            os.path.dirname(os.path.dirname(__file__)),
-            'uploads',
-            str(note.class_id),
-            note.file_path
-        )
-        
-        # 删除数据库记录
-        db.session.delete(note)
+        # 删除数据库记录，文件的最后一个引用被移除后才删除物理文件
+        paths = delete_note(note)
         db.session.commit()
-        
-        # 删除物理文件
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        remove_files(paths)
         
         return jsonify({
             'success': True,
@@ -175,33 +392,51 @@ def preview_note(note_id):
         return jsonify({'error': '无权限预览该笔记'}), 403
     
     try:
-        # 构建完整文件路径
-        file_path = os.path.join(
-            os.path.dirname(os.path.dirname(__file__)),
-            'uploads',
-            str(note.class_id),
-            note.file_path
-        )
+        file_key = note_file_key(note)
         
-        if not os.path.exists(file_path):
+        if not storage.exists(file_key):
             return jsonify({'error': '文件不存在'}), 404
-        response = send_file(
-            file_path,
-            as_attachment=False,  # 不作为附件下载
+        
+        # 不作为附件下载，浏览器内联显示；支持分段请求，预览大文件时按需加载
+        return send_stored_file(
+            file_key,
+            as_attachment=False,
             download_name=note.original_filename,
             mimetype=note.mime_type
         )
         
-        # 对于某些文件类型，设置inline显示
-        if note.file_type in ['pdf', 'png', 'jpg', 'jpeg', 'gif', 'bmp']:
-            response.headers['Content-Disposition'] = f'inline; filename="{note.original_filename}"'
-        
-        return response
-        
     except Exception as e:
         print(f"预览笔记失败: {str(e)}")
         return jsonify({'error': '预览笔记失败'}), 500
 
+@web_notes_bp.route('/notes/<int:note_id>/thumbnail')
+@login_required
+@teacher_required
+def note_thumbnail(note_id):
+    """笔记缩略图，用于列表中的预览图"""
+    user = db.session.get(User, session['user_id'])
+    
+    note = Note.query.get_or_404(note_id)
+    
+    # 检查权限：班主任或笔记所在班级的授课教师
+    has_permission = False
+    
+    if note.class_obj.teacher_id == user.id:
+        has_permission = True
+    else:
+        teacher_class = TeacherClass.query.filter_by(
+            class_id=note.class_id,
+            teacher_id=user.id,
+            is_approved=True
+        ).first()
+        if teacher_class:
+            has_permission = True
+    
+    if not has_permission:
+        return jsonify({'error': '无权限预览该笔记'}), 403
+    
+    return send_note_thumbnail(note_file_key(note), note.file_type, processing=note.processing_status == 'pending')
+
 @web_notes_bp.route('/notes/<int:note_id>/download')
 @login_required
 @teacher_required
@@ -230,30 +465,26 @@ def download_note(note_id):
         return redirect(url_for('classes.classes'))
     
     try:
-        # 构建完整文件路径
-        file_path = os.path.join(
-            os.path.dirname(os.path.dirname(__file__)),
-            'uploads',
-            str(note.class_id),
-            note.file_path
-        )
+        file_key = note_file_key(note)
         
-        if not os.path.exists(file_path):
+        if not storage.exists(file_key):
             flash('文件不存在', 'error')
             return redirect(url_for('web_notes.class_notes_page', class_id=note.class_id))
         
-        # 增加下载计数
-        note.download_count += 1
-        db.session.commit()
-        
         # 发送文件
-        return send_file(
-            file_path,
+        response = send_stored_file(
+            file_key,
             as_attachment=True,
             download_name=note.original_filename,
             mimetype=note.mime_type
         )
         
+        # 增加下载计数（续传的分段请求和缓存验证不计入）
+        if is_full_download(response):
+            note.increment_download_count()
+        
+        return response
+        
     except Exception as e:
         print(f"下载笔记失败: {str(e)}")
         flash('下载笔记失败', 'error')
@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, redirect, url_for, session, request, flash, jsonify
+from flask import Blueprint, render_template, redirect, url_for, session, request, flash, jsonify, current_app
 from datetime import timedelta
 from extensions import db, socketio
 from models.user import User
@@ -9,7 +9,7 @@ from models.assignment import Assignment
 from models.announcement import Announcement
 from utils.auth_utils import login_required, teacher_required
 from utils.code_utils import generate_whiteboard_credentials
-from utils.time_utils import get_china_time, format_china_time, parse_china_time
+from utils.time_utils import get_china_time, format_china_time, format_china_date, parse_date_range, group_by_day
 from utils.classworkskv_utils import test_classworkskv_connection, connect_whiteboard_to_classworkskv
 
 whiteboards_bp = Blueprint('whiteboards', __name__, url_prefix='/whiteboards')
@@ -231,7 +231,7 @@ def get_whiteboard_status(whiteboard_id):
     whiteboard = Whiteboard.query.get_or_404(whiteboard_id)
     user = db.session.get(User, session['user_id'])
     
-    if user.role != 'teacher' or whiteboard.class_obj.teacher_id != user.id:
+    if user.role != 'teacher' or whiteboard.class_id not in user.get_accessible_class_ids():
         return jsonify({'error': '无权限'}), 403
     
     is_actually_online = False
@@ -258,62 +258,74 @@ def get_history(whiteboard_id):
     if user.role != 'teacher' or whiteboard.class_obj.teacher_id != user.id:
         return jsonify({'error': '无权限'}), 403
     
-    date_str = request.args.get('date')
-    if not date_str:
+    if not request.args.get('date') and not request.args.get('from'):
         return jsonify({'error': '需要日期参数'}), 400
     
+    # 支持单日（date）或日期范围（from/to），范围查询时按天分组返回
     try:
-        target_date = parse_china_time(date_str + ' 00:00:00')
-        next_date = target_date + timedelta(days=1)
-    except ValueError:
-        return jsonify({'error': '日期格式无效'}), 400
+        start, end, ranged = parse_date_range(
+            request.args.get('date'),
+            request.args.get('from'),
+            request.args.get('to'),
+            current_app.config.get('FEED_MAX_RANGE_DAYS', 31)
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     tasks = Task.query.filter(
         Task.whiteboard_id == whiteboard_id,
-        Task.created_at >= target_date,
-        Task.created_at < next_date
+        Task.created_at >= start,
+        Task.created_at < end
     ).all()
     
     announcements = Announcement.query.filter(
         Announcement.whiteboard_id == whiteboard_id,
-        Announcement.created_at >= target_date,
-        Announcement.created_at < next_date
+        Announcement.created_at >= start,
+        Announcement.created_at < end
     ).all()
     
     assignments = Assignment.query.filter(
         Assignment.whiteboard_id == whiteboard_id,
-        Assignment.created_at >= target_date,
-        Assignment.created_at < next_date
+        Assignment.created_at >= start,
+        Assignment.created_at < end
     ).all()
     
     history = []
     for task in tasks:
-        history.append({
+        history.append((task.created_at, {
             'type': '任务',
             'title': task.title,
             'description': task.description,
             'created_at': format_china_time(task.created_at)
-        })
+        }))
     
     for announcement in announcements:
-        history.append({
+        history.append((announcement.created_at, {
             'type': '公告',
             'title': announcement.title,
             'description': announcement.content[:100] + '...' if len(announcement.content) > 100 else announcement.content,
             'created_at': format_china_time(announcement.created_at)
-        })
+        }))
     
     for assignment in assignments:
-        history.append({
+        history.append((assignment.created_at, {
             'type': '作业',
             'title': assignment.title,
             'description': f"{assignment.subject}: {assignment.description[:100]}{'...' if len(assignment.description) > 100 else ''}",
             'created_at': format_china_time(assignment.created_at)
-        })
+        }))
+    
+    history.sort(key=lambda x: x[0], reverse=True)
     
-    history.sort(key=lambda x: x['created_at'], reverse=True)
+    if ranged:
+        return jsonify({
+            'success': True,
+            'from': format_china_date(start),
+            'to': format_china_date(end - timedelta(days=1)),
+            'days': group_by_day(history, start, end)
+        })
     
-    return jsonify({'success': True, 'data': history})
+    return jsonify({'success': True, 'data': [item for _, item in history]})
 
 @whiteboards_bp.route('/<int:whiteboard_id>/connect_classworkskv', methods=['POST'])
 @login_required
@@ -39,4 +39,103 @@ class Config:
     CLASSWORKS_ID = os.environ.get('CLASSWORKS_ID', 'aaaaaaa')
     CLASSWORKS_PASS = os.environ.get('CLASSWORKS_PASS', 'bbbbbbb')
 
-    PORT = os.environ.get('PORT', '5000')
\ No newline at end of file
+    PORT = os.environ.get('PORT', '5000')
+
+    # 白板重连准入控制
+    CONNECT_QUEUE_SIZE = int(os.environ.get('CONNECT_QUEUE_SIZE', 1000))  # 待写入的在线状态变更上限
+    CONNECT_BATCH_SIZE = int(os.environ.get('CONNECT_BATCH_SIZE', 100))  # 每批合并提交的变更数
+    CONNECT_FLUSH_INTERVAL = float(os.environ.get('CONNECT_FLUSH_INTERVAL', 0.2))  # 批处理等待间隔（秒）
+    CONNECT_MAX_CONCURRENT_AUTH = int(os.environ.get('CONNECT_MAX_CONCURRENT_AUTH', 8))  # 同时进行的连接认证查询数
+    CONNECT_AUTH_TIMEOUT = float(os.environ.get('CONNECT_AUTH_TIMEOUT', 0.5))  # 等待认证名额的时间（秒）
+    CONNECT_RETRY_AFTER_BASE = float(os.environ.get('CONNECT_RETRY_AFTER_BASE', 2))  # 建议重连间隔基数（秒）
+    CONNECT_RETRY_AFTER_JITTER = float(os.environ.get('CONNECT_RETRY_AFTER_JITTER', 8))  # 重连间隔随机抖动（秒）
+
+    # 白板实时事件补发缓冲区（每个房间保留的事件条数）
+    EVENT_REPLAY_BUFFER_SIZE = int(os.environ.get('EVENT_REPLAY_BUFFER_SIZE', 200))
+
+    # Socket.IO 出站队列配置
+    SOCKETIO_CLIENT_QUEUE_DEPTH = int(os.environ.get('SOCKETIO_CLIENT_QUEUE_DEPTH', 100))  # 每个连接积压超过该数时丢弃旧的状态消息
+    SOCKETIO_CLIENT_QUEUE_MAX_DEPTH = int(os.environ.get('SOCKETIO_CLIENT_QUEUE_MAX_DEPTH', 1000))  # 积压达到该数时立即断开连接
+    SOCKETIO_SLOW_CONSUMER_TIMEOUT = float(os.environ.get('SOCKETIO_SLOW_CONSUMER_TIMEOUT', 30))  # 积压持续超过深度多久后断开连接（秒）
+    SOCKETIO_TRANSPORT_HIGH_WATER = int(os.environ.get('SOCKETIO_TRANSPORT_HIGH_WATER', 50))  # 底层发送队列高水位
+
+    # 白板内容日期范围查询最多跨越的天数
+    FEED_MAX_RANGE_DAYS = int(os.environ.get('FEED_MAX_RANGE_DAYS', 31))
+
+    # 白板笔记上传配置
+    NOTE_SIMPLE_UPLOAD_MAX_SIZE = int(os.environ.get('NOTE_SIMPLE_UPLOAD_MAX_SIZE', 10 * 1024 * 1024))  # 单次上传最大文件大小（字节）
+    NOTE_MAX_FILE_SIZE = int(os.environ.get('NOTE_MAX_FILE_SIZE', 200 * 1024 * 1024))  # 分片上传最大文件大小（字节）
+    NOTE_UPLOAD_CHUNK_SIZE = int(os.environ.get('NOTE_UPLOAD_CHUNK_SIZE', 5 * 1024 * 1024))  # 单个分片最大大小（字节）
+    NOTE_UPLOAD_EXPIRE_HOURS = int(os.environ.get('NOTE_UPLOAD_EXPIRE_HOURS', 24))  # 未完成的上传保留时间（小时）
+
+    # 事务提交后发送Socket事件的线程数
+    EMIT_DISPATCHER_WORKERS = int(os.environ.get('EMIT_DISPATCHER_WORKERS', 4))
+
+    # /metrics 访问令牌（为空时只允许已登录的开发者账号访问）
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+    # 笔记文件发送方式：为空时由 Flask 发送；x-sendfile（Apache/lighttpd）或 x-accel-redirect（nginx）时由前端服务器发送
+    FILE_SERVE_OFFLOAD = os.environ.get('FILE_SERVE_OFFLOAD', '').lower()
+    FILE_ACCEL_REDIRECT_PREFIX = os.environ.get('FILE_ACCEL_REDIRECT_PREFIX', '/_protected_uploads/')  # nginx internal location，对应 uploads 目录
+
+    # 笔记文件签名链接配置
+    FILE_URL_SECRET = os.environ.get('FILE_URL_SECRET')  # 签名密钥，为空时由 SECRET_KEY 派生
+    FILE_URL_TTL = int(os.environ.get('FILE_URL_TTL', 6 * 3600))  # 链接最短有效期（秒）
+    FILE_URL_ROUND = int(os.environ.get('FILE_URL_ROUND', 600))  # 过期时间取整粒度（秒），同一时段内链接不变
+
+    # 笔记缩略图配置（需要 Pillow，PDF 首页需要 PyMuPDF）
+    THUMBNAIL_WORKERS = int(os.environ.get('THUMBNAIL_WORKERS', 2))  # 生成缩略图的进程数
+    THUMBNAIL_QUEUE_SIZE = int(os.environ.get('THUMBNAIL_QUEUE_SIZE', 16))  # 排队中的任务上限，超出时放弃
+    THUMBNAIL_MAX_SIZE = int(os.environ.get('THUMBNAIL_MAX_SIZE', 320))  # 缩略图最长边（像素）
+    THUMBNAIL_FORMAT = os.environ.get('THUMBNAIL_FORMAT', 'webp')  # webp 或 jpeg
+    THUMBNAIL_QUALITY = int(os.environ.get('THUMBNAIL_QUALITY', 80))
+
+    # 全文搜索配置（SQLite 使用 FTS5，PostgreSQL 使用 tsvector，其他数据库退回 LIKE 查询）
+    SEARCH_INDEX_ENABLED = os.environ.get('SEARCH_INDEX_ENABLED', 'true').lower() == 'true'
+    SEARCH_MAX_CONTENT_CHARS = int(os.environ.get('SEARCH_MAX_CONTENT_CHARS', 200000))  # 每个文件最多索引的字符数
+
+    # 笔记下载计数写回数据库的间隔（秒）
+    DOWNLOAD_COUNT_FLUSH_INTERVAL = int(os.environ.get('DOWNLOAD_COUNT_FLUSH_INTERVAL', 10))
+
+    # 笔记文件存储：local（本地 uploads 目录）或 s3（S3 兼容的对象存储，需要安装 boto3）
+    NOTE_STORAGE_BACKEND = os.environ.get('NOTE_STORAGE_BACKEND', 'local')
+    S3_BUCKET = os.environ.get('S3_BUCKET', 'dynamic-class-notes')
+    S3_PREFIX = os.environ.get('S3_PREFIX', '')  # 对象键前缀，多个环境共用一个存储桶时使用
+    S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL')  # MinIO 等自建服务的地址，AWS S3 留空
+    S3_PUBLIC_ENDPOINT_URL = os.environ.get('S3_PUBLIC_ENDPOINT_URL')  # 客户端访问预签名链接使用的地址，默认与 S3_ENDPOINT_URL 相同
+    S3_REGION = os.environ.get('S3_REGION')
+    S3_ACCESS_KEY = os.environ.get('S3_ACCESS_KEY')
+    S3_SECRET_KEY = os.environ.get('S3_SECRET_KEY')
+    S3_PRESIGNED_URL_TTL = int(os.environ.get('S3_PRESIGNED_URL_TTL', 300))  # 预签名链接有效期（秒）
+
+    # 班级笔记按上传日期筛选（列表和打包下载）的最大天数
+    NOTE_MAX_RANGE_DAYS = int(os.environ.get('NOTE_MAX_RANGE_DAYS', 366))
+
+    # 笔记列表游标分页时，带搜索或标签筛选的总数缓存时间（秒）
+    NOTE_COUNT_CACHE_TTL = int(os.environ.get('NOTE_COUNT_CACHE_TTL', 60))
+
+    # 笔记上传后处理队列（类型识别、文本提取、缩略图）
+    NOTE_JOB_WORKERS = int(os.environ.get('NOTE_JOB_WORKERS', 2))  # 每个进程的工作线程数，0 表示不在本进程执行
+    NOTE_JOB_MAX_ATTEMPTS = int(os.environ.get('NOTE_JOB_MAX_ATTEMPTS', 3))  # 失败后最多执行的次数
+    NOTE_JOB_RETRY_DELAY = int(os.environ.get('NOTE_JOB_RETRY_DELAY', 30))  # 首次重试的延迟（秒），之后逐次加倍
+    NOTE_JOB_POLL_INTERVAL = int(os.environ.get('NOTE_JOB_POLL_INTERVAL', 5))  # 空闲时检查新任务的间隔（秒）
+    NOTE_JOB_TIMEOUT = int(os.environ.get('NOTE_JOB_TIMEOUT', 600))  # 单个任务的超时时间（秒）
+    NOTE_JOB_HANDLER_THREADS = int(os.environ.get('NOTE_JOB_HANDLER_THREADS', 4))  # 执行处理函数的线程数上限，含超时后仍在运行的
+
+    # 上传目录与笔记记录核对
+    RECONCILE_INTERVAL_HOURS = int(os.environ.get('RECONCILE_INTERVAL_HOURS', 24))  # 定时核对的间隔（小时），0 表示不定时核对
+    RECONCILE_CLASSES_PER_RUN = int(os.environ.get('RECONCILE_CLASSES_PER_RUN', 50))  # 每次定时核对处理的班级目录数
+    RECONCILE_FIX = os.environ.get('RECONCILE_FIX', 'false').lower() == 'true'  # 定时核对时删除孤立文件和悬空记录
+    RECONCILE_WORKERS = int(os.environ.get('RECONCILE_WORKERS', 4))  # 并行遍历班级目录的线程数
+    RECONCILE_BATCH_SIZE = int(os.environ.get('RECONCILE_BATCH_SIZE', 1000))  # 每批读取的文件记录数
+    RECONCILE_MIN_AGE = int(os.environ.get('RECONCILE_MIN_AGE', 3600))  # 最近修改的文件视为正在上传，不参与核对（秒）
+
+    # 笔记存储配额（按笔记的文件大小计算，0 表示不限制）
+    NOTE_CLASS_QUOTA_BYTES = int(os.environ.get('NOTE_CLASS_QUOTA_BYTES', 0))  # 每个班级的总大小
+    NOTE_CLASS_QUOTA_FILES = int(os.environ.get('NOTE_CLASS_QUOTA_FILES', 0))  # 每个班级的文件数
+    NOTE_WHITEBOARD_QUOTA_BYTES = int(os.environ.get('NOTE_WHITEBOARD_QUOTA_BYTES', 0))  # 每个白板的总大小
+    NOTE_WHITEBOARD_QUOTA_FILES = int(os.environ.get('NOTE_WHITEBOARD_QUOTA_FILES', 0))  # 每个白板的文件数
+
+    # 笔记批量上传
+    NOTE_BATCH_MAX_FILES = int(os.environ.get('NOTE_BATCH_MAX_FILES', 50))  # 单次最多上传的文件数
+    NOTE_BATCH_MAX_SIZE = int(os.environ.get('NOTE_BATCH_MAX_SIZE', 100 * 1024 * 1024))  # 单次上传的总大小（字节）
\ No newline at end of file
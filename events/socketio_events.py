@@ -1,11 +1,44 @@
 from extensions import socketio, db
 from flask import session, request
-from flask_socketio import emit, join_room, leave_room
+from flask_socketio import emit, join_room, leave_room, ConnectionRefusedError
 from models.user import User
-from models.class_models import Class
-from models.whiteboard import Whiteboard, WhiteboardStatusHistory
+from models.whiteboard import Whiteboard
 from models.task import Task
 from utils.time_utils import get_china_time, format_china_time
+from utils.connect_admission import connect_admission
+from utils.event_stream import event_stream
+from utils.outbound_queue import outbound_queue
+from utils.emit_dispatcher import emit_dispatcher
+from utils.serialization import msgpack_available
+
+# Socket会话ID -> {'whiteboard_id': 白板ID, 'class_id': 班级ID}
+board_sessions = {}
+
+def replay_missed_events(room, last_seq, epoch=None):
+    """加入房间并向当前连接补发 last_seq 之后的事件，缓冲区不足时要求全量同步"""
+    replayed = event_stream.subscribe(room, request.sid, last_seq, epoch)
+    if replayed is None:
+        outbound_queue.emit('resync_required', {
+            'room': room,
+            'last_seq': event_stream.last_seq(room),
+            'stream_epoch': event_stream.epoch
+        }, to=request.sid)
+        return False
+    
+    outbound_queue.emit('replay_complete', {
+        'room': room,
+        'replayed': replayed,
+        'last_seq': event_stream.last_seq(room),
+        'stream_epoch': event_stream.epoch
+    }, to=request.sid)
+    return True
+
+def join_class_teacher_rooms(user):
+    """教师加入所有可访问班级的房间，返回班级ID列表"""
+    class_ids = user.get_accessible_class_ids()
+    for class_id in class_ids:
+        join_room(f"class_teachers_{class_id}")
+    return class_ids
 
 @socketio.on('connect')
 def handle_connect():
@@ -14,29 +47,55 @@ def handle_connect():
         secret_key = request.args.get('secret_key')
         
         if board_id and secret_key:
-            whiteboard = Whiteboard.query.filter_by(board_id=board_id, secret_key=secret_key).first()
+            # 限制认证查询并发，重连风暴时让客户端稍后重试
+            if not connect_admission.acquire_auth_slot():
+                raise ConnectionRefusedError({
+                    'status': 'busy',
+                    'message': '服务器繁忙，请稍后重连',
+                    'retry_after': connect_admission.retry_after()
+                })
+            try:
+                whiteboard = Whiteboard.query.filter_by(board_id=board_id, secret_key=secret_key).first()
+            finally:
+                connect_admission.release_auth_slot()
+            
             if whiteboard:
-                join_room(f"whiteboard_{whiteboard.id}")
-                
+                # 在线状态与状态历史交给批处理线程写入
                 current_time = get_china_time().replace(tzinfo=None)
-                whiteboard.is_online = True
-                whiteboard.last_heartbeat = current_time
-                db.session.commit()
-                
-                status_history = WhiteboardStatusHistory(
-                    whiteboard_id=whiteboard.id,
-                    is_online=True
-                )
-                db.session.add(status_history)
-                db.session.commit()
+                if not connect_admission.submit_presence(whiteboard.id, whiteboard.class_id, True, heartbeat=current_time):
+                    raise ConnectionRefusedError({
+                        'status': 'busy',
+                        'message': '服务器繁忙，请稍后重连',
+                        'retry_after': connect_admission.retry_after()
+                    })
                 
-                socketio.emit('whiteboard_status_update', {
+                # 客户端可通过 encoding=msgpack 选择二进制编码
+                encoding = 'msgpack' if request.args.get('encoding') == 'msgpack' and msgpack_available() else 'json'
+                outbound_queue.register(request.sid, encoding)
+                board_sessions[request.sid] = {
                     'whiteboard_id': whiteboard.id,
-                    'is_online': True,
-                    'last_heartbeat': format_china_time(current_time)
-                }, room=f"teacher_{whiteboard.class_obj.teacher_id}")
+                    'class_id': whiteboard.class_id
+                }
+                emit('connected', {
+                    'status': 'success',
+                    'message': '认证成功',
+                    'last_seq': event_stream.last_seq(f"whiteboard_{whiteboard.id}"),
+                    'class_last_seq': event_stream.last_seq(f"class_{whiteboard.class_id}"),
+                    'stream_epoch': event_stream.epoch,
+                    'encoding': encoding
+                })
                 
-                emit('connected', {'status': 'success', 'message': '认证成功'})
+                # 加入房间；客户端带上最后收到的序号时补发断线期间的事件
+                epoch = request.args.get('stream_epoch')
+                streams = [
+                    (f"whiteboard_{whiteboard.id}", request.args.get('last_seq')),
+                    (f"class_{whiteboard.class_id}", request.args.get('class_last_seq'))
+                ]
+                for room, last_seq in streams:
+                    if last_seq is not None and last_seq.isdigit():
+                        replay_missed_events(room, int(last_seq), epoch)
+                    else:
+                        event_stream.subscribe(room, request.sid)
                 return True
             else:
                 emit('connected', {'status': 'error', 'message': '认证失败'})
@@ -47,26 +106,33 @@ def handle_connect():
                 user = db.session.get(User, user_id)
                 if user and user.role == 'teacher':
                     join_room(f"teacher_{user_id}")
+                    class_ids = join_class_teacher_rooms(user)
+                    outbound_queue.register(request.sid)
                     
-                    classes = Class.query.filter_by(teacher_id=user_id).all()
-                    for class_obj in classes:
-                        for whiteboard in class_obj.whiteboards:
-                            is_actually_online = False
-                            if whiteboard.last_heartbeat:
-                                time_diff = (get_china_time().replace(tzinfo=None) - whiteboard.last_heartbeat).total_seconds()
-                                is_actually_online = time_diff < 30
-                            
-                            if whiteboard.is_online != is_actually_online:
-                                whiteboard.is_online = is_actually_online
-                                db.session.commit()
-                            
-                            socketio.emit('whiteboard_status_update', {
-                                'whiteboard_id': whiteboard.id,
-                                'is_online': whiteboard.is_online,
-                                'last_heartbeat': format_china_time(whiteboard.last_heartbeat) if whiteboard.last_heartbeat else None
-                            }, room=f"teacher_{user_id}")
+                    # 当前白板状态只发给本次连接
+                    now = get_china_time().replace(tzinfo=None)
+                    whiteboards = Whiteboard.query.filter(Whiteboard.class_id.in_(class_ids)).all() if class_ids else []
+                    changed = False
+                    for whiteboard in whiteboards:
+                        is_actually_online = False
+                        if whiteboard.last_heartbeat:
+                            time_diff = (now - whiteboard.last_heartbeat).total_seconds()
+                            is_actually_online = time_diff < 30
+                        
+                        if whiteboard.is_online != is_actually_online:
+                            whiteboard.is_online = is_actually_online
+                            changed = True
+                        
+                        emit('whiteboard_status_update', {
+                            'whiteboard_id': whiteboard.id,
+                            'is_online': is_actually_online,
+                            'last_heartbeat': format_china_time(whiteboard.last_heartbeat) if whiteboard.last_heartbeat else None
+                        })
                     
-                    emit('connected', {'status': 'success', 'message': '教师端连接成功'})
+                    if changed:
+                        db.session.commit()
+                    
+                    emit('connected', {'status': 'success', 'message': '教师端连接成功', 'class_ids': class_ids})
                     return True
                 else:
                     emit('connected', {'status': 'error', 'message': '无权限连接'})
@@ -74,35 +140,49 @@ def handle_connect():
             else:
                 emit('connected', {'status': 'error', 'message': '未登录'})
                 return False
+    except ConnectionRefusedError:
+        raise
     except Exception as e:
         emit('connected', {'status': 'error', 'message': '服务器内部错误'})
         return False
 
 @socketio.on('disconnect')
 def handle_disconnect():
+    board_sessions.pop(request.sid, None)
+    outbound_queue.unregister(request.sid)
     try:
         board_id = request.args.get('board_id')
         if board_id:
             whiteboard = Whiteboard.query.filter_by(board_id=board_id).first()
             if whiteboard:
-                whiteboard.is_online = False
-                db.session.commit()
-                
-                status_history = WhiteboardStatusHistory(
-                    whiteboard_id=whiteboard.id,
-                    is_online=False
+                connect_admission.submit_offline(
+                    whiteboard.id,
+                    whiteboard.class_id,
+                    last_heartbeat=whiteboard.last_heartbeat
                 )
-                db.session.add(status_history)
-                db.session.commit()
-                
-                socketio.emit('whiteboard_status_update', {
-                    'whiteboard_id': whiteboard.id,
-                    'is_online': False,
-                    'last_heartbeat': format_china_time(whiteboard.last_heartbeat) if whiteboard.last_heartbeat else None
-                }, room=f"teacher_{whiteboard.class_obj.teacher_id}")
     except Exception as e:
         pass
 
+@socketio.on('resume')
+def handle_resume(data):
+    board_session = board_sessions.get(request.sid)
+    if board_session is None:
+        emit('resync_required', {'message': '未认证的白板连接'})
+        return
+    
+    data = data or {}
+    streams = [
+        (f"whiteboard_{board_session['whiteboard_id']}", data.get('last_seq', 0)),
+        (f"class_{board_session['class_id']}", data.get('class_last_seq'))
+    ]
+    for room, last_seq in streams:
+        if last_seq is None:
+            continue
+        if not isinstance(last_seq, int) or last_seq < 0:
+            emit('resync_required', {'room': room, 'message': '序号无效'})
+            continue
+        replay_missed_events(room, last_seq, data.get('stream_epoch'))
+
 @socketio.on('heartbeat')
 def handle_heartbeat(data):
     board_id = data.get('board_id')
@@ -110,13 +190,13 @@ def handle_heartbeat(data):
         whiteboard = Whiteboard.query.filter_by(board_id=board_id).first()
         if whiteboard:
             whiteboard.last_heartbeat = get_china_time().replace(tzinfo=None)
-            db.session.commit()
             
-            socketio.emit('whiteboard_status_update', {
+            emit_dispatcher.emit('whiteboard_status_update', {
                 'whiteboard_id': whiteboard.id,
                 'is_online': True,
                 'last_heartbeat': format_china_time(whiteboard.last_heartbeat)
-            }, room=f"teacher_{whiteboard.class_obj.teacher_id}")
+            }, room=f"class_teachers_{whiteboard.class_id}", coalesce_key=f"whiteboard_status:{whiteboard.id}")
+            db.session.commit()
 
 @socketio.on('task_acknowledged')
 def handle_task_acknowledged(data):
@@ -124,14 +204,15 @@ def handle_task_acknowledged(data):
     task = Task.query.get(task_id)
     if task:
         task.is_acknowledged = True
-        db.session.commit()
         
-        socketio.emit('task_updated', {
+        emit_dispatcher.emit('task_updated', {
             'id': task.id,
+            'whiteboard_id': task.whiteboard_id,
             'title': task.title,
             'is_acknowledged': task.is_acknowledged,
             'is_completed': task.is_completed
-        }, room=f"teacher_{task.whiteboard.class_obj.teacher_id}")
+        }, room=f"class_teachers_{task.whiteboard.class_id}", coalesce_key=f"task:{task.id}")
+        db.session.commit()
 
 @socketio.on('task_completed')
 def handle_task_completed(data):
@@ -139,14 +220,15 @@ def handle_task_completed(data):
     task = Task.query.get(task_id)
     if task:
         task.is_completed = True
-        db.session.commit()
         
-        socketio.emit('task_updated', {
+        emit_dispatcher.emit('task_updated', {
             'id': task.id,
+            'whiteboard_id': task.whiteboard_id,
             'title': task.title,
             'is_acknowledged': task.is_acknowledged,
             'is_completed': task.is_completed
-        }, room=f"teacher_{task.whiteboard.class_obj.teacher_id}")
+        }, room=f"class_teachers_{task.whiteboard.class_id}", coalesce_key=f"task:{task.id}")
+        db.session.commit()
 
 @socketio.on('join_teacher_room')
 def handle_join_teacher_room():
@@ -155,7 +237,8 @@ def handle_join_teacher_room():
         user = db.session.get(User, user_id)
         if user and user.role == 'teacher':
             join_room(f"teacher_{user_id}")
-            emit('joined_teacher_room', {'status': 'success'})
+            class_ids = join_class_teacher_rooms(user)
+            emit('joined_teacher_room', {'status': 'success', 'class_ids': class_ids})
         else:
             emit('joined_teacher_room', {'status': 'error', 'message': '无权限'})
     else:
@@ -0,0 +1,26 @@
+"""add tags to class
+
+Revision ID: a3c5e1f20b71
+Revises: 21924fe5f860
+Create Date: 2026-10-19 09:12:40.118302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c5e1f20b71'
+down_revision = '21924fe5f860'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('class', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('tags', sa.String(length=300), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('class', schema=None) as batch_op:
+        batch_op.drop_column('tags')
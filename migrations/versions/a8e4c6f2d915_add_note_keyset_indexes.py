@@ -0,0 +1,28 @@
+"""add note keyset pagination indexes
+
+Revision ID: a8e4c6f2d915
+Revises: d3f6b8a1c527
+Create Date: 2026-10-19 22:48:31.075214
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8e4c6f2d915'
+down_revision = 'd3f6b8a1c527'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('note', schema=None) as batch_op:
+        batch_op.create_index('ix_note_whiteboard_created', ['whiteboard_id', 'created_at', 'id'], unique=False)
+        batch_op.create_index('ix_note_class_created', ['class_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('note', schema=None) as batch_op:
+        batch_op.drop_index('ix_note_class_created')
+        batch_op.drop_index('ix_note_whiteboard_created')
@@ -0,0 +1,132 @@
+"""normalize note tags into tag and note_tag tables
+
+Revision ID: b5d9e7f3a214
+Revises: f4a8c2d61e93
+Create Date: 2026-10-19 21:02:36.118540
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5d9e7f3a214'
+down_revision = 'f4a8c2d61e93'
+branch_labels = None
+depends_on = None
+
+
+note_table = sa.table(
+    'note',
+    sa.column('id', sa.Integer),
+    sa.column('class_id', sa.Integer),
+    sa.column('tags', sa.String)
+)
+tag_table = sa.table(
+    'tag',
+    sa.column('id', sa.Integer),
+    sa.column('class_id', sa.Integer),
+    sa.column('name', sa.String),
+    sa.column('note_count', sa.Integer),
+    sa.column('created_at', sa.DateTime)
+)
+note_tag_table = sa.table(
+    'note_tag',
+    sa.column('note_id', sa.Integer),
+    sa.column('tag_id', sa.Integer)
+)
+
+
+def parse_tags(raw):
+    names = []
+    for name in (raw or '').replace('，', ',').split(','):
+        name = name.strip()[:50]
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def upgrade():
+    op.create_table('tag',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('class_id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('note_count', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['class_id'], ['class.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('class_id', 'name', name='uq_tag_class_name')
+    )
+    with op.batch_alter_table('tag', schema=None) as batch_op:
+        batch_op.create_index('ix_tag_class_count', ['class_id', 'note_count'], unique=False)
+
+    op.create_table('note_tag',
+        sa.Column('note_id', sa.Integer(), nullable=False),
+        sa.Column('tag_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['note_id'], ['note.id'], ),
+        sa.ForeignKeyConstraint(['tag_id'], ['tag.id'], ),
+        sa.PrimaryKeyConstraint('note_id', 'tag_id')
+    )
+    with op.batch_alter_table('note_tag', schema=None) as batch_op:
+        batch_op.create_index('ix_note_tag_tag_id', ['tag_id', 'note_id'], unique=False)
+
+    # 把逗号分隔的标签拆分到 tag / note_tag 表，并统计每个标签的笔记数
+    bind = op.get_bind()
+    rows = bind.execute(
+        sa.select(note_table.c.id, note_table.c.class_id, note_table.c.tags)
+        .where(note_table.c.tags.isnot(None))
+    ).all()
+
+    counts = {}
+    links = []
+    for note_id, class_id, tags in rows:
+        for name in parse_tags(tags):
+            counts[(class_id, name)] = counts.get((class_id, name), 0) + 1
+            links.append((note_id, class_id, name))
+
+    tag_ids = {}
+    now = datetime.now()
+    for (class_id, name), count in counts.items():
+        result = bind.execute(tag_table.insert().values(
+            class_id=class_id, name=name, note_count=count, created_at=now
+        ))
+        tag_ids[(class_id, name)] = result.inserted_primary_key[0]
+
+    if links:
+        op.bulk_insert(note_tag_table, [
+            {'note_id': note_id, 'tag_id': tag_ids[(class_id, name)]}
+            for note_id, class_id, name in links
+        ])
+
+    with op.batch_alter_table('note', schema=None) as batch_op:
+        batch_op.drop_column('tags')
+
+
+def downgrade():
+    with op.batch_alter_table('note', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('tags', sa.String(length=300), nullable=True))
+
+    bind = op.get_bind()
+    rows = bind.execute(
+        sa.select(note_tag_table.c.note_id, tag_table.c.name)
+        .select_from(note_tag_table.join(tag_table, tag_table.c.id == note_tag_table.c.tag_id))
+        .order_by(note_tag_table.c.note_id, tag_table.c.name)
+    ).all()
+
+    tags = {}
+    for note_id, name in rows:
+        tags.setdefault(note_id, []).append(name)
+    for note_id, names in tags.items():
+        bind.execute(
+            note_table.update().where(note_table.c.id == note_id).values(tags=','.join(names)[:300])
+        )
+
+    with op.batch_alter_table('note_tag', schema=None) as batch_op:
+        batch_op.drop_index('ix_note_tag_tag_id')
+
+    op.drop_table('note_tag')
+    with op.batch_alter_table('tag', schema=None) as batch_op:
+        batch_op.drop_index('ix_tag_class_count')
+
+    op.drop_table('tag')
@@ -0,0 +1,54 @@
+"""add note post-upload processing jobs
+
+Revision ID: c7a2e9d4f836
+Revises: a8e4c6f2d915
+Create Date: 2026-10-19 23:41:07.518342
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7a2e9d4f836'
+down_revision = 'a8e4c6f2d915'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('note_job',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('note_id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=30), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('run_after', sa.DateTime(), nullable=False),
+    sa.Column('locked_at', sa.DateTime(), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('duration', sa.Float(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['note_id'], ['note.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('note_job', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_note_job_note_id'), ['note_id'], unique=False)
+        batch_op.create_index('ix_note_job_status_run_after', ['status', 'run_after'], unique=False)
+
+    # 已有笔记视为处理完成
+    with op.batch_alter_table('note', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('processing_status', sa.String(length=20), nullable=True, server_default='ready'))
+        batch_op.add_column(sa.Column('file_metadata', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('note', schema=None) as batch_op:
+        batch_op.drop_column('file_metadata')
+        batch_op.drop_column('processing_status')
+
+    with op.batch_alter_table('note_job', schema=None) as batch_op:
+        batch_op.drop_index('ix_note_job_status_run_after')
+        batch_op.drop_index(batch_op.f('ix_note_job_note_id'))
+
+    op.drop_table('note_job')
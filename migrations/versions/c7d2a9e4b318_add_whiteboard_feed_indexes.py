@@ -0,0 +1,40 @@
+"""add whiteboard feed range indexes
+
+Revision ID: c7d2a9e4b318
+Revises: a3c5e1f20b71
+Create Date: 2026-10-19 19:05:12.406631
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7d2a9e4b318'
+down_revision = 'a3c5e1f20b71'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('task', schema=None) as batch_op:
+        batch_op.create_index('ix_task_whiteboard_created', ['whiteboard_id', 'created_at'], unique=False)
+
+    with op.batch_alter_table('assignment', schema=None) as batch_op:
+        batch_op.create_index('ix_assignment_whiteboard_due', ['whiteboard_id', 'due_date'], unique=False)
+        batch_op.create_index('ix_assignment_whiteboard_created', ['whiteboard_id', 'created_at'], unique=False)
+
+    with op.batch_alter_table('announcement', schema=None) as batch_op:
+        batch_op.create_index('ix_announcement_whiteboard_created', ['whiteboard_id', 'created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('announcement', schema=None) as batch_op:
+        batch_op.drop_index('ix_announcement_whiteboard_created')
+
+    with op.batch_alter_table('assignment', schema=None) as batch_op:
+        batch_op.drop_index('ix_assignment_whiteboard_created')
+        batch_op.drop_index('ix_assignment_whiteboard_due')
+
+    with op.batch_alter_table('task', schema=None) as batch_op:
+        batch_op.drop_index('ix_task_whiteboard_created')
@@ -0,0 +1,75 @@
+"""add note_stats table with per-class note aggregates
+
+Revision ID: d3f6b8a1c527
+Revises: b5d9e7f3a214
+Create Date: 2026-10-19 22:14:05.402861
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3f6b8a1c527'
+down_revision = 'b5d9e7f3a214'
+branch_labels = None
+depends_on = None
+
+
+note_table = sa.table(
+    'note',
+    sa.column('class_id', sa.Integer),
+    sa.column('whiteboard_id', sa.Integer),
+    sa.column('created_at', sa.DateTime),
+    sa.column('file_type', sa.String),
+    sa.column('file_size', sa.Integer)
+)
+note_stats_table = sa.table(
+    'note_stats',
+    sa.column('class_id', sa.Integer),
+    sa.column('whiteboard_id', sa.Integer),
+    sa.column('day', sa.Date),
+    sa.column('file_type', sa.String),
+    sa.column('note_count', sa.Integer),
+    sa.column('total_size', sa.BigInteger)
+)
+
+
+def upgrade():
+    op.create_table('note_stats',
+        sa.Column('class_id', sa.Integer(), nullable=False),
+        sa.Column('whiteboard_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('file_type', sa.String(length=50), nullable=False),
+        sa.Column('note_count', sa.Integer(), nullable=False),
+        sa.Column('total_size', sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(['class_id'], ['class.id'], ),
+        sa.PrimaryKeyConstraint('class_id', 'whiteboard_id', 'day', 'file_type')
+    )
+
+    # 按已有笔记计算初始统计（日期截取在各数据库中写法不同，在这里汇总）
+    bind = op.get_bind()
+    totals = {}
+    for class_id, whiteboard_id, created_at, file_type, file_size in bind.execute(sa.select(note_table)):
+        if created_at is None:
+            continue
+        key = (class_id, whiteboard_id, created_at.date(), (file_type or '').lower())
+        count, size = totals.get(key, (0, 0))
+        totals[key] = (count + 1, size + (file_size or 0))
+
+    if totals:
+        op.bulk_insert(note_stats_table, [
+            {
+                'class_id': class_id,
+                'whiteboard_id': whiteboard_id,
+                'day': day,
+                'file_type': file_type,
+                'note_count': count,
+                'total_size': size
+            }
+            for (class_id, whiteboard_id, day, file_type), (count, size) in totals.items()
+        ])
+
+
+def downgrade():
+    op.drop_table('note_stats')
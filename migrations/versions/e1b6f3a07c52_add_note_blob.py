@@ -0,0 +1,45 @@
+"""add content-addressed note blobs
+
+Revision ID: e1b6f3a07c52
+Revises: c7d2a9e4b318
+Create Date: 2026-10-19 19:42:03.518207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1b6f3a07c52'
+down_revision = 'c7d2a9e4b318'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('note_blob',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('class_id', sa.Integer(), nullable=False),
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('file_path', sa.String(length=500), nullable=False),
+        sa.Column('file_size', sa.Integer(), nullable=False),
+        sa.Column('ref_count', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['class_id'], ['class.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('class_id', 'sha256', name='uq_note_blob_class_sha256')
+    )
+
+    with op.batch_alter_table('note', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('blob_id', sa.Integer(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_note_blob_id'), ['blob_id'], unique=False)
+        batch_op.create_foreign_key('fk_note_blob_id', 'note_blob', ['blob_id'], ['id'])
+
+
+def downgrade():
+    with op.batch_alter_table('note', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_note_blob_id', type_='foreignkey')
+        batch_op.drop_index(batch_op.f('ix_note_blob_id'))
+        batch_op.drop_column('blob_id')
+
+    op.drop_table('note_blob')
@@ -0,0 +1,69 @@
+"""add note_usage table with per-class and per-whiteboard storage usage
+
+Revision ID: e2b8d4a6c913
+Revises: c7a2e9d4f836
+Create Date: 2026-10-20 00:12:44.903517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b8d4a6c913'
+down_revision = 'c7a2e9d4f836'
+branch_labels = None
+depends_on = None
+
+
+note_table = sa.table(
+    'note',
+    sa.column('class_id', sa.Integer),
+    sa.column('whiteboard_id', sa.Integer),
+    sa.column('file_size', sa.Integer)
+)
+note_usage_table = sa.table(
+    'note_usage',
+    sa.column('class_id', sa.Integer),
+    sa.column('whiteboard_id', sa.Integer),
+    sa.column('file_count', sa.Integer),
+    sa.column('total_size', sa.BigInteger)
+)
+
+
+def upgrade():
+    op.create_table('note_usage',
+        sa.Column('class_id', sa.Integer(), nullable=False),
+        sa.Column('whiteboard_id', sa.Integer(), nullable=False),
+        sa.Column('file_count', sa.Integer(), nullable=False),
+        sa.Column('total_size', sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(['class_id'], ['class.id'], ),
+        sa.PrimaryKeyConstraint('class_id', 'whiteboard_id')
+    )
+
+    # 按已有笔记计算初始用量，whiteboard_id 为 0 的行是班级合计
+    bind = op.get_bind()
+    rows = bind.execute(
+        sa.select(
+            note_table.c.class_id,
+            note_table.c.whiteboard_id,
+            sa.func.count(),
+            sa.func.coalesce(sa.func.sum(note_table.c.file_size), 0)
+        ).group_by(note_table.c.class_id, note_table.c.whiteboard_id)
+    ).all()
+
+    totals = {}
+    for class_id, whiteboard_id, count, size in rows:
+        for key in ((class_id, whiteboard_id), (class_id, 0)):
+            file_count, total_size = totals.get(key, (0, 0))
+            totals[key] = (file_count + count, total_size + int(size))
+
+    if totals:
+        op.bulk_insert(note_usage_table, [
+            {'class_id': class_id, 'whiteboard_id': whiteboard_id, 'file_count': count, 'total_size': size}
+            for (class_id, whiteboard_id), (count, size) in totals.items()
+        ])
+
+
+def downgrade():
+    op.drop_table('note_usage')
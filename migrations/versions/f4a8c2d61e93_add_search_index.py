@@ -0,0 +1,43 @@
+"""add full-text search index
+
+Revision ID: f4a8c2d61e93
+Revises: e1b6f3a07c52
+Create Date: 2026-10-19 20:31:47.902215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4a8c2d61e93'
+down_revision = 'e1b6f3a07c52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 索引内容由 python search_admin.py rebuild 重建
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+            "entity_type UNINDEXED, entity_id UNINDEXED, class_id UNINDEXED, whiteboard_id UNINDEXED, "
+            "title, body, content, tokenize='unicode61')"
+        )
+    elif dialect == 'postgresql':
+        op.execute(
+            "CREATE TABLE IF NOT EXISTS search_index ("
+            "id BIGINT PRIMARY KEY, entity_type VARCHAR(20) NOT NULL, entity_id INTEGER NOT NULL, "
+            "class_id INTEGER, whiteboard_id INTEGER, title TEXT, body TEXT, content TEXT, "
+            "document tsvector GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(body, '')), 'B') || "
+            "setweight(to_tsvector('simple', coalesce(content, '')), 'C')) STORED)"
+        )
+        op.execute("CREATE INDEX IF NOT EXISTS ix_search_index_document ON search_index USING GIN (document)")
+        op.execute("CREATE INDEX IF NOT EXISTS ix_search_index_class ON search_index (class_id, entity_type)")
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS search_index")
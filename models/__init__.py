@@ -6,7 +6,7 @@ from .assignment import Assignment
 from .announcement import Announcement
 from .message import Message
 from .system_setting import SystemSetting
-from .note import Note
+from .note import Note, NoteBlob, Tag, NoteTag, NoteStats, NoteUsage, NoteJob
 from .developer import Developer, DeveloperApp
 
 __all__ = [
@@ -23,6 +23,12 @@ __all__ = [
     'Message',
     'SystemSetting',
     'Note',
+    'NoteBlob',
+    'Tag',
+    'NoteTag',
+    'NoteStats',
+    'NoteUsage',
+    'NoteJob',
     'Developer',
     'DeveloperApp'
 ]
\ No newline at end of file
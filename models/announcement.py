@@ -10,6 +10,11 @@ class Announcement(db.Model):
     created_at = db.Column(db.DateTime, default=get_china_time)
     is_long_term = db.Column(db.Boolean, default=False)
     
+    # 白板内容按时间范围查询
+    __table_args__ = (
+        db.Index('ix_announcement_whiteboard_created', 'whiteboard_id', 'created_at'),
+    )
+    
     whiteboard = db.relationship('Whiteboard', backref=db.backref('announcements', lazy=True))
     teacher = db.relationship('User', foreign_keys=[teacher_id], backref=db.backref('created_announcements', lazy=True))
     
@@ -12,6 +12,12 @@ class Assignment(db.Model):
     created_at = db.Column(db.DateTime, default=get_china_time)
     updated_at = db.Column(db.DateTime, default=get_china_time, onupdate=get_china_time)
     
+    # 白板内容按截止时间或创建时间范围查询
+    __table_args__ = (
+        db.Index('ix_assignment_whiteboard_due', 'whiteboard_id', 'due_date'),
+        db.Index('ix_assignment_whiteboard_created', 'whiteboard_id', 'created_at'),
+    )
+    
     whiteboard = db.relationship('Whiteboard', backref=db.backref('assignments', lazy=True))
     teacher = db.relationship('User', foreign_keys=[teacher_id], backref=db.backref('created_assignments', lazy=True))
     
@@ -8,12 +8,18 @@ class Class(db.Model):
     code = db.Column(db.String(10), unique=True, nullable=False)
     created_at = db.Column(db.DateTime, default=get_china_time)
     teacher_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    tags = db.Column(db.String(300))  # 班级标签（如年级），用逗号分隔
     
     teacher = db.relationship('User', backref=db.backref('classes_taught', lazy=True))
     
     def __repr__(self):
         return f'<Class {self.name}>'
     
+    def get_tags_list(self):
+        if self.tags:
+            return [tag.strip() for tag in self.tags.split(',') if tag.strip()]
+        return []
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -22,7 +28,8 @@ class Class(db.Model):
             'code': self.code,
             'created_at': format_china_time(self.created_at),
             'teacher_id': self.teacher_id,
-            'teacher_name': self.teacher.username if self.teacher else None
+            'teacher_name': self.teacher.username if self.teacher else None,
+            'tags': self.get_tags_list()
         }
 
 class StudentClass(db.Model):
@@ -1,5 +1,80 @@
 from extensions import db
-from utils.time_utils import get_china_time, format_china_time
+from utils.time_utils import get_china_time
+from utils.signed_urls import signed_file_url
+from utils.serialization import prepare
+from utils.field_selection import FieldSpec, column, computed
+
+class NoteBlob(db.Model):
+    """按内容（SHA-256）去重存储的笔记文件，同一班级内相同内容只保存一份"""
+    id = db.Column(db.Integer, primary_key=True)
+    class_id = db.Column(db.Integer, db.ForeignKey('class.id'), nullable=False)
+    sha256 = db.Column(db.String(64), nullable=False)
+    file_path = db.Column(db.String(500), nullable=False)  # 相对于 uploads/<class_id> 的路径
+    file_size = db.Column(db.Integer, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)  # 引用该文件的笔记数
+    created_at = db.Column(db.DateTime, default=get_china_time)
+    
+    __table_args__ = (
+        db.UniqueConstraint('class_id', 'sha256', name='uq_note_blob_class_sha256'),
+    )
+    
+    def __repr__(self):
+        return f'<NoteBlob {self.sha256[:12]} refs={self.ref_count}>'
+
+class NoteUsage(db.Model):
+    """班级和白板的笔记存储用量，上传和删除笔记时在同一事务中增减
+
+    whiteboard_id 为 0 的行是整个班级的合计；按笔记计算，去重的文件也计入每个笔记。
+    """
+    __tablename__ = 'note_usage'
+    
+    class_id = db.Column(db.Integer, db.ForeignKey('class.id'), primary_key=True)
+    whiteboard_id = db.Column(db.Integer, primary_key=True)  # 不设外键，0 表示整个班级
+    file_count = db.Column(db.Integer, nullable=False, default=0)
+    total_size = db.Column(db.BigInteger, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<NoteUsage class={self.class_id} whiteboard={self.whiteboard_id} {self.total_size}>'
+
+class Tag(db.Model):
+    """笔记标签，按班级区分；note_count 为使用该标签的笔记数，随笔记标签的增删增量维护"""
+    id = db.Column(db.Integer, primary_key=True)
+    class_id = db.Column(db.Integer, db.ForeignKey('class.id'), nullable=False)
+    name = db.Column(db.String(50), nullable=False)
+    note_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=get_china_time)
+    
+    __table_args__ = (
+        db.UniqueConstraint('class_id', 'name', name='uq_tag_class_name'),
+        # 班级标签云按使用次数排序
+        db.Index('ix_tag_class_count', 'class_id', 'note_count'),
+    )
+    
+    def __repr__(self):
+        return f'<Tag {self.name}>'
+
+class NoteTag(db.Model):
+    note_id = db.Column(db.Integer, db.ForeignKey('note.id'), primary_key=True)
+    tag_id = db.Column(db.Integer, db.ForeignKey('tag.id'), primary_key=True)
+    
+    # 按标签筛选笔记
+    __table_args__ = (
+        db.Index('ix_note_tag_tag_id', 'tag_id', 'note_id'),
+    )
+
+class NoteStats(db.Model):
+    """笔记统计：按班级、白板、上传日期和文件类型汇总的笔记数和总大小
+
+    上传和删除笔记时通过 utils.note_stats 增量更新，统计接口只读取这张表。
+    """
+    __tablename__ = 'note_stats'
+    
+    class_id = db.Column(db.Integer, db.ForeignKey('class.id'), primary_key=True)
+    whiteboard_id = db.Column(db.Integer, primary_key=True)  # 不设外键，计数为 0 的行不妨碍删除白板
+    day = db.Column(db.Date, primary_key=True)
+    file_type = db.Column(db.String(50), primary_key=True)
+    note_count = db.Column(db.Integer, nullable=False, default=0)
+    total_size = db.Column(db.BigInteger, nullable=False, default=0)
 
 class Note(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -9,6 +84,7 @@ class Note(db.Model):
     file_size = db.Column(db.Integer, nullable=False)  # 文件大小（字节）
     file_type = db.Column(db.String(50), nullable=False)  # 文件类型扩展名
     mime_type = db.Column(db.String(100))  # MIME类型
+    blob_id = db.Column(db.Integer, db.ForeignKey('note_blob.id'), index=True)  # 去重存储的文件（旧数据为空）
     
     whiteboard_id = db.Column(db.Integer, db.ForeignKey('whiteboard.id'), nullable=False)
     class_id = db.Column(db.Integer, db.ForeignKey('class.id'), nullable=False)
@@ -16,49 +92,36 @@ class Note(db.Model):
     
     title = db.Column(db.String(200))  # 笔记标题（可选）
     description = db.Column(db.Text)  # 笔记描述（可选）
-    tags = db.Column(db.String(300))  # 标签，用逗号分隔
     
     is_public = db.Column(db.Boolean, default=True)  # 是否公开
     download_count = db.Column(db.Integer, default=0)  # 下载次数
     
+    processing_status = db.Column(db.String(20), default='ready')  # 上传后处理状态：pending/ready/failed
+    file_metadata = db.Column(db.JSON)  # 后台分析得到的文件信息（实际类型、页数、尺寸等）
+    
     created_at = db.Column(db.DateTime, default=get_china_time)
     updated_at = db.Column(db.DateTime, default=get_china_time, onupdate=get_china_time)
     
+    # 游标分页按 (created_at, id) 顺序读取白板或班级的笔记
+    __table_args__ = (
+        db.Index('ix_note_whiteboard_created', 'whiteboard_id', 'created_at', 'id'),
+        db.Index('ix_note_class_created', 'class_id', 'created_at', 'id'),
+    )
+    
     # 关系
     whiteboard = db.relationship('Whiteboard', backref=db.backref('notes', lazy=True))
     class_obj = db.relationship('Class', backref=db.backref('notes', lazy=True))
     uploader = db.relationship('User', foreign_keys=[uploaded_by], backref=db.backref('uploaded_notes', lazy=True))
+    blob = db.relationship('NoteBlob', backref=db.backref('notes', lazy=True))
+    tags = db.relationship('Tag', secondary='note_tag', lazy='selectin', order_by='Tag.name',
+                           backref=db.backref('notes', lazy=True))  # 通过 utils.note_tags 修改以维护计数
     
     def __repr__(self):
         return f'<Note {self.original_filename}>'
     
     def to_dict(self):
-        """将笔记对象转换为字典"""
-        return {
-            'id': self.id,
-            'filename': self.filename,
-            'original_filename': self.original_filename,
-            'file_path': self.file_path,
-            'file_url': f"/uploads/{self.class_id}/{self.file_path}",
-            'file_size': self.file_size,
-            'file_size_formatted': self.format_file_size(),
-            'file_type': self.file_type,
-            'mime_type': self.mime_type,
-            'whiteboard_id': self.whiteboard_id,
-            'class_id': self.class_id,
-            'uploaded_by': self.uploaded_by,
-            'uploader_name': self.uploader.username if self.uploader else None,
-            'title': self.title or self.original_filename,
-            'description': self.description,
-            'tags': self.tags,
-            'tags_list': self.get_tags_list(),
-            'is_public': self.is_public,
-            'download_count': self.download_count,
-            'created_at': format_china_time(self.created_at),
-            'updated_at': format_china_time(self.updated_at),
-            'whiteboard_name': self.whiteboard.name if self.whiteboard else None,
-            'class_name': self.class_obj.name if self.class_obj else None
-        }
+        """将笔记对象转换为字典，字段与 fields= 接口共用 NOTE_FIELDS 的声明"""
+        return prepare(NOTE_FIELDS.serialize(self, NOTE_FIELDS.resolve(None)))
     
     def format_file_size(self):
         """格式化文件大小"""
@@ -73,11 +136,63 @@ class Note(db.Model):
     
     def get_tags_list(self):
         """获取标签列表"""
-        if self.tags:
-            return [tag.strip() for tag in self.tags.split(',') if tag.strip()]
-        return []
+        return [tag.name for tag in self.tags]
     
     def increment_download_count(self):
-        """增加下载计数"""
-        self.download_count += 1
-        db.session.commit()
\ No newline at end of file
+        """增加下载计数（先记在内存中，由定时任务批量写回数据库）"""
+        from utils.download_counter import download_counter
+        download_counter.record(self.id)
+
+# 笔记对外输出的字段，to_dict 与支持 fields= 的接口共用；新增字段只需在这里声明
+NOTE_FIELDS = FieldSpec(Note, {
+    'id': column('id'),
+    'filename': column('filename'),
+    'original_filename': column('original_filename'),
+    'file_path': column('file_path'),
+    'file_url': computed(('class_id', 'file_path'), lambda note: f"/uploads/{note.class_id}/{note.file_path}"),
+    'signed_url': computed(('class_id', 'file_path'), lambda note: signed_file_url(note.class_id, note.file_path)),
+    'file_size': column('file_size'),
+    'file_size_formatted': computed(('file_size',), lambda note: note.format_file_size()),
+    'file_type': column('file_type'),
+    'mime_type': column('mime_type'),
+    'whiteboard_id': column('whiteboard_id'),
+    'class_id': column('class_id'),
+    'uploaded_by': column('uploaded_by'),
+    'uploader_name': computed((), lambda note: note.uploader.username if note.uploader else None, {'uploader': ('username',)}),
+    'title': computed(('title', 'original_filename'), lambda note: note.title or note.original_filename),
+    'description': column('description'),
+    'tags': computed((), lambda note: ','.join(note.get_tags_list()), {'tags': ('name',)}),
+    'tags_list': computed((), lambda note: note.get_tags_list(), {'tags': ('name',)}),
+    'is_public': column('is_public'),
+    'download_count': column('download_count'),
+    'processing_status': column('processing_status'),
+    'file_metadata': column('file_metadata'),
+    'created_at': column('created_at'),
+    'updated_at': column('updated_at'),
+    'whiteboard_name': computed((), lambda note: note.whiteboard.name if note.whiteboard else None, {'whiteboard': ('name',)}),
+    'class_name': computed((), lambda note: note.class_obj.name if note.class_obj else None, {'class_obj': ('name',)})
+})
+
+class NoteJob(db.Model):
+    """笔记上传后的后台处理任务，由 utils.note_jobs 的工作线程领取执行"""
+    __tablename__ = 'note_job'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    note_id = db.Column(db.Integer, db.ForeignKey('note.id'), nullable=False, index=True)
+    kind = db.Column(db.String(30), nullable=False)  # 任务类型：analyze / extract_text / thumbnail
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending/running/done/failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    run_after = db.Column(db.DateTime, nullable=False, default=get_china_time)  # 重试时延后执行
+    locked_at = db.Column(db.DateTime)  # 开始执行的时间，超时未完成视为工作进程已退出
+    last_error = db.Column(db.Text)
+    duration = db.Column(db.Float)  # 最后一次执行耗时（秒）
+    created_at = db.Column(db.DateTime, default=get_china_time)
+    finished_at = db.Column(db.DateTime)
+    
+    # 工作线程按状态和执行时间领取任务
+    __table_args__ = (
+        db.Index('ix_note_job_status_run_after', 'status', 'run_after'),
+    )
+    
+    def __repr__(self):
+        return f'<NoteJob {self.kind} note={self.note_id} {self.status}>'
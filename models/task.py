@@ -15,6 +15,11 @@ class Task(db.Model):
     is_completed = db.Column(db.Boolean, default=False)
     is_acknowledged = db.Column(db.Boolean, default=False)
     
+    # 白板内容按时间范围查询
+    __table_args__ = (
+        db.Index('ix_task_whiteboard_created', 'whiteboard_id', 'created_at'),
+    )
+    
     whiteboard = db.relationship('Whiteboard', backref=db.backref('tasks', lazy=True))
     teacher = db.relationship('User', foreign_keys=[teacher_id], backref=db.backref('created_tasks', lazy=True))
     
@@ -50,6 +50,20 @@ class User(db.Model):
         self.user_token = None
         self.token_created_at = None
     
+    def get_accessible_class_ids(self):
+        """获取用户可以访问的班级ID（班主任班级 + 已批准的授课班级）"""
+        from models.class_models import TeacherClass
+        
+        if self.role != 'teacher':
+            return []
+        
+        owned_ids = [row[0] for row in db.session.query(Class.id).filter_by(teacher_id=self.id).all()]
+        joined_ids = [row[0] for row in db.session.query(TeacherClass.class_id).filter_by(
+            teacher_id=self.id,
+            is_approved=True
+        ).all()]
+        return sorted(set(owned_ids) | set(joined_ids))
+    
     def get_accessible_whiteboards(self):
         """获取用户可以访问的所有白板"""
         from models.class_models import TeacherClass
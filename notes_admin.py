@@ -0,0 +1,288 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import app, db
+from models.note import Note, NoteBlob
+from utils.blob_store import UPLOADS_ROOT, blob_key, file_sha256, store_blob, discard_source, note_file_keys, remove_files
+from utils.storage import storage, note_key
+from utils.thumbnails import thumbnails
+from utils.note_stats import rebuild_note_stats
+from utils.note_quota import note_quota
+from utils.note_jobs import note_jobs, render_note_thumbnail
+from utils.reconciler import reconciler
+
+def format_size(size):
+    return Note(file_size=size).format_file_size()
+
+def show_stats():
+    """显示去重存储的占用情况"""
+    with app.app_context():
+        blob_count = NoteBlob.query.count()
+        physical = db.session.query(db.func.coalesce(db.func.sum(NoteBlob.file_size), 0)).scalar()
+        logical = db.session.query(
+            db.func.coalesce(db.func.sum(NoteBlob.file_size * NoteBlob.ref_count), 0)
+        ).scalar()
+        legacy_count = Note.query.filter(Note.blob_id.is_(None)).count()
+        legacy_size = db.session.query(db.func.coalesce(db.func.sum(Note.file_size), 0)).filter(
+            Note.blob_id.is_(None)
+        ).scalar()
+
+        print(f"去重文件数: {blob_count}")
+        print(f"笔记引用的总大小: {format_size(logical)}")
+        print(f"实际占用空间: {format_size(physical)}")
+        print(f"去重节省空间: {format_size(logical - physical)}")
+        print(f"未迁移的旧笔记: {legacy_count} 个，共 {format_size(legacy_size)}")
+
+def dedupe_legacy_notes():
+    """将旧笔记的文件迁移到去重存储，重复内容只保留一份"""
+    with app.app_context():
+        migrated = 0
+        duplicates = 0
+        reclaimed = 0
+
+        notes = Note.query.filter(Note.blob_id.is_(None)).order_by(Note.id).all()
+        for note in notes:
+            path = os.path.join(UPLOADS_ROOT, str(note.class_id), note.file_path)
+            if not os.path.isfile(path):
+                print(f"跳过（文件不存在）: 笔记 {note.id} {note.file_path}")
+                continue
+
+            legacy_thumbnail = thumbnails.path_for(path)
+            try:
+                size = os.path.getsize(path)
+                blob, deduplicated = store_blob(note.class_id, path, file_sha256(path), size, note.file_type)
+                note.blob = blob
+                note.file_path = blob.file_path
+                note.filename = os.path.basename(blob.file_path)
+                note.file_size = blob.file_size
+                db.session.commit()
+                discard_source(path)
+            except Exception as e:
+                db.session.rollback()
+                print(f"迁移失败: 笔记 {note.id} {str(e)}")
+                continue
+
+            # 旧文件的缩略图不再使用，由 thumbnails 命令在新位置重新生成
+            if os.path.exists(legacy_thumbnail):
+                os.remove(legacy_thumbnail)
+
+            migrated += 1
+            if deduplicated:
+                duplicates += 1
+                reclaimed += size
+
+        print(f"已迁移 {migrated} 个笔记，其中 {duplicates} 个为重复内容")
+        print(f"释放空间: {format_size(reclaimed)}")
+
+def collect_garbage():
+    """删除没有引用的去重文件和数据库中不存在的孤立文件"""
+    with app.app_context():
+        reclaimed = 0
+        removed = 0
+
+        for blob in NoteBlob.query.filter(NoteBlob.ref_count <= 0).all():
+            reclaimed += remove_files(note_file_keys(blob_key(blob)))
+            db.session.delete(blob)
+            removed += 1
+        db.session.commit()
+
+        # 孤立文件只在本地存储中扫描
+        if not storage.is_local:
+            print(f"已删除 {removed} 个无引用文件")
+            print(f"释放空间: {format_size(reclaimed)}")
+            return
+
+        known = set()
+        for class_id, file_path in db.session.query(NoteBlob.class_id, NoteBlob.file_path):
+            path = os.path.normpath(os.path.join(UPLOADS_ROOT, str(class_id), file_path))
+            known.add(path)
+            known.add(thumbnails.path_for(path))
+        for class_dir in os.listdir(UPLOADS_ROOT) if os.path.isdir(UPLOADS_ROOT) else []:
+            blobs_dir = os.path.join(UPLOADS_ROOT, class_dir, 'blobs')
+            if not os.path.isdir(blobs_dir):
+                continue
+            for root, _, files in os.walk(blobs_dir):
+                for name in files:
+                    path = os.path.normpath(os.path.join(root, name))
+                    if path not in known:
+                        reclaimed += os.path.getsize(path)
+                        os.remove(path)
+                        removed += 1
+
+        print(f"已删除 {removed} 个无引用文件")
+        print(f"释放空间: {format_size(reclaimed)}")
+
+def generate_thumbnails():
+    """为已有笔记补生成缩略图"""
+    with app.app_context():
+        if not thumbnails.supports('png'):
+            print("未安装 Pillow，无法生成缩略图")
+            return
+        if not thumbnails.supports('pdf'):
+            print("⚠ 未安装 PyMuPDF，PDF 笔记不会生成缩略图")
+        if not storage.is_local:
+            generate_stored_thumbnails()
+            return
+
+        futures = []
+        for note in Note.query.order_by(Note.id).all():
+            path = os.path.join(UPLOADS_ROOT, str(note.class_id), note.file_path)
+            future = thumbnails.schedule(path, note.file_type, wait=True)
+            if future is not None:
+                futures.append((note, future))
+
+        failed = 0
+        for note, future in futures:
+            if future.exception() is not None:
+                failed += 1
+                print(f"生成失败: 笔记 {note.id} {future.exception()}")
+
+        print(f"已生成 {len(futures) - failed} 个缩略图，失败 {failed} 个")
+
+def generate_stored_thumbnails():
+    """对象存储：逐个下载没有缩略图的笔记文件，生成后上传"""
+    generated = failed = 0
+    for note in Note.query.order_by(Note.id).all():
+        key = note_key(note.class_id, note.file_path)
+        if not thumbnails.supports(note.file_type) or storage.exists(thumbnails.path_for(key)):
+            continue
+        try:
+            render_note_thumbnail(note)
+            generated += 1
+        except Exception as e:
+            failed += 1
+            print(f"生成失败: 笔记 {note.id} {str(e)}")
+
+    print(f"已生成 {generated} 个缩略图，失败 {failed} 个")
+
+def push_to_storage():
+    """将本地 uploads 目录中的笔记文件上传到当前配置的对象存储，上传后删除本地文件"""
+    with app.app_context():
+        if storage.is_local:
+            print("当前使用本地存储，请先设置 NOTE_STORAGE_BACKEND=s3")
+            return
+
+        pushed = 0
+        total = 0
+        paths = {(class_id, file_path) for class_id, file_path in db.session.query(NoteBlob.class_id, NoteBlob.file_path)}
+        paths |= {
+            (class_id, file_path) for class_id, file_path in
+            db.session.query(Note.class_id, Note.file_path).filter(Note.blob_id.is_(None))
+        }
+        for class_id, file_path in sorted(paths):
+            path = os.path.join(UPLOADS_ROOT, str(class_id), file_path)
+            if not os.path.isfile(path):
+                continue
+            key = note_key(class_id, file_path)
+            size = os.path.getsize(path)
+            try:
+                if storage.exists(key):
+                    os.remove(path)
+                else:
+                    storage.save(key, path)
+                    pushed += 1
+                    total += size
+            except Exception as e:
+                print(f"上传失败: {key} {str(e)}")
+                continue
+
+            # 本地缩略图在对象存储中不再使用
+            if os.path.exists(thumbnails.path_for(path)):
+                os.remove(thumbnails.path_for(path))
+
+        print(f"已上传 {pushed} 个文件，共 {format_size(total)}")
+
+def rebuild_stats():
+    """根据笔记表重新计算班级笔记统计和存储用量"""
+    with app.app_context():
+        rows = rebuild_note_stats()
+        print(f"已重建笔记统计，共 {rows} 行")
+        rows = note_quota.rebuild()
+        print(f"已重建存储用量，共 {rows} 行")
+
+def show_jobs():
+    """按类型和状态显示上传后处理任务数"""
+    with app.app_context():
+        counts = note_jobs.status_counts()
+        if not counts:
+            print("没有处理任务")
+            return
+        for (kind, status), count in sorted(counts.items()):
+            print(f"{kind:<14} {status:<8} {count}")
+
+def run_jobs():
+    """在当前进程中执行到期的处理任务（NOTE_JOB_WORKERS=0 时由此命令或单独的进程处理）"""
+    with app.app_context():
+        processed = note_jobs.run_pending()
+        print(f"已执行 {processed} 个处理任务")
+
+def requeue_jobs():
+    """把失败的处理任务重新排队"""
+    with app.app_context():
+        count = note_jobs.requeue_failed()
+        print(f"已重新排队 {count} 个失败的任务")
+
+def reconcile_uploads(options):
+    """核对上传目录与笔记记录，--fix 时删除孤立文件和悬空记录，--restart 时忽略上次的进度"""
+    with app.app_context():
+        fix = '--fix' in options
+        summary = reconciler.run(fix=fix, restart='--restart' in options)
+        if summary is None:
+            print("只能核对本地存储，或已有核对正在进行")
+            return
+
+        for key in summary['orphan_files']:
+            print(f"孤立文件: {key}")
+        for kind, row_id, key in summary['dangling_rows']:
+            print(f"悬空记录: {kind} {row_id} {key}")
+        for class_id, error in summary['errors']:
+            print(f"核对失败: 班级 {class_id} {error}")
+
+        print(f"已核对 {summary['classes']} 个班级目录，{summary['files']} 个文件")
+        print(f"孤立文件 {summary['orphan_file_count']} 个，共 {format_size(summary['orphan_bytes'])}")
+        print(f"悬空记录 {summary['dangling_row_count']} 条")
+        if fix:
+            print(f"已删除文件 {summary['removed_files']} 个，记录 {summary['removed_rows']} 条")
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("用法:")
+        print("  python notes_admin.py stats   # 查看笔记存储占用")
+        print("  python notes_admin.py dedupe  # 将旧笔记迁移到去重存储")
+        print("  python notes_admin.py gc      # 清理无引用的文件")
+        print("  python notes_admin.py thumbnails  # 为已有笔记补生成缩略图")
+        print("  python notes_admin.py push    # 将本地文件上传到对象存储")
+        print("  python notes_admin.py rebuild-stats  # 重新计算班级笔记统计和存储用量")
+        print("  python notes_admin.py jobs    # 查看上传后处理任务")
+        print("  python notes_admin.py run-jobs  # 在当前进程执行到期的处理任务")
+        print("  python notes_admin.py requeue  # 重新排队失败的处理任务")
+        print("  python notes_admin.py reconcile [--fix] [--restart]  # 核对上传目录与笔记记录")
+        sys.exit(1)
+
+    command = sys.argv[1]
+
+    if command == 'stats':
+        show_stats()
+    elif command == 'dedupe':
+        dedupe_legacy_notes()
+    elif command == 'gc':
+        collect_garbage()
+    elif command == 'thumbnails':
+        generate_thumbnails()
+    elif command == 'push':
+        push_to_storage()
+    elif command == 'rebuild-stats':
+        rebuild_stats()
+    elif command == 'jobs':
+        show_jobs()
+    elif command == 'run-jobs':
+        run_jobs()
+    elif command == 'requeue':
+        requeue_jobs()
+    elif command == 'reconcile':
+        reconcile_uploads(sys.argv[2:])
+    else:
+        print(f"未知命令: {command}")
+        sys.exit(1)
@@ -2,6 +2,7 @@ import os
 import sys
 from app import app, socketio, db
 from config import Config
+from utils.note_jobs import note_jobs
 import logging
 
 # 配置日志
@@ -30,6 +31,9 @@ def main():
             if not app.config.get(var):
                 print(f"⚠ 警告: 环境变量 {var} 未设置或为空")
         
+        # 启动笔记上传后处理的工作线程
+        note_jobs.start_workers()
+        
         # 启动SocketIO服务器
         print(f"🚀 服务器正在启动，监听端口 {Config.PORT}...")
         print(f"📡 访问地址: http://localhost:{Config.PORT}")
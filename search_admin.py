@@ -0,0 +1,48 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import app
+from utils.search_index import search_index
+
+def rebuild_index():
+    """重建全文索引（笔记、任务、公告、作业），并提取笔记文件中的文本"""
+    with app.app_context():
+        if not search_index.available:
+            print("当前数据库不支持全文索引（需要 SQLite FTS5 或 PostgreSQL）")
+            return
+
+        counts = search_index.rebuild()
+        for entity_type, count in counts.items():
+            print(f"{entity_type}: {count} 条")
+        print("全文索引重建完成")
+
+def search(query):
+    """在命令行中测试搜索"""
+    with app.app_context():
+        if not search_index.available:
+            print("当前数据库不支持全文索引")
+            return
+
+        total, hits = search_index.search(query, per_page=20)
+        print(f"共 {total} 条结果")
+        for entity_type, entity_id, score in hits:
+            print(f"  {entity_type} {entity_id}  得分 {score}")
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("用法:")
+        print("  python search_admin.py rebuild         # 重建全文索引")
+        print("  python search_admin.py search <关键词>  # 测试搜索")
+        sys.exit(1)
+
+    command = sys.argv[1]
+
+    if command == 'rebuild':
+        rebuild_index()
+    elif command == 'search' and len(sys.argv) > 2:
+        search(' '.join(sys.argv[2:]))
+    else:
+        print(f"未知命令: {command}")
+        sys.exit(1)
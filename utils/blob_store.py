@@ -0,0 +1,191 @@
+import hashlib
+import os
+import tempfile
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from models.note import NoteBlob, NoteJob
+from utils.storage import storage, note_key, UPLOADS_ROOT
+from utils.thumbnails import thumbnails
+from utils.note_tags import clear_note_tags
+from utils.note_stats import record_note_removed
+from utils.note_quota import note_quota
+
+READ_BLOCK_SIZE = 64 * 1024
+
+def class_upload_dir(class_id):
+    return os.path.join(UPLOADS_ROOT, str(class_id))
+
+def blob_relative_path(sha256, ext):
+    """内容寻址的相对路径：blobs/<前两位>/<sha256>.<扩展名>"""
+    name = f"{sha256}.{ext}" if ext else sha256
+    return f"blobs/{sha256[:2]}/{name}"
+
+def blob_key(blob):
+    return note_key(blob.class_id, blob.file_path)
+
+def note_file_key(note):
+    return note_key(note.class_id, note.file_path)
+
+def blob_absolute_path(blob):
+    """本地存储中的文件路径，使用对象存储时为 None"""
+    return storage.local_path(blob_key(blob))
+
+def file_sha256(path):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(READ_BLOCK_SIZE), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+def save_stream_to_temp(stream):
+    """将上传流写入临时文件，同时计算大小和 SHA-256，返回 (临时文件路径, 大小, SHA-256)"""
+    temp_dir = os.path.join(UPLOADS_ROOT, '.tmp')
+    os.makedirs(temp_dir, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=temp_dir, suffix='.upload')
+
+    sha256 = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for block in iter(lambda: stream.read(READ_BLOCK_SIZE), b''):
+                f.write(block)
+                sha256.update(block)
+                size += len(block)
+    except Exception:
+        os.remove(temp_path)
+        raise
+    return temp_path, size, sha256.hexdigest()
+
+def discard_source(path):
+    """事务提交后删除不再需要的源文件（内容已存在时 store_blob 不会移走源文件）"""
+    if path and os.path.exists(path):
+        os.remove(path)
+
+def _increment(blob):
+    """引用计数加一；记录已被并发删除（最后一个引用刚被移除）时返回 False"""
+    result = db.session.execute(
+        db.update(NoteBlob)
+        .where(NoteBlob.id == blob.id)
+        .values(ref_count=NoteBlob.ref_count + 1)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.expire(blob, ['ref_count'])
+    return result.rowcount == 1
+
+def _find_blob(class_id, sha256):
+    """查询并锁定已有的去重记录，移除最后一个引用的并发事务需要等待本事务结束"""
+    return NoteBlob.query.filter_by(class_id=class_id, sha256=sha256).with_for_update().first()
+
+def _create_blob(class_id, sha256, size, relative_path):
+    """创建去重记录，并发创建了相同内容时返回 (已有记录, False)"""
+    try:
+        with db.session.begin_nested():
+            blob = NoteBlob(
+                class_id=class_id,
+                sha256=sha256,
+                file_path=relative_path,
+                file_size=size,
+                ref_count=1
+            )
+            db.session.add(blob)
+        return blob, True
+    except IntegrityError:
+        return NoteBlob.query.filter_by(class_id=class_id, sha256=sha256).one(), False
+
+def store_blob(class_id, source_path, sha256, size, ext):
+    """将文件存入班级的内容寻址存储，返回 (NoteBlob, 是否为重复内容)
+
+    内容已存在时引用计数加一，源文件保留，由调用方在事务提交后删除；
+    否则把源文件保存到 blobs 下。引用计数在当前事务中更新，由调用方提交。
+    """
+    blob = _find_blob(class_id, sha256)
+
+    if blob is not None and _increment(blob):
+        if not storage.exists(blob_key(blob)):
+            # 文件丢失时用新上传的内容补回
+            storage.save(blob_key(blob), source_path)
+        return blob, True
+
+    # 内容不存在，或查询后记录已被并发删除：用源文件重新创建
+    relative_path = blob_relative_path(sha256, ext)
+    storage.save(note_key(class_id, relative_path), source_path)
+    blob, created = _create_blob(class_id, sha256, size, relative_path)
+    if created:
+        return blob, False
+    # 并发上传了相同内容，改为引用已有的文件
+    if blob.file_path != relative_path:
+        storage.delete(note_key(class_id, relative_path))
+    if not _increment(blob):
+        raise RuntimeError('去重记录已被删除，请重试')
+    return blob, True
+
+def register_uploaded_blob(class_id, sha256, size, ext):
+    """登记客户端直传到对象存储的文件，返回 (NoteBlob, 是否为重复内容)
+
+    直传的文件已经位于内容寻址的键下；内容已存在且键不同（扩展名不同）时删除刚上传的对象。
+    """
+    relative_path = blob_relative_path(sha256, ext)
+    blob = _find_blob(class_id, sha256)
+
+    if blob is None or not _increment(blob):
+        blob, created = _create_blob(class_id, sha256, size, relative_path)
+        if created:
+            return blob, False
+        if not _increment(blob):
+            raise RuntimeError('去重记录已被删除，请重试')
+
+    if blob.file_path != relative_path:
+        storage.delete(note_key(class_id, relative_path))
+    return blob, True
+
+def release_blob(blob_id):
+    """引用计数减一，最后一个引用被移除时删除记录
+
+    返回需要在事务提交后删除的文件键，仍有引用时返回 None。
+    """
+    db.session.execute(
+        db.update(NoteBlob)
+        .where(NoteBlob.id == blob_id)
+        .values(ref_count=NoteBlob.ref_count - 1)
+        .execution_options(synchronize_session=False)
+    )
+    blob = db.session.get(NoteBlob, blob_id, populate_existing=True)
+    if blob is None or blob.ref_count > 0:
+        return None
+
+    key = blob_key(blob)
+    db.session.delete(blob)
+    return key
+
+def note_file_keys(key):
+    """文件及其缩略图的键"""
+    return [key, thumbnails.path_for(key)]
+
+def delete_note(note):
+    """删除笔记记录并释放文件引用、标签、统计、存储用量和处理任务，返回事务提交后需要删除的文件键列表"""
+    clear_note_tags(note)
+    record_note_removed(note)
+    note_quota.release(note)
+    NoteJob.query.filter_by(note_id=note.id).delete(synchronize_session=False)
+    
+    keys = []
+    if note.blob_id:
+        key = release_blob(note.blob_id)
+        if key:
+            keys.extend(note_file_keys(key))
+    else:
+        # 去重存储之前上传的笔记独占自己的文件
+        keys.extend(note_file_keys(note_file_key(note)))
+
+    db.session.delete(note)
+    return keys
+
+def remove_files(keys):
+    """从存储中删除文件，返回释放的字节数"""
+    reclaimed = 0
+    for key in keys:
+        size = storage.delete(key)
+        if size:
+            reclaimed += size
+            print(f"已删除文件: {key}")
+    return reclaimed
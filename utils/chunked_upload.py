@@ -0,0 +1,241 @@
+import hashlib
+import json
+import os
+import secrets
+import string
+import threading
+import time
+
+class UploadError(Exception):
+    """分片上传请求错误，status 为对应的 HTTP 状态码"""
+
+    def __init__(self, message, status=400, **extra):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.extra = extra
+
+class ChunkedUploadManager:
+    """可续传的分片上传
+
+    每个上传会话在临时目录中对应一个数据文件（.part）和一个元数据文件（.json）。
+    分片按偏移量顺序追加，写入时同步计算大小和 SHA-256；哈希状态保存在内存中，
+    进程重启后从已写入的数据重新计算。
+    """
+
+    CHUNK_READ_SIZE = 64 * 1024
+
+    def __init__(self):
+        self.app = None
+        self.temp_dir = None
+        self.max_file_size = 200 * 1024 * 1024
+        self.expire_seconds = 24 * 3600
+        self.lock = threading.Lock()
+        self.upload_locks = {}
+        self.hashers = {}
+
+    def init_app(self, app):
+        self.app = app
+        self.temp_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'uploads', '.tmp')
+        self.max_file_size = app.config.get('NOTE_MAX_FILE_SIZE', 200 * 1024 * 1024)
+        self.expire_seconds = app.config.get('NOTE_UPLOAD_EXPIRE_HOURS', 24) * 3600
+        os.makedirs(self.temp_dir, exist_ok=True)
+
+    def _paths(self, upload_id):
+        return (
+            os.path.join(self.temp_dir, f'{upload_id}.part'),
+            os.path.join(self.temp_dir, f'{upload_id}.json')
+        )
+
+    def _upload_lock(self, upload_id):
+        with self.lock:
+            return self.upload_locks.setdefault(upload_id, threading.Lock())
+
+    def _load(self, upload_id, whiteboard_id):
+        # upload_id 由 token_urlsafe 生成，其他字符一律视为不存在，避免路径穿越
+        if not upload_id or not all(c.isalnum() or c in '-_' for c in upload_id):
+            raise UploadError('上传会话不存在', 404)
+        _, meta_path = self._paths(upload_id)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            raise UploadError('上传会话不存在或已过期', 404)
+        if meta['whiteboard_id'] != whiteboard_id:
+            raise UploadError('上传会话不存在', 404)
+        return meta
+
+    def _save(self, meta):
+        _, meta_path = self._paths(meta['upload_id'])
+        tmp_path = meta_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, meta_path)
+
+    def _hasher(self, meta):
+        """获取上传会话的增量哈希，内存中没有时从已写入的数据重建"""
+        upload_id = meta['upload_id']
+        hasher = self.hashers.get(upload_id)
+        if hasher is not None and hasher[1] == meta['offset']:
+            return hasher[0]
+
+        sha256 = hashlib.sha256()
+        part_path, _ = self._paths(upload_id)
+        remaining = meta['offset']
+        with open(part_path, 'rb') as f:
+            while remaining > 0:
+                block = f.read(min(self.CHUNK_READ_SIZE, remaining))
+                if not block:
+                    break
+                sha256.update(block)
+                remaining -= len(block)
+        self.hashers[upload_id] = (sha256, meta['offset'])
+        return sha256
+
+    def status(self, meta):
+        return {
+            'upload_id': meta['upload_id'],
+            'filename': meta['filename'],
+            'size': meta['size'],
+            'offset': meta['offset'],
+            'complete': meta['offset'] == meta['size'],
+            'expires_at': int(meta['updated_at'] + self.expire_seconds)
+        }
+
+    def create(self, whiteboard, filename, size, metadata=None, sha256=None):
+        if not isinstance(size, int) or size <= 0:
+            raise UploadError('文件大小无效')
+        if size > self.max_file_size:
+            raise UploadError(f'文件大小不能超过{self.max_file_size // (1024 * 1024)}MB', 413)
+        if sha256 and (
+            not isinstance(sha256, str) or len(sha256) != 64 or not all(c in string.hexdigits for c in sha256)
+        ):
+            raise UploadError('sha256 必须是64位十六进制字符串')
+
+        upload_id = secrets.token_urlsafe(16)
+        part_path, _ = self._paths(upload_id)
+        open(part_path, 'wb').close()
+
+        now = time.time()
+        meta = {
+            'upload_id': upload_id,
+            'whiteboard_id': whiteboard.id,
+            'class_id': whiteboard.class_id,
+            'filename': filename,
+            'size': size,
+            'offset': 0,
+            'sha256': sha256.lower() if sha256 else None,
+            'metadata': metadata or {},
+            'created_at': now,
+            'updated_at': now
+        }
+        self._save(meta)
+        self.hashers[upload_id] = (hashlib.sha256(), 0)
+        return meta
+
+    def get(self, upload_id, whiteboard_id):
+        return self._load(upload_id, whiteboard_id)
+
+    def append(self, upload_id, whiteboard_id, offset, content_length, stream):
+        """在 offset 处追加一个分片
+
+        在读取请求体之前根据 Content-Length 检查大小，超出声明大小时直接拒绝；
+        连接中断时保留已写入的部分，客户端查询状态后从新的偏移量继续。
+        """
+        with self._upload_lock(upload_id):
+            meta = self._load(upload_id, whiteboard_id)
+
+            if offset != meta['offset']:
+                raise UploadError('偏移量不匹配', 409, offset=meta['offset'])
+            if content_length is None:
+                raise UploadError('缺少 Content-Length', 411)
+            if offset + content_length > meta['size']:
+                raise UploadError('分片超出文件声明的大小', 413, offset=meta['offset'])
+
+            hasher = self._hasher(meta)
+            part_path, _ = self._paths(upload_id)
+            written = 0
+            try:
+                with open(part_path, 'r+b') as f:
+                    f.seek(offset)
+                    while written < content_length:
+                        block = stream.read(min(self.CHUNK_READ_SIZE, content_length - written))
+                        if not block:
+                            break
+                        f.write(block)
+                        hasher.update(block)
+                        written += len(block)
+                    f.truncate()
+            finally:
+                meta['offset'] = offset + written
+                meta['updated_at'] = time.time()
+                self.hashers[upload_id] = (hasher, meta['offset'])
+                self._save(meta)
+
+            return meta
+
+    def finalize(self, upload_id, whiteboard_id, complete):
+        """校验完整性后调用 complete(元数据, SHA-256, 数据文件路径) 保存文件
+
+        complete 成功返回后删除上传会话并返回其结果；失败时会话保留，客户端可以重试。
+        """
+        with self._upload_lock(upload_id):
+            meta = self._load(upload_id, whiteboard_id)
+            if meta['offset'] != meta['size']:
+                raise UploadError('文件尚未上传完成', 409, offset=meta['offset'])
+
+            digest = self._hasher(meta).hexdigest()
+            if meta['sha256'] and meta['sha256'] != digest:
+                self.discard(upload_id)
+                raise UploadError('文件校验失败，请重新上传', 422)
+
+            part_path, _ = self._paths(upload_id)
+            try:
+                result = complete(meta, digest, part_path)
+            except Exception:
+                # 数据文件已被移走时会话无法重试
+                if not os.path.exists(part_path):
+                    self.discard(upload_id)
+                raise
+            self.discard(upload_id)
+            return result
+
+    def discard(self, upload_id):
+        for path in self._paths(upload_id):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self.hashers.pop(upload_id, None)
+        with self.lock:
+            self.upload_locks.pop(upload_id, None)
+
+    def cleanup_expired(self):
+        """删除长时间没有进展的上传会话，返回删除的数量"""
+        if not self.temp_dir or not os.path.isdir(self.temp_dir):
+            return 0
+
+        cutoff = time.time() - self.expire_seconds
+        removed = 0
+        for name in os.listdir(self.temp_dir):
+            if name.endswith('.upload'):
+                # 单次上传中断遗留的临时文件
+                path = os.path.join(self.temp_dir, name)
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                continue
+            if not name.endswith('.json'):
+                continue
+            upload_id = name[:-len('.json')]
+            try:
+                with open(os.path.join(self.temp_dir, name), 'r', encoding='utf-8') as f:
+                    updated_at = json.load(f).get('updated_at', 0)
+            except (OSError, ValueError):
+                updated_at = 0
+            if updated_at < cutoff:
+                self.discard(upload_id)
+                removed += 1
+        return removed
+
+# 创建全局实例
+chunked_uploads = ChunkedUploadManager()
@@ -0,0 +1,192 @@
+import queue
+import random
+import threading
+import time
+from utils.time_utils import get_china_time, format_china_time
+from utils.metrics import metrics
+
+class ConnectAdmissionManager:
+    """白板连接准入控制
+
+    大量白板同时重连（早上开机、断网恢复）时，连接侧的数据库写入
+    （在线状态、状态历史）统一进入有界队列，由后台线程按批次合并提交；
+    认证查询的并发数也受限制。超出容量时拒绝连接，并返回带抖动的重试间隔。
+    """
+
+    def __init__(self):
+        self.app = None
+        self.queue = None
+        self.auth_slots = None
+        self.worker = None
+        self.batch_size = 100
+        self.flush_interval = 0.2
+        self.auth_timeout = 0.5
+        self.retry_after_base = 2.0
+        self.retry_after_jitter = 8.0
+        self.stats_lock = threading.Lock()
+        self.stats = {
+            'admitted': 0,
+            'rejected': 0,
+            'batches': 0,
+            'events_applied': 0,
+            'max_batch': 0,
+            'last_batch_ms': 0.0
+        }
+
+    def init_app(self, app):
+        self.app = app
+        self.batch_size = app.config.get('CONNECT_BATCH_SIZE', 100)
+        self.flush_interval = app.config.get('CONNECT_FLUSH_INTERVAL', 0.2)
+        self.auth_timeout = app.config.get('CONNECT_AUTH_TIMEOUT', 0.5)
+        self.retry_after_base = app.config.get('CONNECT_RETRY_AFTER_BASE', 2.0)
+        self.retry_after_jitter = app.config.get('CONNECT_RETRY_AFTER_JITTER', 8.0)
+        self.queue = queue.Queue(maxsize=app.config.get('CONNECT_QUEUE_SIZE', 1000))
+        self.auth_slots = threading.BoundedSemaphore(app.config.get('CONNECT_MAX_CONCURRENT_AUTH', 8))
+
+        metrics.describe('connect_admission_queue_depth', '等待落库的白板上下线事件数')
+        metrics.register_gauge('connect_admission_queue_depth', lambda: self.queue.qsize())
+
+        if self.worker is None or not self.worker.is_alive():
+            self.worker = threading.Thread(target=self._run, name='connect-admission', daemon=True)
+            self.worker.start()
+
+    def retry_after(self):
+        """生成带抖动的重试间隔（秒），避免客户端同时重连"""
+        return round(self.retry_after_base + random.uniform(0, self.retry_after_jitter), 1)
+
+    def acquire_auth_slot(self):
+        """获取认证查询名额，超时未获取到返回False"""
+        if self.auth_slots is None:
+            return True
+        acquired = self.auth_slots.acquire(timeout=self.auth_timeout)
+        if not acquired:
+            self._count('rejected')
+        return acquired
+
+    def release_auth_slot(self):
+        if self.auth_slots is not None:
+            self.auth_slots.release()
+
+    def submit_presence(self, whiteboard_id, class_id, is_online, heartbeat=None, last_heartbeat=None):
+        """提交一次在线状态变更，队列已满时返回False
+
+        heartbeat 为需要写入的心跳时间（None 表示保留原值），
+        last_heartbeat 仅用于推送给教师端显示。
+        """
+        event = self._presence_event(whiteboard_id, class_id, is_online, heartbeat, last_heartbeat)
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self._count('rejected')
+            return False
+        self._count('admitted')
+        return True
+
+    def submit_offline(self, whiteboard_id, class_id, last_heartbeat=None):
+        """提交断开连接后的下线状态，不能像连接那样拒绝
+
+        队列已满时阻塞等待空位：下线状态必须经过同一队列写入，
+        排在该白板之前提交的上线状态之后，不会被其覆盖。
+        """
+        event = self._presence_event(whiteboard_id, class_id, False, None, last_heartbeat)
+        self.queue.put(event)
+        self._count('admitted')
+
+    def _presence_event(self, whiteboard_id, class_id, is_online, heartbeat, last_heartbeat):
+        return {
+            'whiteboard_id': whiteboard_id,
+            'class_id': class_id,
+            'is_online': is_online,
+            'heartbeat': heartbeat,
+            'last_heartbeat': heartbeat or last_heartbeat,
+            'recorded_at': get_china_time()
+        }
+
+    def get_stats(self):
+        with self.stats_lock:
+            stats = dict(self.stats)
+        stats['queue_depth'] = self.queue.qsize() if self.queue else 0
+        return stats
+
+    def _count(self, key, value=1):
+        with self.stats_lock:
+            self.stats[key] += value
+
+    def _run(self):
+        while True:
+            try:
+                first = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+
+            batch = [first]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            started = time.perf_counter()
+            try:
+                self._apply_batch(batch)
+            except Exception as e:
+                self.app.logger.error(f"批量更新白板在线状态失败: {str(e)}")
+            elapsed_ms = (time.perf_counter() - started) * 1000
+
+            with self.stats_lock:
+                self.stats['batches'] += 1
+                self.stats['events_applied'] += len(batch)
+                self.stats['max_batch'] = max(self.stats['max_batch'], len(batch))
+                self.stats['last_batch_ms'] = round(elapsed_ms, 2)
+
+    def _apply_batch(self, batch):
+        """在一个事务中应用一批在线状态变更"""
+        with self.app.app_context():
+            from extensions import db
+            from utils.outbound_queue import outbound_queue
+            from models.whiteboard import Whiteboard, WhiteboardStatusHistory
+
+            # 同一白板在批次内多次变更时只保留最后一次
+            latest = {}
+            for event in batch:
+                latest[event['whiteboard_id']] = event
+
+            whiteboard_table = Whiteboard.__table__
+            try:
+                db.session.execute(
+                    whiteboard_table.update()
+                    .where(whiteboard_table.c.id == db.bindparam('b_id'))
+                    .values(
+                        is_online=db.bindparam('b_online'),
+                        last_heartbeat=db.func.coalesce(db.bindparam('b_heartbeat'), whiteboard_table.c.last_heartbeat)
+                    ),
+                    [{
+                        'b_id': event['whiteboard_id'],
+                        'b_online': event['is_online'],
+                        'b_heartbeat': event['heartbeat']
+                    } for event in latest.values()]
+                )
+                db.session.execute(
+                    WhiteboardStatusHistory.__table__.insert(),
+                    [{
+                        'whiteboard_id': event['whiteboard_id'],
+                        'is_online': event['is_online'],
+                        'recorded_at': event['recorded_at']
+                    } for event in batch]
+                )
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            finally:
+                db.session.remove()
+
+            for event in latest.values():
+                outbound_queue.emit('whiteboard_status_update', {
+                    'whiteboard_id': event['whiteboard_id'],
+                    'is_online': event['is_online'],
+                    'last_heartbeat': format_china_time(event['last_heartbeat']) if event['last_heartbeat'] else None
+                }, room=f"class_teachers_{event['class_id']}", coalesce_key=f"whiteboard_status:{event['whiteboard_id']}")
+
+# 创建全局实例
+connect_admission = ConnectAdmissionManager()
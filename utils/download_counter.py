@@ -0,0 +1,84 @@
+import atexit
+import threading
+from utils.metrics import metrics
+
+class DownloadCounter:
+    """笔记下载计数缓冲
+
+    下载时只在内存中累加，由定时任务批量写回数据库：
+    UPDATE note SET download_count = download_count + :n。
+    同一笔记在一个周期内的多次下载只产生一次写入，也不会因并发的读-改-写丢失计数。
+    写回失败时计数放回缓冲区，下个周期重试；进程退出前会再写回一次。
+    """
+
+    def __init__(self):
+        self.app = None
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.counts = {}
+
+    def init_app(self, app):
+        self.app = app
+
+        metrics.describe('note_download_counts_flushed_total', '写回数据库的下载次数')
+        metrics.describe('note_download_count_flush_failures_total', '写回下载计数失败的次数')
+        metrics.register_gauge('note_download_counts_pending', self.pending)
+
+        atexit.register(self._flush_on_exit)
+
+    def record(self, note_id, count=1):
+        with self.lock:
+            self.counts[note_id] = self.counts.get(note_id, 0) + count
+
+    def pending(self, note_id=None):
+        """尚未写回的下载次数（不指定笔记时为总数）"""
+        with self.lock:
+            if note_id is None:
+                return sum(self.counts.values())
+            return self.counts.get(note_id, 0)
+
+    def flush(self):
+        """把缓冲的计数写回数据库，需要在应用上下文中调用，返回写回的次数"""
+        from extensions import db
+        from models.note import Note
+
+        with self.flush_lock:
+            with self.lock:
+                counts, self.counts = self.counts, {}
+            if not counts:
+                return 0
+
+            table = Note.__table__
+            statement = table.update() \
+                .where(table.c.id == db.bindparam('note_id')) \
+                .values(download_count=db.func.coalesce(table.c.download_count, 0) + db.bindparam('increment'))
+
+            try:
+                db.session.execute(statement, [
+                    {'note_id': note_id, 'increment': increment}
+                    for note_id, increment in counts.items()
+                ])
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                with self.lock:
+                    for note_id, increment in counts.items():
+                        self.counts[note_id] = self.counts.get(note_id, 0) + increment
+                metrics.inc('note_download_count_flush_failures_total')
+                raise
+
+            total = sum(counts.values())
+            metrics.inc('note_download_counts_flushed_total', total)
+            return total
+
+    def _flush_on_exit(self):
+        if self.app is None or not self.counts:
+            return
+        try:
+            with self.app.app_context():
+                self.flush()
+        except Exception as e:
+            print(f"写回下载计数失败: {str(e)}")
+
+# 创建全局实例
+download_counter = DownloadCounter()
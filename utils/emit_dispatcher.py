@@ -0,0 +1,110 @@
+import queue
+import threading
+import time
+import zlib
+from sqlalchemy import event as sa_event
+from sqlalchemy.orm import Session
+from utils.metrics import metrics
+
+PENDING_EMITS_KEY = 'pending_emits'
+
+class EmitDispatcher:
+    """事务感知的Socket事件分发器
+
+    请求处理中只登记要发送的事件：当前会话处于事务中时，事件挂在会话上，
+    事务提交后才交给后台线程池发送，回滚的事务对应的事件会被丢弃；
+    不在事务中时立即交给线程池。同一房间的事件固定由同一个线程按顺序发送。
+    """
+
+    def __init__(self):
+        self.app = None
+        self.queues = []
+        self.workers = []
+        self.listening = False
+
+    def init_app(self, app):
+        self.app = app
+        worker_count = max(1, app.config.get('EMIT_DISPATCHER_WORKERS', 4))
+
+        metrics.describe('socketio_emit_delivery_seconds', '事件从事务提交到发送给客户端的耗时（秒），含发送队列中的等待')
+        metrics.describe('socketio_emit_discarded_total', '因事务回滚而丢弃的事件数')
+        metrics.describe('socketio_emit_dispatcher_backlog', '分发线程池中等待处理的事件数')
+        metrics.register_gauge('socketio_emit_dispatcher_backlog', lambda: sum(q.qsize() for q in self.queues))
+
+        if not self.listening:
+            sa_event.listen(Session, 'after_commit', self._after_commit)
+            sa_event.listen(Session, 'after_transaction_end', self._after_transaction_end)
+            self.listening = True
+
+        if not self.workers:
+            for index in range(worker_count):
+                work_queue = queue.Queue()
+                worker = threading.Thread(
+                    target=self._run,
+                    args=(work_queue,),
+                    name=f'emit-dispatcher-{index}',
+                    daemon=True
+                )
+                self.queues.append(work_queue)
+                self.workers.append(worker)
+                worker.start()
+
+    def emit_stream(self, room, event, data):
+        """提交后经 event_stream 编号发送到房间"""
+        self._defer(('stream', room, event, data, None))
+
+    def emit(self, event, data, room, coalesce_key=None):
+        """提交后经出站队列发送到房间（不编号）"""
+        self._defer(('direct', room, event, data, coalesce_key))
+
+    def _defer(self, item):
+        from extensions import db
+        session = db.session()
+        if session.in_transaction():
+            session.info.setdefault(PENDING_EMITS_KEY, []).append(item)
+        else:
+            self._submit([item])
+
+    def _after_commit(self, session):
+        items = session.info.pop(PENDING_EMITS_KEY, None)
+        if items:
+            self._submit(items)
+
+    def _after_transaction_end(self, session, transaction):
+        # 最外层事务结束时仍未发送的事件属于回滚或未提交的事务
+        if transaction.parent is not None:
+            return
+        items = session.info.pop(PENDING_EMITS_KEY, None)
+        if items:
+            metrics.inc('socketio_emit_discarded_total', len(items))
+
+    def _submit(self, items):
+        enqueued_at = time.monotonic()
+        for item in items:
+            if not self.queues:
+                # 未初始化线程池时（如命令行脚本）直接发送
+                self._deliver(enqueued_at, *item)
+                continue
+            room = item[1]
+            shard = zlib.crc32(room.encode('utf-8')) % len(self.queues)
+            self.queues[shard].put((enqueued_at,) + item)
+
+    def _deliver(self, enqueued_at, kind, room, event, data, coalesce_key):
+        from utils.event_stream import event_stream
+        from utils.outbound_queue import outbound_queue
+
+        try:
+            if kind == 'stream':
+                event_stream.emit(room, event, data, enqueued_at=enqueued_at)
+            else:
+                outbound_queue.emit(event, data, room=room, coalesce_key=coalesce_key, enqueued_at=enqueued_at)
+        except Exception as e:
+            if self.app:
+                self.app.logger.error(f"分发Socket事件失败: {str(e)}")
+
+    def _run(self, work_queue):
+        while True:
+            self._deliver(*work_queue.get())
+
+# 创建全局实例
+emit_dispatcher = EmitDispatcher()
@@ -0,0 +1,88 @@
+import secrets
+import threading
+from collections import deque
+
+class EventStream:
+    """按房间编号的实时事件流
+
+    每个房间（如 whiteboard_{id}）维护单调递增的序号和一个有界环形缓冲区，
+    客户端断线重连后提交最后收到的序号即可补发遗漏的事件；
+    缓冲区已被覆盖或服务端重启（stream_epoch 变化）时需要全量同步。
+    """
+
+    def __init__(self, buffer_size=200):
+        self.buffer_size = buffer_size
+        # 服务端每次启动生成新的纪元，重启后旧序号失效
+        self.epoch = secrets.token_hex(4)
+        self.lock = threading.Lock()
+        self.sequences = {}
+        self.buffers = {}
+
+    def init_app(self, app):
+        self.buffer_size = app.config.get('EVENT_REPLAY_BUFFER_SIZE', 200)
+
+    def _publish(self, room, event, data):
+        seq = self.sequences.get(room, 0) + 1
+        self.sequences[room] = seq
+        payload = dict(data)
+        payload['seq'] = seq
+        payload['stream_epoch'] = self.epoch
+        buffer = self.buffers.get(room)
+        if buffer is None:
+            buffer = self.buffers[room] = deque(maxlen=self.buffer_size)
+        buffer.append((seq, event, payload))
+        return payload
+
+    def emit(self, room, event, data, enqueued_at=None):
+        """编号后发送到房间
+
+        编号与入队在同一把锁内完成，保证客户端按序号顺序收到事件。
+        """
+        from utils.outbound_queue import outbound_queue
+        with self.lock:
+            payload = self._publish(room, event, data)
+            outbound_queue.emit(event, payload, room=room, enqueued_at=enqueued_at)
+        return payload
+
+    def subscribe(self, room, sid, last_seq=None, epoch=None):
+        """让连接加入房间，并按需补发 last_seq 之后的事件
+
+        加入房间与补发在同一把锁内完成，之后发布的事件一定排在补发事件之后。
+        返回补发的事件数，无法补发时返回 None，未请求补发时返回 0。
+        遗漏的事件超过发送队列深度时也返回 None，由客户端全量同步，避免补发本身使连接因积压被断开。
+        """
+        from flask_socketio import join_room
+        from utils.outbound_queue import outbound_queue
+        with self.lock:
+            join_room(room, sid=sid)
+            if last_seq is None:
+                return 0
+            events = self._replay(room, last_seq, epoch)
+            if events is None or len(events) > outbound_queue.depth:
+                return None
+            for seq, event, payload in events:
+                outbound_queue.emit(event, payload, to=sid)
+            return len(events)
+
+    def last_seq(self, room):
+        with self.lock:
+            return self.sequences.get(room, 0)
+
+    def replay(self, room, last_seq, epoch=None):
+        """返回 last_seq 之后的事件列表；无法补发时返回 None"""
+        with self.lock:
+            return self._replay(room, last_seq, epoch)
+
+    def _replay(self, room, last_seq, epoch=None):
+        current = self.sequences.get(room, 0)
+        if epoch is not None and epoch != self.epoch:
+            return None if current or last_seq else []
+        if last_seq >= current:
+            return []
+        buffer = self.buffers.get(room)
+        if not buffer or buffer[0][0] > last_seq + 1:
+            return None
+        return [(seq, event, payload) for seq, event, payload in buffer if seq > last_seq]
+
+# 创建全局实例
+event_stream = EventStream()
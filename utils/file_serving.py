@@ -0,0 +1,132 @@
+import mimetypes
+import os
+from datetime import datetime, timezone
+from urllib.parse import quote
+from flask import current_app, request, send_file, jsonify, redirect
+from utils.storage import storage, content_disposition, UPLOADS_ROOT
+from utils.thumbnails import thumbnails
+
+def file_etag(path, sha256=None):
+    """文件的强 ETag：去重存储的文件使用内容摘要，旧文件使用修改时间和大小"""
+    if sha256 is None:
+        # 去重存储的文件名就是内容摘要：blobs/<前两位>/<sha256>.<扩展名>
+        name, _, ext = os.path.basename(path).partition('.')
+        parent = os.path.basename(os.path.dirname(path))
+        if '.' not in ext and len(name) == 64 and name.startswith(parent) and all(c in '0123456789abcdef' for c in name):
+            sha256 = name
+    if sha256:
+        return sha256
+    stat = os.stat(path)
+    return f'{stat.st_mtime_ns:x}-{stat.st_size:x}'
+
+def _offload_response(path, mode, mimetype, as_attachment, download_name, etag, last_modified):
+    """只返回响应头，由前端 Web 服务器（nginx / Apache）发送文件内容和处理 Range"""
+    if mimetype is None:
+        mimetype = mimetypes.guess_type(download_name or path)[0] or 'application/octet-stream'
+    response = current_app.response_class(mimetype=mimetype)
+    if mode == 'x-accel-redirect':
+        prefix = current_app.config.get('FILE_ACCEL_REDIRECT_PREFIX', '/_protected_uploads/')
+        relative_path = os.path.relpath(path, UPLOADS_ROOT).replace(os.sep, '/')
+        response.headers['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(relative_path)
+    else:
+        response.headers['X-Sendfile'] = os.path.abspath(path)
+
+    if download_name:
+        response.headers['Content-Disposition'] = content_disposition(download_name, as_attachment)
+
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    return response.make_conditional(request.environ)
+
+def send_note_file(path, mimetype=None, as_attachment=False, download_name=None, sha256=None):
+    """发送笔记文件
+
+    带强 ETag 和 Last-Modified，处理 If-None-Match / If-Modified-Since / If-Range 和 Range 请求。
+    配置 FILE_SERVE_OFFLOAD 为 x-sendfile 或 x-accel-redirect 时，
+    权限检查通过后只返回响应头，由前端 Web 服务器发送文件内容。
+    """
+    etag = file_etag(path, sha256)
+    last_modified = datetime.fromtimestamp(os.path.getmtime(path), tz=timezone.utc)
+
+    mode = current_app.config.get('FILE_SERVE_OFFLOAD')
+    if mode in ('x-sendfile', 'x-accel-redirect'):
+        response = _offload_response(path, mode, mimetype, as_attachment, download_name, etag, last_modified)
+    else:
+        response = send_file(
+            path,
+            mimetype=mimetype,
+            as_attachment=as_attachment,
+            download_name=download_name,
+            conditional=True,
+            etag=etag,
+            last_modified=last_modified,
+            max_age=None
+        )
+
+    # 文件需要权限才能访问，只允许浏览器缓存，每次使用前用 ETag 重新验证
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+def send_stored_file(key, mimetype=None, as_attachment=False, download_name=None, sha256=None):
+    """发送存储中的笔记文件
+
+    本地存储直接发送文件；对象存储重定向到预签名链接，文件内容不经过应用服务器。
+    """
+    path = storage.local_path(key)
+    if path is not None:
+        return send_note_file(path, mimetype, as_attachment, download_name, sha256)
+
+    response = redirect(storage.download_url(
+        key, download_name=download_name, mimetype=mimetype, as_attachment=as_attachment
+    ))
+    # 预签名链接有过期时间，不缓存重定向
+    response.cache_control.private = True
+    response.cache_control.no_store = True
+    return response
+
+def is_full_download(response):
+    """响应是否为一次新的下载：完整响应、从第一个字节开始的分段响应或重定向到对象存储
+
+    用于统计下载次数，浏览器预览 PDF 时的后续分段请求和 304 不计入。
+    """
+    if response.status_code in (200, 302):
+        return True
+    if response.status_code == 206:
+        content_range = response.content_range
+        return content_range is not None and content_range.start == 0
+    return False
+
+def thumbnail_pending_response():
+    response = jsonify({'status': 'pending', 'message': '缩略图生成中'})
+    response.status_code = 202
+    response.headers['Retry-After'] = '2'
+    return response
+
+def send_note_thumbnail(key, file_type, processing=False):
+    """发送笔记缩略图；尚未生成时提交后台任务并返回 202，客户端稍后重试
+
+    对象存储中的缩略图由上传后处理任务生成并上传，请求时只重定向到已有的缩略图，
+    processing 为 True（笔记仍在处理中）时返回 202，否则返回 404。
+    """
+    if not thumbnails.supports(file_type):
+        return jsonify({'error': '该文件类型没有缩略图'}), 404
+
+    source_path = storage.local_path(key)
+    if source_path is None:
+        thumbnail_key = thumbnails.path_for(key)
+        if storage.exists(thumbnail_key):
+            return send_stored_file(thumbnail_key, mimetype=f'image/{thumbnails.fmt}')
+        if processing:
+            return thumbnail_pending_response()
+        return jsonify({'error': '缩略图不存在'}), 404
+
+    target_path = thumbnails.path_for(source_path)
+    if os.path.exists(target_path):
+        return send_note_file(target_path, mimetype=f'image/{thumbnails.fmt}')
+
+    if not os.path.exists(source_path):
+        return jsonify({'error': '文件不存在'}), 404
+
+    thumbnails.schedule(source_path, file_type)
+    return thumbnail_pending_response()
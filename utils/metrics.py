@@ -0,0 +1,103 @@
+import threading
+
+class MetricsRegistry:
+    """进程内指标注册表，以 Prometheus 文本格式导出
+
+    counter 只增不减；gauge 可以直接设置，也可以注册回调在导出时计算；
+    summary 记录观测值的次数、总和与最大值。
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.gauge_callbacks = {}
+        self.summaries = {}
+        self.help = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((labels or {}).items()))
+
+    def describe(self, name, text):
+        self.help[name] = text
+
+    def inc(self, name, value=1, labels=None):
+        key = self._key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, labels=None):
+        with self.lock:
+            self.gauges[self._key(name, labels)] = value
+
+    def register_gauge(self, name, callback):
+        """注册在导出时计算的 gauge，回调返回数值或 {标签字典的元组: 数值}"""
+        with self.lock:
+            self.gauge_callbacks[name] = callback
+
+    def observe(self, name, value, labels=None):
+        key = self._key(name, labels)
+        with self.lock:
+            count, total, maximum = self.summaries.get(key, (0, 0.0, 0.0))
+            self.summaries[key] = (count + 1, total + value, max(maximum, value))
+
+    def get_counter(self, name, labels=None):
+        with self.lock:
+            return self.counters.get(self._key(name, labels), 0)
+
+    @staticmethod
+    def _format_labels(labels):
+        if not labels:
+            return ''
+        parts = []
+        for key, value in labels:
+            value = str(value).replace('\\', '\\\\').replace('"', '\\"')
+            parts.append(f'{key}="{value}"')
+        return '{' + ','.join(parts) + '}'
+
+    def render(self):
+        """生成 Prometheus 文本格式"""
+        with self.lock:
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+            callbacks = dict(self.gauge_callbacks)
+            summaries = dict(self.summaries)
+
+        for name, callback in callbacks.items():
+            try:
+                value = callback()
+            except Exception:
+                continue
+            if isinstance(value, dict):
+                for labels, item in value.items():
+                    gauges[(name, tuple(labels))] = item
+            else:
+                gauges[(name, ())] = value
+
+        lines = []
+        for metric_type, values in (('counter', counters), ('gauge', gauges)):
+            for name in sorted({key[0] for key in values}):
+                if name in self.help:
+                    lines.append(f'# HELP {name} {self.help[name]}')
+                lines.append(f'# TYPE {name} {metric_type}')
+                for (metric_name, labels), value in sorted(values.items()):
+                    if metric_name == name:
+                        lines.append(f'{name}{self._format_labels(labels)} {value}')
+
+        for name in sorted({key[0] for key in summaries}):
+            if name in self.help:
+                lines.append(f'# HELP {name} {self.help[name]}')
+            lines.append(f'# TYPE {name} summary')
+            for (metric_name, labels), (count, total, maximum) in sorted(summaries.items()):
+                if metric_name != name:
+                    continue
+                label_str = self._format_labels(labels)
+                lines.append(f'{name}_count{label_str} {count}')
+                lines.append(f'{name}_sum{label_str} {round(total, 6)}')
+                lines.append(f'{name}_max{label_str} {round(maximum, 6)}')
+
+        return '\n'.join(lines) + '\n'
+
+# 创建全局实例
+metrics = MetricsRegistry()
@@ -0,0 +1,424 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import timedelta
+from sqlalchemy import event as sa_event
+from sqlalchemy.orm import Session
+from extensions import db
+from models.note import Note, NoteJob
+from utils.time_utils import get_china_time
+from utils.storage import storage
+from utils.blob_store import note_file_key, file_sha256
+from utils.thumbnails import thumbnails
+from utils.search_index import search_index, TEXT_TYPES, PDF_TYPES
+from utils.metrics import metrics
+
+try:
+    from PIL import Image  # 读取图片尺寸
+except ImportError:
+    Image = None
+
+try:
+    import fitz  # PyMuPDF，读取 PDF 页数
+except ImportError:
+    fitz = None
+
+PENDING_JOBS_KEY = 'note_jobs_enqueued'
+SNIFF_BYTES = 4096
+
+# 文件头特征 -> 实际类型
+MAGIC_TYPES = (
+    (b'%PDF-', 'application/pdf'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'BM', 'image/bmp'),
+    (b'PK\x03\x04', 'application/zip'),
+    (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'application/x-ole-storage'),
+    (b'Rar!\x1a\x07', 'application/vnd.rar'),
+)
+
+# 扩展名对应的实际类型；pptx/docx 是 ZIP 格式，ppt/doc 是 OLE 复合文档
+EXPECTED_TYPES = {
+    'png': 'image/png',
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'gif': 'image/gif',
+    'bmp': 'image/bmp',
+    'pdf': 'application/pdf',
+    'txt': 'text/plain',
+    'md': 'text/plain',
+    'pptx': 'application/zip',
+    'docx': 'application/zip',
+    'zip': 'application/zip',
+    'ppt': 'application/x-ole-storage',
+    'doc': 'application/x-ole-storage',
+    'rar': 'application/vnd.rar',
+}
+
+IMAGE_TYPES = {'png', 'jpg', 'jpeg', 'gif', 'bmp'}
+
+def sniff_type(head):
+    """根据文件头判断实际类型"""
+    for magic, mimetype in MAGIC_TYPES:
+        if head.startswith(magic):
+            return mimetype
+    if b'\x00' not in head:
+        return 'text/plain'
+    return 'application/octet-stream'
+
+def analyze_note(note):
+    """识别实际类型、读取页数和尺寸并校验文件哈希，返回写入 file_metadata 的信息"""
+    file_type = (note.file_type or '').lower()
+    with storage.local_copy(note_file_key(note)) as path:
+        with open(path, 'rb') as f:
+            detected_type = sniff_type(f.read(SNIFF_BYTES))
+        metadata = {
+            'detected_type': detected_type,
+            'type_matches': detected_type == EXPECTED_TYPES[file_type] if file_type in EXPECTED_TYPES else None,
+            'size': os.path.getsize(path)
+        }
+
+        if file_type in PDF_TYPES and fitz is not None and detected_type == 'application/pdf':
+            with fitz.open(path) as document:
+                metadata['page_count'] = document.page_count
+        elif file_type in IMAGE_TYPES and Image is not None and detected_type.startswith('image/'):
+            with Image.open(path) as image:
+                metadata['width'], metadata['height'] = image.size
+
+        if note.blob is not None:
+            metadata['sha256'] = file_sha256(path)
+            metadata['integrity_ok'] = metadata['sha256'] == note.blob.sha256
+            if not metadata['integrity_ok']:
+                metrics.inc('note_integrity_failures_total')
+                print(f"笔记文件哈希不一致: 笔记 {note.id} {note.file_path}")
+    return metadata
+
+def extract_note_text(note):
+    search_index.extract_note(note.id, note.class_id, note.file_path, note.file_type)
+
+def render_note_thumbnail(note):
+    """生成缩略图；对象存储中的文件下载到本地生成后，上传到缩略图对应的键"""
+    key = note_file_key(note)
+    if storage.is_local:
+        future = thumbnails.schedule(storage.local_path(key), note.file_type, wait=True)
+        if future is not None:
+            future.result(timeout=note_jobs.timeout)
+        return
+
+    with storage.local_copy(key) as path:
+        future = thumbnails.schedule(path, note.file_type, wait=True)
+        if future is not None:
+            storage.save(thumbnails.path_for(key), future.result(timeout=note_jobs.timeout))
+
+# 任务类型 -> (处理函数, 是否需要处理该笔记)；处理函数返回的字典合并到笔记的 file_metadata
+HANDLERS = {
+    'analyze': (analyze_note, lambda note: True),
+    'extract_text': (extract_note_text, lambda note: search_index.available and (note.file_type or '').lower() in TEXT_TYPES | PDF_TYPES),
+    'thumbnail': (render_note_thumbnail, lambda note: thumbnails.supports(note.file_type)),
+}
+
+class NoteJobQueue:
+    """笔记上传后的后台处理队列
+
+    上传请求只在同一事务中写入 note_job 记录，提交后唤醒工作线程，请求耗时与处理内容无关。
+    任务保存在数据库中，进程重启后继续执行；多个进程的工作线程通过条件更新领取任务，
+    同一任务只会被一个线程执行。失败或超过 timeout 秒未完成的任务按指数退避重试，超过次数后标记为失败。
+    笔记的 processing_status 在所有任务结束后变为 ready 或 failed。
+    处理函数在有界线程池中执行，超时后仍在运行的线程也占用名额；名额用完时不再领取任务，
+    超时任务的上一次执行结束前本进程不会再次领取它。
+    """
+
+    def __init__(self):
+        self.app = None
+        self.workers = []
+        self.worker_count = 2
+        self.wake = threading.Event()
+        self.listening = False
+        self.max_attempts = 3
+        self.poll_interval = 5
+        self.timeout = 600
+        self.retry_delay = 30
+        self.handler_threads = 4
+        self.handler_slots = threading.BoundedSemaphore(4)
+        self.executor = None
+        self.lock = threading.Lock()
+        self.abandoned = set()
+
+    def init_app(self, app):
+        self.app = app
+        self.worker_count = max(0, app.config.get('NOTE_JOB_WORKERS', 2))
+        self.max_attempts = max(1, app.config.get('NOTE_JOB_MAX_ATTEMPTS', 3))
+        self.poll_interval = app.config.get('NOTE_JOB_POLL_INTERVAL', 5)
+        self.timeout = app.config.get('NOTE_JOB_TIMEOUT', 600)
+        self.retry_delay = app.config.get('NOTE_JOB_RETRY_DELAY', 30)
+        self.handler_threads = max(1, app.config.get('NOTE_JOB_HANDLER_THREADS', 4))
+        self.handler_slots = threading.BoundedSemaphore(self.handler_threads)
+
+        metrics.describe('note_job_seconds', '笔记后台处理任务的执行耗时（秒）')
+        metrics.describe('note_jobs_completed_total', '执行成功的笔记处理任务数')
+        metrics.describe('note_job_failures_total', '执行失败的笔记处理任务数（含会重试的）')
+        metrics.describe('note_integrity_failures_total', '哈希与记录不一致的笔记文件数')
+
+        if not self.listening:
+            sa_event.listen(Session, 'after_commit', self._after_commit)
+            sa_event.listen(Session, 'after_transaction_end', self._after_transaction_end)
+            self.listening = True
+
+    def start_workers(self):
+        """启动工作线程，只由服务器入口（run.py）调用；管理脚本导入应用时不启动
+
+        NOTE_JOB_WORKERS 为 0 时本进程不执行任务，由其他进程（如 notes_admin.py run-jobs）处理
+        """
+        if self.workers:
+            return
+        for index in range(self.worker_count):
+            worker = threading.Thread(target=self._run, name=f'note-jobs-{index}', daemon=True)
+            self.workers.append(worker)
+            worker.start()
+
+    def enqueue(self, note):
+        """在当前事务中为新笔记登记处理任务，提交后唤醒工作线程，返回登记的任务类型"""
+        kinds = [kind for kind, (_, applies) in HANDLERS.items() if applies(note)]
+        for kind in kinds:
+            db.session.add(NoteJob(note_id=note.id, kind=kind))
+        note.processing_status = 'pending' if kinds else 'ready'
+        db.session.info[PENDING_JOBS_KEY] = True
+        return kinds
+
+    def _after_commit(self, session):
+        if session.info.pop(PENDING_JOBS_KEY, None):
+            self.wake.set()
+
+    def _after_transaction_end(self, session, transaction):
+        if transaction.parent is None:
+            session.info.pop(PENDING_JOBS_KEY, None)
+
+    def _run(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    processed = self.run_pending()
+            except Exception as e:
+                processed = 0
+                self.app.logger.error(f"执行笔记处理任务失败: {str(e)}")
+            if not processed:
+                self.wake.wait(self.poll_interval)
+                self.wake.clear()
+
+    def run_pending(self, limit=None):
+        """领取并执行到期的任务，直到没有任务或达到 limit，返回执行的任务数；需要在应用上下文中调用"""
+        self.reclaim_stale()
+        processed = 0
+        while limit is None or processed < limit:
+            # 先占用处理线程名额再领取，名额被超时未结束的处理函数占满时等待
+            if not self.handler_slots.acquire(timeout=self.poll_interval):
+                break
+            job_id = self._claim()
+            if job_id is None:
+                self.handler_slots.release()
+                break
+            self._execute(job_id)
+            processed += 1
+        return processed
+
+    def _claim(self):
+        """领取一个到期的任务：用条件更新把状态从 pending 改为 running，更新成功的线程获得任务"""
+        table = NoteJob.__table__
+        now = get_china_time()
+        statement = db.select(table.c.id).where(table.c.status == 'pending', table.c.run_after <= now)
+        with self.lock:
+            abandoned = list(self.abandoned)
+        if abandoned:
+            statement = statement.where(table.c.id.notin_(abandoned))
+        candidates = db.session.execute(
+            statement.order_by(table.c.run_after, table.c.id).limit(10)
+        ).scalars().all()
+
+        for job_id in candidates:
+            result = db.session.execute(
+                table.update()
+                .where(table.c.id == job_id, table.c.status == 'pending')
+                .values(status='running', locked_at=now, attempts=table.c.attempts + 1)
+            )
+            db.session.commit()
+            if result.rowcount == 1:
+                return job_id
+        return None
+
+    def _executor(self):
+        with self.lock:
+            if self.executor is None:
+                # 线程数与名额相同，提交的处理函数不会在线程池中排队
+                self.executor = ThreadPoolExecutor(
+                    max_workers=self.handler_threads, thread_name_prefix='note-job-handler'
+                )
+            return self.executor
+
+    def _handle(self, kind, note_id):
+        with self.app.app_context():
+            note = db.session.get(Note, note_id)
+            # 笔记已删除时任务直接完成
+            return HANDLERS[kind][0](note) if note is not None else None
+
+    def _call_handler(self, job_id, kind, note_id):
+        """在处理线程池中执行处理函数，超过 timeout 秒未完成时抛出超时异常；调用前需已占用一个名额
+
+        线程无法被中止，超时后处理函数仍会在后台运行到结束，结果不再写入，
+        结束前一直占用名额，该任务也不会被本进程再次领取
+        """
+        try:
+            future = self._executor().submit(self._handle, kind, note_id)
+        except Exception:
+            self.handler_slots.release()
+            raise
+
+        def done(future):
+            with self.lock:
+                self.abandoned.discard(job_id)
+            self.handler_slots.release()
+
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            with self.lock:
+                self.abandoned.add(job_id)
+            raise
+        finally:
+            future.add_done_callback(done)
+
+    def _execute(self, job_id):
+        try:
+            job = db.session.get(NoteJob, job_id)
+            kind, note_id, attempts = job.kind, job.note_id, job.attempts
+            # 处理函数在其他线程中执行，结束当前事务，不在执行期间占用连接
+            db.session.commit()
+        except Exception:
+            self.handler_slots.release()
+            raise
+
+        started_at = time.monotonic()
+        error = None
+        result = None
+        try:
+            result = self._call_handler(job_id, kind, note_id)
+        except FutureTimeoutError:
+            error = '执行超时'
+        except Exception as e:
+            error = str(e)
+        duration = time.monotonic() - started_at
+        metrics.observe('note_job_seconds', duration, labels={'kind': kind})
+
+        now = get_china_time()
+        values = {'duration': duration, 'locked_at': None}
+        if error is None:
+            values.update(status='done', finished_at=now, last_error=None)
+        else:
+            values['last_error'] = error[:2000]
+            if attempts >= self.max_attempts:
+                values.update(status='failed', finished_at=now)
+            else:
+                values.update(status='pending', run_after=now + timedelta(seconds=self.retry_delay * 2 ** (attempts - 1)))
+
+        # 只在任务仍属于本次执行时写入结果：执行期间可能已被 reclaim_stale 收回并由其他线程重新领取
+        table = NoteJob.__table__
+        updated = db.session.execute(
+            table.update()
+            .where(table.c.id == job_id, table.c.status == 'running', table.c.attempts == attempts)
+            .values(**values)
+        ).rowcount
+        if updated != 1:
+            db.session.rollback()
+            print(f"笔记处理任务已被收回，丢弃结果: {kind} 笔记 {note_id} 第{attempts}次")
+            return
+
+        if error is None:
+            metrics.inc('note_jobs_completed_total', labels={'kind': kind})
+        else:
+            metrics.inc('note_job_failures_total', labels={'kind': kind})
+            print(f"笔记处理任务失败: {kind} 笔记 {note_id} 第{attempts}次 {error}")
+        if result:
+            # 直接更新列，不触发笔记的 updated_at
+            metadata = dict(db.session.execute(
+                db.select(Note.__table__.c.file_metadata).where(Note.__table__.c.id == note_id)
+            ).scalar() or {})
+            metadata.update(result)
+            db.session.execute(
+                Note.__table__.update().where(Note.__table__.c.id == note_id).values(file_metadata=metadata)
+            )
+        db.session.commit()
+
+        # 任务状态提交后再汇总：并发完成同一笔记的最后两个任务时，后提交的一方能看到全部结果
+        self._update_note_status(note_id)
+
+    def _update_note_status(self, note_id):
+        table = NoteJob.__table__
+        statuses = set(db.session.execute(
+            db.select(table.c.status).where(table.c.note_id == note_id).distinct()
+        ).scalars())
+        if statuses & {'pending', 'running'}:
+            return
+        status = 'failed' if 'failed' in statuses else 'ready'
+        db.session.execute(
+            Note.__table__.update().where(Note.__table__.c.id == note_id).values(processing_status=status)
+        )
+        db.session.commit()
+
+    def reclaim_stale(self):
+        """执行超时的任务视为工作进程已退出：未超过次数的重新排队，否则标记为失败"""
+        table = NoteJob.__table__
+        now = get_china_time()
+        deadline = now - timedelta(seconds=self.timeout)
+        stale = db.session.execute(
+            db.select(table.c.id, table.c.note_id, table.c.attempts)
+            .where(table.c.status == 'running', table.c.locked_at < deadline)
+        ).all()
+        if not stale:
+            return 0
+
+        for job_id, note_id, attempts in stale:
+            values = {'locked_at': None, 'last_error': '执行超时'}
+            if attempts >= self.max_attempts:
+                values.update(status='failed', finished_at=now)
+            else:
+                values['status'] = 'pending'
+            db.session.execute(
+                table.update().where(table.c.id == job_id, table.c.status == 'running').values(**values)
+            )
+        db.session.commit()
+
+        for note_id in {row.note_id for row in stale}:
+            self._update_note_status(note_id)
+        return len(stale)
+
+    def requeue_failed(self):
+        """把失败的任务重新排队，返回任务数；需要在应用上下文中调用"""
+        table = NoteJob.__table__
+        failed_notes = db.select(table.c.note_id).where(table.c.status == 'failed')
+        db.session.execute(
+            Note.__table__.update()
+            .where(Note.__table__.c.id.in_(failed_notes))
+            .values(processing_status='pending')
+        )
+        result = db.session.execute(
+            table.update()
+            .where(table.c.status == 'failed')
+            .values(status='pending', attempts=0, run_after=get_china_time(), finished_at=None)
+        )
+        db.session.info[PENDING_JOBS_KEY] = True
+        db.session.commit()
+        return result.rowcount
+
+    def status_counts(self):
+        """按任务类型和状态统计任务数"""
+        table = NoteJob.__table__
+        rows = db.session.execute(
+            db.select(table.c.kind, table.c.status, db.func.count())
+            .group_by(table.c.kind, table.c.status)
+        ).all()
+        return {(kind, status): count for kind, status, count in rows}
+
+# 创建全局实例
+note_jobs = NoteJobQueue()
@@ -0,0 +1,183 @@
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from models.note import Note, NoteUsage
+from models.whiteboard import Whiteboard
+from utils.chunked_upload import UploadError
+
+CLASS_TOTAL = 0  # NoteUsage 中整个班级合计行的 whiteboard_id
+
+class QuotaExceeded(UploadError):
+    """上传后会超出班级或白板的存储配额"""
+
+    def __init__(self, message, usage=None):
+        super().__init__(message, 413, usage=usage)
+
+def format_size(size):
+    return Note(file_size=size).format_file_size()
+
+class NoteQuota:
+    """班级和白板的笔记存储配额
+
+    用量保存在 note_usage 表中，随笔记的创建和删除在同一事务中原子增减，查询用量不扫描笔记表。
+    上传前用声明的大小检查（check），写入笔记记录时再用条件更新扣减（charge），
+    并发上传同时通过检查时，后提交的一方在扣减时失败，用量不会超过配额。
+    配额为 0 表示不限制。
+    """
+
+    def __init__(self):
+        self.class_max_size = 0
+        self.class_max_files = 0
+        self.whiteboard_max_size = 0
+        self.whiteboard_max_files = 0
+
+    def init_app(self, app):
+        self.class_max_size = app.config.get('NOTE_CLASS_QUOTA_BYTES', 0)
+        self.class_max_files = app.config.get('NOTE_CLASS_QUOTA_FILES', 0)
+        self.whiteboard_max_size = app.config.get('NOTE_WHITEBOARD_QUOTA_BYTES', 0)
+        self.whiteboard_max_files = app.config.get('NOTE_WHITEBOARD_QUOTA_FILES', 0)
+
+    def _scopes(self, class_id, whiteboard_id):
+        """(whiteboard_id, 名称, 大小配额, 文件数配额)"""
+        return (
+            (CLASS_TOTAL, '班级', self.class_max_size, self.class_max_files),
+            (whiteboard_id, '白板', self.whiteboard_max_size, self.whiteboard_max_files),
+        )
+
+    def _rows(self, class_id, whiteboard_id):
+        rows = NoteUsage.query.filter(
+            NoteUsage.class_id == class_id,
+            NoteUsage.whiteboard_id.in_((CLASS_TOTAL, whiteboard_id))
+        ).all()
+        return {row.whiteboard_id: (row.file_count, row.total_size) for row in rows}
+
+    def check(self, whiteboard, size, files=1):
+        """上传前检查：再增加 files 个、共 size 字节的文件是否超出配额，超出时抛出 QuotaExceeded"""
+        if not any((self.class_max_size, self.class_max_files, self.whiteboard_max_size, self.whiteboard_max_files)):
+            return
+        rows = self._rows(whiteboard.class_id, whiteboard.id)
+        for scope_id, label, max_size, max_files in self._scopes(whiteboard.class_id, whiteboard.id):
+            file_count, total_size = rows.get(scope_id, (0, 0))
+            if max_size and total_size + size > max_size:
+                raise QuotaExceeded(
+                    f'超出{label}存储配额（已用 {format_size(total_size)}，共 {format_size(max_size)}）',
+                    self.usage(whiteboard.class_id, whiteboard.id)
+                )
+            if max_files and file_count + files > max_files:
+                raise QuotaExceeded(
+                    f'超出{label}文件数配额（已有 {file_count} 个，最多 {max_files} 个）',
+                    self.usage(whiteboard.class_id, whiteboard.id)
+                )
+
+    def _adjust(self, class_id, whiteboard_id, files, size, max_size=0, max_files=0):
+        """原子地增减一行用量；指定配额时只在不超出配额的情况下增加，超出时返回 False"""
+        key = (NoteUsage.class_id == class_id, NoteUsage.whiteboard_id == whiteboard_id)
+        conditions = list(key)
+        if max_size:
+            conditions.append(NoteUsage.total_size + size <= max_size)
+        if max_files:
+            conditions.append(NoteUsage.file_count + files <= max_files)
+
+        statement = db.update(NoteUsage).where(*conditions).values(
+            file_count=NoteUsage.file_count + files,
+            total_size=NoteUsage.total_size + size
+        ).execution_options(synchronize_session=False)
+
+        if db.session.execute(statement).rowcount:
+            return True
+        if db.session.query(NoteUsage.class_id).filter(*key).first() is not None:
+            return False
+        if (max_size and size > max_size) or (max_files and files > max_files):
+            return False
+        try:
+            with db.session.begin_nested():
+                db.session.execute(db.insert(NoteUsage).values(
+                    class_id=class_id, whiteboard_id=whiteboard_id, file_count=files, total_size=size
+                ))
+            return True
+        except IntegrityError:
+            # 并发插入了同一行
+            return bool(db.session.execute(statement).rowcount)
+
+    def charge(self, note):
+        """笔记写入后调用，在当前事务中增加用量；超出配额时抛出 QuotaExceeded，由调用方回滚"""
+        size = note.file_size or 0
+        for scope_id, label, max_size, max_files in self._scopes(note.class_id, note.whiteboard_id):
+            if not self._adjust(note.class_id, scope_id, 1, size, max_size, max_files):
+                raise QuotaExceeded(f'超出{label}存储配额', self.usage(note.class_id, note.whiteboard_id))
+
+    def release(self, note):
+        """删除笔记前调用，在当前事务中减少用量"""
+        size = note.file_size or 0
+        for scope_id, _, _, _ in self._scopes(note.class_id, note.whiteboard_id):
+            self._adjust(note.class_id, scope_id, -1, -size)
+
+    def _describe(self, file_count, total_size, max_size, max_files):
+        return {
+            'file_count': file_count,
+            'total_size': total_size,
+            'total_size_formatted': format_size(total_size),
+            'max_files': max_files or None,
+            'max_size': max_size or None,
+            'max_size_formatted': format_size(max_size) if max_size else None,
+            'remaining_files': max(max_files - file_count, 0) if max_files else None,
+            'remaining_size': max(max_size - total_size, 0) if max_size else None
+        }
+
+    def usage(self, class_id, whiteboard_id=None):
+        """班级（和白板）的用量与配额，只读取 note_usage 中的一两行"""
+        rows = self._rows(class_id, whiteboard_id if whiteboard_id is not None else CLASS_TOTAL)
+        result = {'class': self._describe(*rows.get(CLASS_TOTAL, (0, 0)), self.class_max_size, self.class_max_files)}
+        if whiteboard_id is not None:
+            result['whiteboard'] = self._describe(
+                *rows.get(whiteboard_id, (0, 0)), self.whiteboard_max_size, self.whiteboard_max_files
+            )
+        return result
+
+    def class_usage(self, class_id):
+        """班级用量及各白板的用量"""
+        rows = NoteUsage.query.filter(NoteUsage.class_id == class_id).all()
+        by_whiteboard = [row for row in rows if row.whiteboard_id != CLASS_TOTAL]
+        names = dict(
+            Whiteboard.query.with_entities(Whiteboard.id, Whiteboard.name)
+            .filter(Whiteboard.id.in_([row.whiteboard_id for row in by_whiteboard]))
+        ) if by_whiteboard else {}
+
+        total = next((row for row in rows if row.whiteboard_id == CLASS_TOTAL), None)
+        result = {
+            'class': self._describe(
+                total.file_count if total else 0, total.total_size if total else 0,
+                self.class_max_size, self.class_max_files
+            ),
+            'whiteboards': []
+        }
+        for row in sorted(by_whiteboard, key=lambda row: row.total_size, reverse=True):
+            item = self._describe(row.file_count, row.total_size, self.whiteboard_max_size, self.whiteboard_max_files)
+            item['whiteboard_id'] = row.whiteboard_id
+            item['whiteboard_name'] = names.get(row.whiteboard_id)
+            result['whiteboards'].append(item)
+        return result
+
+    def rebuild(self):
+        """根据笔记表重新计算全部用量，返回写入的行数"""
+        rows = db.session.query(
+            Note.class_id, Note.whiteboard_id,
+            db.func.count(Note.id), db.func.coalesce(db.func.sum(Note.file_size), 0)
+        ).group_by(Note.class_id, Note.whiteboard_id).all()
+
+        totals = {}
+        for class_id, whiteboard_id, count, size in rows:
+            for key in ((class_id, whiteboard_id), (class_id, CLASS_TOTAL)):
+                file_count, total_size = totals.get(key, (0, 0))
+                totals[key] = (file_count + count, total_size + int(size))
+
+        db.session.execute(db.delete(NoteUsage))
+        if totals:
+            db.session.execute(db.insert(NoteUsage), [
+                {'class_id': class_id, 'whiteboard_id': whiteboard_id, 'file_count': count, 'total_size': size}
+                for (class_id, whiteboard_id), (count, size) in totals.items()
+            ])
+        db.session.commit()
+        return len(totals)
+
+# 创建全局实例
+note_quota = NoteQuota()
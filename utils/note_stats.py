@@ -0,0 +1,120 @@
+from datetime import timedelta
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from models.note import NoteStats
+from models.whiteboard import Whiteboard
+from utils.time_utils import get_china_time, format_china_date
+
+def _stats_key(note):
+    created_at = note.created_at or get_china_time()
+    return {
+        'class_id': note.class_id,
+        'whiteboard_id': note.whiteboard_id,
+        'day': created_at.date(),
+        'file_type': (note.file_type or '').lower()
+    }
+
+def _adjust(key, count, size):
+    """原子地增减一行统计，行不存在时插入"""
+    statement = db.update(NoteStats).filter_by(**key).values(
+        note_count=NoteStats.note_count + count,
+        total_size=NoteStats.total_size + size
+    ).execution_options(synchronize_session=False)
+
+    if db.session.execute(statement).rowcount:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(db.insert(NoteStats).values(note_count=count, total_size=size, **key))
+    except IntegrityError:
+        # 并发插入了同一行
+        db.session.execute(statement)
+
+def record_note_added(note):
+    """笔记写入后调用，在当前事务中更新统计"""
+    _adjust(_stats_key(note), 1, note.file_size or 0)
+
+def record_note_removed(note):
+    """删除笔记前调用，在当前事务中更新统计"""
+    _adjust(_stats_key(note), -1, -(note.file_size or 0))
+
+def count_notes(class_id, whiteboard_id=None, file_type=None, start=None, end=None):
+    """从统计表得到符合条件的笔记数，不扫描笔记表；start/end 为整天边界"""
+    query = db.session.query(db.func.coalesce(db.func.sum(NoteStats.note_count), 0)) \
+        .filter(NoteStats.class_id == class_id)
+    if whiteboard_id is not None:
+        query = query.filter(NoteStats.whiteboard_id == whiteboard_id)
+    if file_type:
+        query = query.filter(NoteStats.file_type == file_type.lower())
+    if start is not None:
+        query = query.filter(NoteStats.day >= start.date(), NoteStats.day < end.date())
+    return int(query.scalar())
+
+def class_note_stats(class_id, days=30):
+    """班级笔记统计：总数、总大小，按文件类型、白板和最近 days 天汇总
+
+    只读取汇总表，行数取决于天数、白板数和文件类型数，与笔记数量无关。
+    """
+    base = db.session.query(NoteStats).filter(NoteStats.class_id == class_id, NoteStats.note_count > 0)
+
+    total_notes, total_size = base.with_entities(
+        db.func.coalesce(db.func.sum(NoteStats.note_count), 0),
+        db.func.coalesce(db.func.sum(NoteStats.total_size), 0)
+    ).one()
+
+    def grouped(column):
+        return base.with_entities(
+            column,
+            db.func.sum(NoteStats.note_count),
+            db.func.sum(NoteStats.total_size)
+        ).group_by(column)
+
+    file_types = {
+        file_type: {'count': int(count), 'size': int(size)}
+        for file_type, count, size in grouped(NoteStats.file_type)
+    }
+    by_whiteboard = grouped(NoteStats.whiteboard_id).all()
+    names = dict(
+        Whiteboard.query.with_entities(Whiteboard.id, Whiteboard.name)
+        .filter(Whiteboard.id.in_([row[0] for row in by_whiteboard]))
+    ) if by_whiteboard else {}
+    whiteboards = [
+        {'id': whiteboard_id, 'name': names.get(whiteboard_id), 'count': int(count), 'size': int(size)}
+        for whiteboard_id, count, size in by_whiteboard
+    ]
+
+    start = get_china_time().date() - timedelta(days=days - 1)
+    by_day = [
+        {'date': format_china_date(day), 'count': int(count), 'size': int(size)}
+        for day, count, size in grouped(NoteStats.day).filter(NoteStats.day >= start).order_by(NoteStats.day)
+    ]
+
+    return {
+        'total_notes': int(total_notes),
+        'total_size': int(total_size),
+        'file_types': file_types,
+        'whiteboards': whiteboards,
+        'days': by_day
+    }
+
+def rebuild_note_stats():
+    """根据笔记表重新计算全部统计，返回写入的行数"""
+    from models.note import Note
+
+    totals = {}
+    rows = db.session.query(Note.class_id, Note.whiteboard_id, Note.created_at, Note.file_type, Note.file_size)
+    for class_id, whiteboard_id, created_at, file_type, file_size in rows:
+        if created_at is None:
+            continue
+        key = (class_id, whiteboard_id, created_at.date(), (file_type or '').lower())
+        count, size = totals.get(key, (0, 0))
+        totals[key] = (count + 1, size + (file_size or 0))
+
+    db.session.query(NoteStats).delete()
+    db.session.add_all([
+        NoteStats(class_id=class_id, whiteboard_id=whiteboard_id, day=day, file_type=file_type,
+                  note_count=count, total_size=size)
+        for (class_id, whiteboard_id, day, file_type), (count, size) in totals.items()
+    ])
+    db.session.commit()
+    return len(totals)
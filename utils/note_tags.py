@@ -0,0 +1,76 @@
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from models.note import Note, Tag, NoteTag
+
+MAX_TAG_LENGTH = 50
+
+def parse_tags(raw):
+    """解析标签：支持逗号（含中文逗号）分隔的字符串或列表，去除空白和重复，保持顺序"""
+    if not raw:
+        return []
+    if isinstance(raw, str):
+        raw = raw.replace('，', ',').split(',')
+
+    names = []
+    for name in raw:
+        name = str(name).strip()[:MAX_TAG_LENGTH]
+        if name and name not in names:
+            names.append(name)
+    return names
+
+def _adjust_counts(tag_ids, delta):
+    if not tag_ids:
+        return
+    db.session.execute(
+        db.update(Tag)
+        .where(Tag.id.in_(tag_ids))
+        .values(note_count=Tag.note_count + delta)
+        .execution_options(synchronize_session=False)
+    )
+
+def _get_or_create(class_id, name):
+    tag = Tag.query.filter_by(class_id=class_id, name=name).first()
+    if tag is not None:
+        return tag
+    try:
+        with db.session.begin_nested():
+            tag = Tag(class_id=class_id, name=name, note_count=0)
+            db.session.add(tag)
+        return tag
+    except IntegrityError:
+        # 并发创建了同名标签
+        return Tag.query.filter_by(class_id=class_id, name=name).one()
+
+def set_note_tags(note, raw):
+    """设置笔记的标签，并在当前事务中增量更新各标签的笔记数"""
+    names = parse_tags(raw)
+    current = {tag.name: tag for tag in note.tags}
+
+    removed = [tag for name, tag in current.items() if name not in names]
+    added = [_get_or_create(note.class_id, name) for name in names if name not in current]
+
+    for tag in removed:
+        note.tags.remove(tag)
+    note.tags.extend(added)
+
+    _adjust_counts([tag.id for tag in removed], -1)
+    _adjust_counts([tag.id for tag in added], 1)
+
+def clear_note_tags(note):
+    """删除笔记前调用，减少其标签的笔记数"""
+    set_note_tags(note, [])
+
+def filter_by_tag(query, class_id, name):
+    """按标签精确筛选笔记（使用 note_tag 的 tag_id 索引）"""
+    tag_ids = db.select(Tag.id).where(Tag.class_id == class_id, Tag.name == name.strip())
+    note_ids = db.select(NoteTag.note_id).where(NoteTag.tag_id.in_(tag_ids))
+    return query.filter(Note.id.in_(note_ids))
+
+def tag_cloud(class_id, limit=None):
+    """班级的标签及使用次数，按次数从多到少"""
+    query = db.session.query(Tag.name, Tag.note_count) \
+        .filter(Tag.class_id == class_id, Tag.note_count > 0) \
+        .order_by(Tag.note_count.desc(), Tag.name)
+    if limit:
+        query = query.limit(limit)
+    return [{'name': name, 'count': count} for name, count in query]
@@ -0,0 +1,225 @@
+import threading
+import time
+from collections import OrderedDict
+from utils.metrics import metrics
+from utils.serialization import prepare, packb
+
+class ClientQueue:
+    """单个Socket连接的待发送消息队列
+
+    带 coalesce_key 的消息（如白板状态）只保留最新一条，
+    新消息会替换队列中尚未发送的旧消息。
+    encoding 为 'msgpack' 时消息以 MessagePack 二进制发送。
+    """
+
+    def __init__(self, sid, encoding='json'):
+        self.sid = sid
+        self.encoding = encoding
+        self.pending = OrderedDict()
+        self.counter = 0
+        self.overflow_since = None
+        self.overflowed = False
+
+    def __len__(self):
+        return len(self.pending)
+
+    def push(self, event, data, coalesce_key, depth, max_depth, enqueued_at=None):
+        """加入队列，返回 ('queued'|'coalesced'|'dropped'|'overflow', 被丢弃的事件名)
+
+        队列超过 depth 时丢弃最旧的一条可合并消息（状态类消息，之后还会有新的状态），
+        编号事件从不丢弃：没有可丢弃的消息时暂时超出 depth 并记录开始时间，
+        达到 max_depth 时清空队列并标记为溢出，由发送线程断开连接，客户端重连时按 last_seq 补发。
+        """
+        if self.overflowed:
+            return 'overflow', None
+        if coalesce_key is not None and coalesce_key in self.pending:
+            self.pending[coalesce_key] = (event, data, coalesce_key, enqueued_at)
+            return 'coalesced', None
+
+        dropped = None
+        if len(self.pending) >= depth:
+            victim = next((key for key, item in self.pending.items() if item[2] is not None), None)
+            if victim is not None:
+                dropped = self.pending.pop(victim)[0]
+            elif len(self.pending) >= max_depth:
+                self.pending.clear()
+                self.overflowed = True
+                return 'overflow', None
+            elif self.overflow_since is None:
+                self.overflow_since = time.monotonic()
+
+        self.counter += 1
+        key = coalesce_key if coalesce_key is not None else ('seq', self.counter)
+        self.pending[key] = (event, data, coalesce_key, enqueued_at)
+        return ('dropped', dropped) if dropped else ('queued', None)
+
+    def pop(self):
+        _, item = self.pending.popitem(last=False)
+        return item
+
+class OutboundQueueManager:
+    """Socket.IO 出站消息的有界队列
+
+    每个连接一个有界队列，由后台线程按连接的实际发送进度投递：
+    底层 engine.io 队列积压超过水位时暂停投递，可合并的消息只保留最新一条，
+    队列超过深度时先丢弃旧的状态类消息；持续超过深度 slow_timeout 秒或达到硬上限的连接被断开，
+    客户端重连后补发遗漏的事件。请求线程发送消息时只入队，不会被慢连接阻塞。
+    """
+
+    def __init__(self):
+        self.app = None
+        self.lock = threading.Lock()
+        self.clients = {}
+        self.wakeup = threading.Event()
+        self.worker = None
+        self.depth = 100
+        self.max_depth = 1000
+        self.transport_high_water = 50
+        self.slow_timeout = 30.0
+        self.flush_interval = 0.05
+
+    def init_app(self, app):
+        self.app = app
+        self.depth = app.config.get('SOCKETIO_CLIENT_QUEUE_DEPTH', 100)
+        self.max_depth = max(self.depth, app.config.get('SOCKETIO_CLIENT_QUEUE_MAX_DEPTH', 1000))
+        self.transport_high_water = app.config.get('SOCKETIO_TRANSPORT_HIGH_WATER', 50)
+        self.slow_timeout = app.config.get('SOCKETIO_SLOW_CONSUMER_TIMEOUT', 30.0)
+
+        metrics.describe('socketio_outbound_queue_depth', '各连接待发送消息总数')
+        metrics.describe('socketio_outbound_queue_max_depth', '单个连接的最大待发送消息数')
+        metrics.describe('socketio_outbound_clients', '已注册出站队列的连接数')
+        metrics.describe('socketio_outbound_dropped_total', '因队列超过深度丢弃的状态类消息数')
+        metrics.describe('socketio_outbound_coalesced_total', '被新消息合并替换的消息数')
+        metrics.describe('socketio_outbound_evicted_total', '因消费过慢被断开的连接数')
+        metrics.describe('socketio_outbound_sent_total', '已投递的消息数')
+        metrics.register_gauge('socketio_outbound_queue_depth', lambda: self.queue_depths()[0])
+        metrics.register_gauge('socketio_outbound_queue_max_depth', lambda: self.queue_depths()[1])
+        metrics.register_gauge('socketio_outbound_clients', lambda: len(self.clients))
+
+        if self.worker is None or not self.worker.is_alive():
+            self.worker = threading.Thread(target=self._run, name='socketio-outbound', daemon=True)
+            self.worker.start()
+
+    def register(self, sid, encoding='json'):
+        with self.lock:
+            self.clients.setdefault(sid, ClientQueue(sid, encoding))
+
+    def unregister(self, sid):
+        with self.lock:
+            self.clients.pop(sid, None)
+
+    def queue_depths(self):
+        with self.lock:
+            depths = [len(client) for client in self.clients.values()]
+        return sum(depths), max(depths) if depths else 0
+
+    def emit(self, event, data, room=None, to=None, coalesce_key=None, enqueued_at=None):
+        """将消息放入房间内（或指定连接）每个客户端的队列
+
+        enqueued_at 为事件分发器登记事件的时间（time.monotonic()），发送给客户端后记录整体延迟
+        """
+        from extensions import socketio
+
+        target = to or room
+        if target is None:
+            raise ValueError('需要指定 room 或 to')
+
+        try:
+            sids = [sid for sid, _ in socketio.server.manager.get_participants('/', target)]
+        except (KeyError, AttributeError):
+            sids = []
+
+        # 同一条消息按编码方式只序列化一次
+        encoded = {}
+        def encode(encoding):
+            if encoding not in encoded:
+                encoded[encoding] = packb(data) if encoding == 'msgpack' else prepare(data)
+            return encoded[encoding]
+
+        direct = []
+        with self.lock:
+            for sid in sids:
+                client = self.clients.get(sid)
+                if client is None:
+                    direct.append(sid)
+                    continue
+                result, dropped = client.push(
+                    event, encode(client.encoding), coalesce_key, self.depth, self.max_depth, enqueued_at
+                )
+                if result == 'coalesced':
+                    metrics.inc('socketio_outbound_coalesced_total', labels={'event': event})
+                elif result == 'dropped':
+                    metrics.inc('socketio_outbound_dropped_total', labels={'event': dropped})
+
+        # 未注册队列的连接（如认证过程中）直接发送
+        for sid in direct:
+            socketio.emit(event, encode('json'), to=sid)
+            self._observe_delivery(event, enqueued_at)
+
+        if sids:
+            self.wakeup.set()
+
+    def _transport_backlog(self, sid):
+        """engine.io 层尚未写出的数据包数量"""
+        from extensions import socketio
+        try:
+            eio_sid = socketio.server.manager.eio_sid_from_sid(sid, '/')
+            eio_socket = socketio.server.eio.sockets.get(eio_sid)
+            return eio_socket.queue.qsize() if eio_socket else 0
+        except Exception:
+            return 0
+
+    def _run(self):
+        from extensions import socketio
+
+        while True:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+
+            with self.lock:
+                busy = [client for client in self.clients.values() if len(client) or client.overflowed]
+
+            now = time.monotonic()
+            for client in busy:
+                if client.overflowed:
+                    self._evict(client, '发送队列达到上限')
+                    continue
+
+                backlog = self._transport_backlog(client.sid)
+                batch = []
+                with self.lock:
+                    while len(client) and backlog + len(batch) < self.transport_high_water:
+                        batch.append(client.pop())
+                    if len(client) < self.depth:
+                        client.overflow_since = None
+                    slow = client.overflow_since is not None and now - client.overflow_since > self.slow_timeout
+
+                for event, data, _, enqueued_at in batch:
+                    try:
+                        socketio.emit(event, data, to=client.sid)
+                        metrics.inc('socketio_outbound_sent_total')
+                        self._observe_delivery(event, enqueued_at)
+                    except Exception as e:
+                        self.app.logger.error(f"发送Socket消息失败: {str(e)}")
+
+                if slow:
+                    self._evict(client, f'发送队列超过{self.depth}条持续{self.slow_timeout}秒')
+
+    def _observe_delivery(self, event, enqueued_at):
+        if enqueued_at is not None:
+            metrics.observe('socketio_emit_delivery_seconds', time.monotonic() - enqueued_at, labels={'event': event})
+
+    def _evict(self, client, reason):
+        """断开消费过慢的连接"""
+        from extensions import socketio
+
+        self.app.logger.warning(f"连接 {client.sid} 消费过慢（{reason}），已断开")
+        metrics.inc('socketio_outbound_evicted_total')
+        self.unregister(client.sid)
+        try:
+            socketio.server.disconnect(client.sid)
+        except Exception:
+            pass
+
+# 创建全局实例
+outbound_queue = OutboundQueueManager()
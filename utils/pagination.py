@@ -0,0 +1,98 @@
+import base64
+import json
+import threading
+import time
+from datetime import datetime
+from extensions import db
+
+class CursorError(ValueError):
+    """分页游标无效"""
+
+def encode_cursor(sort_name, value, row_id):
+    """把上一页最后一行的排序值和 ID 编码为不透明的游标"""
+    if isinstance(value, datetime):
+        value = {'dt': value.isoformat()}
+    payload = json.dumps([sort_name, value, row_id], ensure_ascii=False, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(token, sort_name):
+    """解析游标，返回 (排序值, ID)；游标与当前排序方式不一致时视为无效"""
+    try:
+        payload = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        name, value, row_id = json.loads(payload.decode('utf-8'))
+        if isinstance(value, dict):
+            value = datetime.fromisoformat(value['dt'])
+    except (ValueError, TypeError, KeyError):
+        raise CursorError('分页游标无效')
+    if name != sort_name or not isinstance(row_id, int):
+        raise CursorError('分页游标无效')
+    return value, row_id
+
+def keyset_page(query, id_column, sort_name, sort_expression, descending, cursor, per_page):
+    """按 (排序列, ID) 做键集分页，返回 (本页记录, 下一页游标)
+
+    不执行 COUNT，也不使用 OFFSET：从游标位置开始按索引顺序读取 per_page + 1 行，
+    多读的一行只用于判断是否还有下一页。每一页的耗时与翻到第几页无关。
+    """
+    if cursor:
+        value, row_id = decode_cursor(cursor, sort_name)
+        if descending:
+            query = query.filter(db.or_(
+                sort_expression < value,
+                db.and_(sort_expression == value, id_column < row_id)
+            ))
+        else:
+            query = query.filter(db.or_(
+                sort_expression > value,
+                db.and_(sort_expression == value, id_column > row_id)
+            ))
+
+    if descending:
+        query = query.order_by(sort_expression.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_expression.asc(), id_column.asc())
+
+    # 排序值随记录一起查询，即使 load_only 没有加载该列也不会额外查询
+    rows = query.add_columns(sort_expression).limit(per_page + 1).all()
+    items = [row[0] for row in rows[:per_page]]
+
+    next_cursor = None
+    if len(rows) > per_page:
+        last_item, last_value = rows[per_page - 1]
+        next_cursor = encode_cursor(sort_name, last_value, last_item.id)
+    return items, next_cursor
+
+class CountCache:
+    """筛选条件对应总数的短期缓存
+
+    键集分页时客户端可以选择返回总数，同一筛选条件在 ttl 秒内只 COUNT 一次。
+    """
+
+    def __init__(self, ttl=60, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = {}
+
+    def init_app(self, app):
+        self.ttl = app.config.get('NOTE_COUNT_CACHE_TTL', 60)
+
+    def get(self, key, compute):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] > now:
+                return entry[0]
+
+        value = compute()
+        with self.lock:
+            if len(self.entries) >= self.max_entries:
+                # 先清理过期的，仍然太多时清空
+                self.entries = {k: v for k, v in self.entries.items() if v[1] > now}
+                if len(self.entries) >= self.max_entries:
+                    self.entries.clear()
+            self.entries[key] = (value, now + self.ttl)
+        return value
+
+# 创建全局实例
+count_cache = CountCache()
@@ -0,0 +1,285 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from extensions import db
+from models.note import Note, NoteBlob
+from models.system_setting import SystemSetting
+from utils.storage import storage, UPLOADS_ROOT
+from utils.blob_store import class_upload_dir, delete_note, remove_files
+from utils.thumbnails import is_thumbnail
+from utils.time_utils import get_china_time
+from utils.metrics import metrics
+
+CHECKPOINT_KEY = 'uploads_reconcile_checkpoint'
+# 报告中最多列出的孤立文件和悬空记录数，计数不受限制
+MAX_REPORTED = 1000
+
+class UploadsReconciler:
+    """核对 uploads 目录与笔记记录
+
+    以班级目录为单位，线程池并行遍历 uploads/<class_id>/，同时分批读取该班级的
+    NoteBlob 和未迁移笔记的 file_path，找出两边不一致的部分：
+    - 孤立文件：磁盘上有、数据库中没有记录引用的文件（及其缩略图）
+    - 悬空记录：数据库中有、磁盘上找不到文件的去重记录或笔记
+    修改时间或创建时间在 min_age 秒以内的文件和记录视为正在上传，不参与核对。
+    按班级ID顺序处理，每完成一个班级记录进度，下次从中断处继续，一轮结束后从头开始。
+    """
+
+    def __init__(self):
+        self.app = None
+        self.workers = 4
+        self.batch_size = 1000
+        self.min_age = 3600
+        self.run_lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.workers = max(1, app.config.get('RECONCILE_WORKERS', 4))
+        self.batch_size = max(1, app.config.get('RECONCILE_BATCH_SIZE', 1000))
+        self.min_age = app.config.get('RECONCILE_MIN_AGE', 3600)
+
+        metrics.describe('uploads_orphan_files_total', '核对时发现的孤立文件数')
+        metrics.describe('uploads_dangling_rows_total', '核对时发现的悬空记录数')
+        metrics.describe('uploads_reconcile_class_seconds', '核对一个班级目录的耗时（秒）')
+
+    def run(self, fix=False, max_classes=None, restart=False):
+        """从上次的进度继续核对，最多处理 max_classes 个班级，返回汇总结果
+
+        fix 为 True 时删除孤立文件和悬空记录，否则只报告。需要在应用上下文中调用；
+        使用对象存储或已有核对在进行时返回 None。
+        """
+        if not storage.is_local:
+            return None
+        if not self.run_lock.acquire(blocking=False):
+            return None
+
+        try:
+            checkpoint = None if restart else self._load_checkpoint()
+            pending = [
+                class_id for class_id in self._class_ids()
+                if checkpoint is None or class_id > checkpoint
+            ]
+            batch = pending[:max_classes] if max_classes else pending
+
+            summary = {
+                'classes': 0,
+                'files': 0,
+                'orphan_file_count': 0,
+                'orphan_bytes': 0,
+                'dangling_row_count': 0,
+                'removed_files': 0,
+                'removed_rows': 0,
+                'orphan_files': [],
+                'dangling_rows': [],
+                'errors': [],
+                'complete': len(batch) == len(pending)
+            }
+
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='uploads-reconcile') as executor:
+                # map 按提交顺序返回结果，进度只会推进到连续完成的最后一个班级
+                for class_id, result in zip(batch, executor.map(lambda cid: self._reconcile_in_context(cid, fix), batch)):
+                    self._merge(summary, result)
+                    self._save_checkpoint(class_id)
+
+            if summary['complete']:
+                self._save_checkpoint(None)
+            return summary
+        finally:
+            self.run_lock.release()
+
+    def _class_ids(self):
+        """磁盘上的班级目录和数据库中有文件记录的班级"""
+        class_ids = set()
+        if os.path.isdir(UPLOADS_ROOT):
+            with os.scandir(UPLOADS_ROOT) as entries:
+                class_ids.update(int(entry.name) for entry in entries if entry.name.isdigit() and entry.is_dir())
+        class_ids.update(db.session.execute(db.select(NoteBlob.class_id).distinct()).scalars())
+        class_ids.update(db.session.execute(
+            db.select(Note.class_id).where(Note.blob_id.is_(None)).distinct()
+        ).scalars())
+        return sorted(class_ids)
+
+    def _reconcile_in_context(self, class_id, fix):
+        with self.app.app_context():
+            try:
+                return self.reconcile_class(class_id, fix)
+            except Exception as e:
+                db.session.rollback()
+                return {'class_id': class_id, 'error': str(e)}
+
+    def reconcile_class(self, class_id, fix=False):
+        """核对一个班级目录，返回该班级的结果"""
+        started_at = time.monotonic()
+        class_dir = class_upload_dir(class_id)
+        files, thumbnails, recent = self._scan_directory(class_dir)
+
+        # 分批读取记录，与磁盘上的文件逐个比对
+        referenced = set()
+        dangling = []
+        created_before = get_china_time() - timedelta(seconds=self.min_age)
+        for kind, row_id, file_path, created_at in self._stream_rows(class_id):
+            if file_path in files:
+                referenced.add(file_path)
+            elif file_path not in recent and (created_at is None or created_at < created_before):
+                dangling.append((kind, row_id, file_path))
+
+        orphans = [path for path in files if path not in referenced]
+        kept_stems = {os.path.splitext(path)[0] for path in referenced | recent}
+        orphans.extend(
+            path for path in thumbnails
+            if path.split('.thumb.', 1)[0] not in kept_stems
+        )
+
+        result = {
+            'class_id': class_id,
+            'files': len(files),
+            'orphan_files': orphans,
+            'orphan_bytes': sum(files.get(path) or thumbnails.get(path, 0) for path in orphans),
+            'dangling_rows': dangling,
+            'removed_files': 0,
+            'removed_rows': 0
+        }
+        metrics.inc('uploads_orphan_files_total', len(orphans))
+        metrics.inc('uploads_dangling_rows_total', len(dangling))
+
+        if fix:
+            result['removed_files'] = self._remove_orphans(class_id, class_dir, orphans)
+            # 整个班级目录不存在时可能是存储未挂载，只报告不删除记录
+            if os.path.isdir(class_dir):
+                result['removed_rows'] = self._remove_dangling(class_id, dangling)
+
+        metrics.observe('uploads_reconcile_class_seconds', time.monotonic() - started_at)
+        return result
+
+    def _scan_directory(self, class_dir):
+        """遍历班级目录，返回 (文件 -> 大小, 缩略图 -> 大小, 近期修改的文件)，路径相对于班级目录"""
+        files = {}
+        thumbnails = {}
+        recent = set()
+        modified_before = time.time() - self.min_age
+
+        for root, _, names in os.walk(class_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                relative_path = os.path.relpath(path, class_dir).replace(os.sep, '/')
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if stat.st_mtime > modified_before:
+                    recent.add(relative_path)
+                elif is_thumbnail(name):
+                    thumbnails[relative_path] = stat.st_size
+                else:
+                    files[relative_path] = stat.st_size
+        return files, thumbnails, recent
+
+    def _stream_rows(self, class_id):
+        """分批读取班级的文件记录：(类型, ID, 相对路径, 创建时间)"""
+        statements = (
+            ('blob', db.select(NoteBlob.id, NoteBlob.file_path, NoteBlob.created_at)
+                .where(NoteBlob.class_id == class_id)),
+            ('note', db.select(Note.id, Note.file_path, Note.created_at)
+                .where(Note.class_id == class_id, Note.blob_id.is_(None))),
+        )
+        for kind, statement in statements:
+            rows = db.session.execute(statement.execution_options(yield_per=self.batch_size))
+            for row_id, file_path, created_at in rows:
+                yield kind, row_id, file_path, created_at
+
+    def _remove_orphans(self, class_id, class_dir, orphans):
+        # 结束读取记录时的事务，之后的确认查询能看到扫描期间提交的记录
+        db.session.rollback()
+        removed = 0
+        for relative_path in orphans:
+            # 删除前再确认一次，扫描期间可能已提交了引用该文件的记录
+            if not is_thumbnail(relative_path) and self._is_referenced(class_id, relative_path):
+                continue
+            try:
+                os.remove(os.path.join(class_dir, *relative_path.split('/')))
+                removed += 1
+            except FileNotFoundError:
+                continue
+        return removed
+
+    def _is_referenced(self, class_id, file_path):
+        blob = db.session.execute(
+            db.select(NoteBlob.id).where(NoteBlob.class_id == class_id, NoteBlob.file_path == file_path)
+        ).first()
+        if blob is not None:
+            return True
+        return db.session.execute(
+            db.select(Note.id).where(Note.class_id == class_id, Note.file_path == file_path)
+        ).first() is not None
+
+    def _remove_dangling(self, class_id, dangling):
+        """删除悬空记录：去重记录连同引用它的笔记一起删除，每条记录单独提交"""
+        removed = 0
+        for kind, row_id, file_path in dangling:
+            # 删除前再确认一次，期间可能已被删除或补回了文件
+            if os.path.isfile(os.path.join(class_upload_dir(class_id), *file_path.split('/'))):
+                continue
+            try:
+                keys = []
+                if kind == 'blob':
+                    blob = db.session.get(NoteBlob, row_id)
+                    if blob is None:
+                        continue
+                    notes = Note.query.filter_by(blob_id=blob.id).all()
+                    for note in notes:
+                        keys.extend(delete_note(note))
+                    # 引用计数与笔记数不一致时，最后一个笔记删除后记录仍在
+                    if blob not in db.session.deleted:
+                        db.session.delete(blob)
+                else:
+                    note = db.session.get(Note, row_id)
+                    if note is None:
+                        continue
+                    keys.extend(delete_note(note))
+                db.session.commit()
+                remove_files(keys)
+                removed += 1
+                print(f"已删除悬空记录: {kind} {row_id} {class_id}/{file_path}")
+            except Exception as e:
+                db.session.rollback()
+                print(f"删除悬空记录失败: {kind} {row_id} {str(e)}")
+        return removed
+
+    def _merge(self, summary, result):
+        summary['classes'] += 1
+        if 'error' in result:
+            summary['errors'].append((result['class_id'], result['error']))
+            return
+
+        class_id = result['class_id']
+        summary['files'] += result['files']
+        summary['orphan_file_count'] += len(result['orphan_files'])
+        summary['orphan_bytes'] += result['orphan_bytes']
+        summary['dangling_row_count'] += len(result['dangling_rows'])
+        summary['removed_files'] += result['removed_files']
+        summary['removed_rows'] += result['removed_rows']
+
+        room = MAX_REPORTED - len(summary['orphan_files'])
+        summary['orphan_files'].extend(f"{class_id}/{path}" for path in result['orphan_files'][:max(room, 0)])
+        room = MAX_REPORTED - len(summary['dangling_rows'])
+        summary['dangling_rows'].extend(
+            (kind, row_id, f"{class_id}/{path}") for kind, row_id, path in result['dangling_rows'][:max(room, 0)]
+        )
+
+    def _load_checkpoint(self):
+        setting = SystemSetting.query.filter_by(key=CHECKPOINT_KEY).first()
+        return int(setting.value) if setting and setting.value else None
+
+    def _save_checkpoint(self, class_id):
+        """记录最后核对完成的班级ID，None 表示一轮已结束"""
+        setting = SystemSetting.query.filter_by(key=CHECKPOINT_KEY).first()
+        if setting is None:
+            setting = SystemSetting(key=CHECKPOINT_KEY, description='上传目录核对进度（最后核对完成的班级ID）')
+            db.session.add(setting)
+        setting.value = str(class_id) if class_id is not None else None
+        db.session.commit()
+
+# 创建全局实例
+reconciler = UploadsReconciler()
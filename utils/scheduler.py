@@ -19,6 +19,22 @@ class SchedulerManager:
             trigger="interval",
             minutes=1
         )
+        self.scheduler.add_job(
+            func=self.cleanup_stale_uploads,
+            trigger="interval",
+            hours=1
+        )
+        self.scheduler.add_job(
+            func=self.flush_download_counts,
+            trigger="interval",
+            seconds=self.app.config.get('DOWNLOAD_COUNT_FLUSH_INTERVAL', 10)
+        )
+        if self.app.config.get('RECONCILE_INTERVAL_HOURS', 24) > 0:
+            self.scheduler.add_job(
+                func=self.reconcile_uploads,
+                trigger="interval",
+                hours=self.app.config.get('RECONCILE_INTERVAL_HOURS', 24)
+            )
     
     def cleanup_offline_whiteboards(self):
         """清理长时间没有心跳的白板状态"""
@@ -26,7 +42,8 @@ class SchedulerManager:
             return
             
         with self.app.app_context():
-            from extensions import db, socketio
+            from extensions import db
+            from utils.emit_dispatcher import emit_dispatcher
             from models.whiteboard import Whiteboard, WhiteboardStatusHistory
             
             try:
@@ -38,29 +55,76 @@ class SchedulerManager:
                 
                 for whiteboard in offline_whiteboards:
                     whiteboard.is_online = False
-                    db.session.commit()
                     
                     status_history = WhiteboardStatusHistory(
                         whiteboard_id=whiteboard.id,
                         is_online=False
                     )
                     db.session.add(status_history)
-                    db.session.commit()
                     
-                    socketio.emit('whiteboard_status_update', {
+                    emit_dispatcher.emit('whiteboard_status_update', {
                         'whiteboard_id': whiteboard.id,
                         'is_online': False,
                         'last_heartbeat': format_china_time(whiteboard.last_heartbeat)
-                    }, room=f"teacher_{whiteboard.class_obj.teacher_id}")
+                    }, room=f"class_teachers_{whiteboard.class_id}", coalesce_key=f"whiteboard_status:{whiteboard.id}")
                     
                 if offline_whiteboards:
+                    # 所有状态变更在同一个事务中提交，提交后再推送给教师端
+                    db.session.commit()
                     self.app.logger.info(f"清理了 {len(offline_whiteboards)} 个离线白板状态")
             except Exception as e:
+                db.session.rollback()
                 self.app.logger.error(f"清理离线白板状态时出错: {str(e)}")
 
+    def cleanup_stale_uploads(self):
+        """清理过期未完成的分片上传"""
+        if not self.app:
+            return
+        
+        from utils.chunked_upload import chunked_uploads
+        try:
+            removed = chunked_uploads.cleanup_expired()
+            if removed:
+                self.app.logger.info(f"清理了 {removed} 个过期的分片上传")
+        except Exception as e:
+            self.app.logger.error(f"清理分片上传时出错: {str(e)}")
+
+    def flush_download_counts(self):
+        """把缓冲的笔记下载次数写回数据库"""
+        if not self.app:
+            return
+
+        from utils.download_counter import download_counter
+        with self.app.app_context():
+            try:
+                download_counter.flush()
+            except Exception as e:
+                self.app.logger.error(f"写回下载计数时出错: {str(e)}")
+
+    def reconcile_uploads(self):
+        """核对上传目录与笔记记录，每次从上次的进度继续处理一批班级"""
+        if not self.app:
+            return
+
+        from utils.reconciler import reconciler
+        with self.app.app_context():
+            try:
+                summary = reconciler.run(
+                    fix=self.app.config.get('RECONCILE_FIX', False),
+                    max_classes=self.app.config.get('RECONCILE_CLASSES_PER_RUN', 50)
+                )
+                if summary and (summary['orphan_file_count'] or summary['dangling_row_count']):
+                    self.app.logger.warning(
+                        f"上传目录核对: {summary['classes']} 个班级，孤立文件 {summary['orphan_file_count']} 个，"
+                        f"悬空记录 {summary['dangling_row_count']} 条，已删除文件 {summary['removed_files']} 个、"
+                        f"记录 {summary['removed_rows']} 条"
+                    )
+            except Exception as e:
+                self.app.logger.error(f"核对上传目录时出错: {str(e)}")
+
 # 创建全局实例
 scheduler_manager = SchedulerManager()
 
 # 兼容旧代码
 def init_scheduler(app):
-    scheduler_manager.init_app(app)
\ No newline at end of file
+    scheduler_manager.init_app(app)
@@ -0,0 +1,381 @@
+import re
+import time
+from sqlalchemy import bindparam, event as sa_event, inspect as sa_inspect, text
+from sqlalchemy.orm import Session
+from extensions import db
+from models.note import Note
+from models.task import Task
+from models.announcement import Announcement
+from models.assignment import Assignment
+from utils.storage import storage, note_key
+from utils.metrics import metrics
+
+try:
+    import fitz  # PyMuPDF，用于提取 PDF 文本
+except ImportError:
+    fitz = None
+
+# 中文没有空格分词，按相邻两个字（二元组）建立索引；其他文字按单词
+CJK_CHARS = '\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+TOKEN_RE = re.compile(f'([{CJK_CHARS}]+)|([^\\W_{CJK_CHARS}]+)')
+
+TEXT_TYPES = {'txt', 'md'}
+PDF_TYPES = {'pdf'}
+
+# 索引的实体：类型 -> (模型, 类型编号, 影响索引内容的字段, 标题, 正文各部分)
+ENTITIES = {
+    'note': (
+        Note, 1, ('title', 'description', 'tags', 'original_filename', 'whiteboard_id'),
+        lambda note: note.title or note.original_filename,
+        lambda note: (note.description, ' '.join(note.get_tags_list()), note.original_filename)
+    ),
+    'task': (
+        Task, 2, ('title', 'description', 'subject', 'whiteboard_id'),
+        lambda task: task.title,
+        lambda task: (task.description, task.subject)
+    ),
+    'announcement': (
+        Announcement, 3, ('title', 'content', 'whiteboard_id'),
+        lambda announcement: announcement.title,
+        lambda announcement: (announcement.content,)
+    ),
+    'assignment': (
+        Assignment, 4, ('title', 'description', 'subject', 'whiteboard_id'),
+        lambda assignment: assignment.title,
+        lambda assignment: (assignment.description, assignment.subject)
+    ),
+}
+ENTITY_BY_MODEL = {spec[0]: entity_type for entity_type, spec in ENTITIES.items()}
+
+def doc_id(entity_type, entity_id):
+    """索引行的主键，由实体类型和ID确定，更新和删除时按主键定位"""
+    return entity_id * 8 + ENTITIES[entity_type][1]
+
+def tokenize(value):
+    """索引用的分词：中文连续文字拆成二元组，并补上最后一个字，使每个字都能作为前缀匹配"""
+    tokens = []
+    for cjk, word in TOKEN_RE.findall(value or ''):
+        if word:
+            tokens.append(word.lower())
+        elif len(cjk) == 1:
+            tokens.append(cjk)
+        else:
+            tokens.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+            tokens.append(cjk[-1])
+    return tokens
+
+def index_text(*parts):
+    return ' '.join(tokenize(' '.join(part for part in parts if part)))
+
+def query_terms(query):
+    """把搜索词拆成检索项：(是否短语, 词元列表)，所有检索项都需要匹配"""
+    terms = []
+    for cjk, word in TOKEN_RE.findall(query or ''):
+        if word:
+            terms.append((False, [word.lower()]))
+        elif len(cjk) == 1:
+            terms.append((False, [cjk]))
+        else:
+            terms.append((True, [cjk[i:i + 2] for i in range(len(cjk) - 1)]))
+    return terms
+
+def extract_text(path, file_type, limit):
+    """提取笔记文件中的文本，最多 limit 个字符"""
+    if file_type in TEXT_TYPES:
+        with open(path, 'rb') as f:
+            data = f.read(limit * 4)
+        try:
+            return data.decode('utf-8')[:limit]
+        except UnicodeDecodeError:
+            return data.decode('gb18030', errors='ignore')[:limit]
+
+    if file_type in PDF_TYPES and fitz is not None:
+        parts = []
+        length = 0
+        with fitz.open(path) as document:
+            for page in document:
+                page_text = page.get_text()
+                parts.append(page_text)
+                length += len(page_text)
+                if length >= limit:
+                    break
+        return ''.join(parts)[:limit]
+
+    return None
+
+class SqliteBackend:
+    """SQLite FTS5 虚拟表，rowid 为 doc_id"""
+
+    key = 'rowid'
+    schema = (
+        "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+        "entity_type UNINDEXED, entity_id UNINDEXED, class_id UNINDEXED, whiteboard_id UNINDEXED, "
+        "title, body, content, tokenize='unicode61')",
+    )
+
+    @staticmethod
+    def match_query(terms):
+        parts = []
+        for phrase, tokens in terms:
+            if phrase:
+                parts.append('"' + ' '.join(tokens) + '"')
+            else:
+                parts.append(f'"{tokens[0]}"*')
+        return ' '.join(parts)
+
+    match_clause = 'search_index MATCH :query'
+    # bm25 越小越相关；标题权重最高，其次是描述等字段，文件内容最低
+    rank_column = 'bm25(search_index, 0, 0, 0, 0, 10.0, 4.0, 1.0)'
+    rank_order = 'ASC'
+
+    @staticmethod
+    def score(rank):
+        return round(-rank, 6)
+
+class PostgresBackend:
+    """PostgreSQL tsvector 列加 GIN 索引，id 为 doc_id"""
+
+    key = 'id'
+    schema = (
+        "CREATE TABLE IF NOT EXISTS search_index ("
+        "id BIGINT PRIMARY KEY, entity_type VARCHAR(20) NOT NULL, entity_id INTEGER NOT NULL, "
+        "class_id INTEGER, whiteboard_id INTEGER, title TEXT, body TEXT, content TEXT, "
+        "document tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(body, '')), 'B') || "
+        "setweight(to_tsvector('simple', coalesce(content, '')), 'C')) STORED)",
+        "CREATE INDEX IF NOT EXISTS ix_search_index_document ON search_index USING GIN (document)",
+        "CREATE INDEX IF NOT EXISTS ix_search_index_class ON search_index (class_id, entity_type)",
+    )
+
+    @staticmethod
+    def match_query(terms):
+        parts = []
+        for phrase, tokens in terms:
+            if phrase:
+                parts.append('(' + ' <-> '.join(tokens) + ')')
+            else:
+                parts.append(f'{tokens[0]}:*')
+        return ' & '.join(parts)
+
+    match_clause = "document @@ to_tsquery('simple', :query)"
+    rank_column = "ts_rank(document, to_tsquery('simple', :query))"
+    rank_order = 'DESC'
+
+    @staticmethod
+    def score(rank):
+        return round(rank, 6)
+
+BACKENDS = {'sqlite': SqliteBackend, 'postgresql': PostgresBackend}
+
+class SearchIndex:
+    """笔记、任务、公告和作业的全文索引
+
+    根据数据库选择 SQLite FTS5 或 PostgreSQL tsvector。模型在 flush 时同步更新索引，
+    与业务数据在同一事务中提交或回滚；笔记文件中的文本由上传后处理任务（utils.note_jobs）提取。
+    其他数据库不建立索引，调用方退回 LIKE 查询。
+    """
+
+    def __init__(self):
+        self.app = None
+        self.backend = None
+        self.max_content_chars = 200000
+        self.listening = False
+
+    def init_app(self, app):
+        self.app = app
+        self.max_content_chars = app.config.get('SEARCH_MAX_CONTENT_CHARS', 200000)
+
+        metrics.describe('search_queries_total', '全文搜索次数')
+        metrics.describe('search_query_seconds', '全文搜索耗时（秒）')
+        metrics.describe('search_extract_failures_total', '提取笔记文件文本失败的次数')
+
+        dialect = app.config['SQLALCHEMY_DATABASE_URI'].split(':', 1)[0].split('+', 1)[0]
+        backend = BACKENDS.get('postgresql' if dialect == 'postgres' else dialect)
+        if backend is None or not app.config.get('SEARCH_INDEX_ENABLED', True):
+            return
+
+        try:
+            with app.app_context():
+                with db.engine.begin() as connection:
+                    for statement in backend.schema:
+                        connection.execute(text(statement))
+        except Exception as e:
+            print(f"全文索引不可用，搜索将使用 LIKE 查询: {str(e)}")
+            return
+
+        self.backend = backend
+        if not self.listening:
+            sa_event.listen(Session, 'after_flush', self._after_flush)
+            self.listening = True
+
+    @property
+    def available(self):
+        return self.backend is not None
+
+    # ---- 写入 ----
+
+    def _upsert(self, connection, entity_type, obj):
+        _, _, _, title, body = ENTITIES[entity_type]
+        params = {
+            'doc_id': doc_id(entity_type, obj.id),
+            'entity_type': entity_type,
+            'entity_id': obj.id,
+            'whiteboard_id': obj.whiteboard_id,
+            'title': index_text(title(obj)),
+            'body': index_text(*body(obj))
+        }
+        key = self.backend.key
+        class_id = '(SELECT class_id FROM whiteboard WHERE id = :whiteboard_id)'
+        result = connection.execute(text(
+            f"UPDATE search_index SET class_id = {class_id}, whiteboard_id = :whiteboard_id, "
+            f"title = :title, body = :body WHERE {key} = :doc_id"
+        ), params)
+        if result.rowcount == 0:
+            connection.execute(text(
+                f"INSERT INTO search_index ({key}, entity_type, entity_id, class_id, whiteboard_id, title, body, content) "
+                f"VALUES (:doc_id, :entity_type, :entity_id, {class_id}, :whiteboard_id, :title, :body, '')"
+            ), params)
+
+    def _delete(self, connection, entity_type, entity_id):
+        connection.execute(
+            text(f"DELETE FROM search_index WHERE {self.backend.key} = :doc_id"),
+            {'doc_id': doc_id(entity_type, entity_id)}
+        )
+
+    def _after_flush(self, session, flush_context):
+        if not self.available:
+            return
+
+        changed = []
+        for obj in session.new:
+            entity_type = ENTITY_BY_MODEL.get(type(obj))
+            if entity_type:
+                changed.append((entity_type, obj))
+        for obj in session.dirty:
+            entity_type = ENTITY_BY_MODEL.get(type(obj))
+            if entity_type is None:
+                continue
+            state = sa_inspect(obj)
+            if any(state.attrs[name].history.has_changes() for name in ENTITIES[entity_type][2]):
+                changed.append((entity_type, obj))
+        deleted = [
+            (ENTITY_BY_MODEL[type(obj)], obj.id)
+            for obj in session.deleted if type(obj) in ENTITY_BY_MODEL
+        ]
+        if not changed and not deleted:
+            return
+
+        connection = session.connection()
+        for entity_type, obj in changed:
+            self._upsert(connection, entity_type, obj)
+        for entity_type, entity_id in deleted:
+            self._delete(connection, entity_type, entity_id)
+
+    def extract_note(self, note_id, class_id, file_path, file_type):
+        """提取笔记文件文本，写入索引的 content 列；需要在应用上下文中调用，失败时抛出异常"""
+        if not self.available or (file_type or '').lower() not in TEXT_TYPES | PDF_TYPES:
+            return
+        try:
+            with storage.local_copy(note_key(class_id, file_path)) as path:
+                content = extract_text(path, file_type.lower(), self.max_content_chars)
+            if not content:
+                return
+            with db.engine.begin() as connection:
+                connection.execute(
+                    text(f"UPDATE search_index SET content = :content WHERE {self.backend.key} = :doc_id"),
+                    {'content': index_text(content), 'doc_id': doc_id('note', note_id)}
+                )
+        except Exception:
+            metrics.inc('search_extract_failures_total')
+            raise
+
+    def rebuild(self, extract=True):
+        """重建整个索引，返回每种实体索引的数量"""
+        counts = {}
+        connection = db.session.connection()
+        connection.execute(text("DELETE FROM search_index"))
+        for entity_type, (model, *_rest) in ENTITIES.items():
+            count = 0
+            for obj in model.query.order_by(model.id).all():
+                self._upsert(connection, entity_type, obj)
+                count += 1
+            counts[entity_type] = count
+        db.session.commit()
+
+        if extract:
+            for note in Note.query.with_entities(Note.id, Note.class_id, Note.file_path, Note.file_type):
+                try:
+                    self.extract_note(*note)
+                except Exception as e:
+                    print(f"提取笔记文本失败: 笔记 {note.id} {str(e)}")
+        return counts
+
+    # ---- 查询 ----
+
+    def _filters(self, query, entity_types=None, class_ids=None, whiteboard_id=None):
+        terms = query_terms(query)
+        if not terms:
+            return None, None, None
+
+        clauses = [self.backend.match_clause]
+        params = {'query': self.backend.match_query(terms)}
+        expanding = []
+        if entity_types is not None:
+            clauses.append('entity_type IN :entity_types')
+            params['entity_types'] = list(entity_types)
+            expanding.append('entity_types')
+        if class_ids is not None:
+            clauses.append('class_id IN :class_ids')
+            params['class_ids'] = list(class_ids) or [0]
+            expanding.append('class_ids')
+        if whiteboard_id is not None:
+            clauses.append('whiteboard_id = :whiteboard_id')
+            params['whiteboard_id'] = whiteboard_id
+        return ' AND '.join(clauses), params, expanding
+
+    def _statement(self, sql, expanding):
+        return text(sql).bindparams(*[bindparam(name, expanding=True) for name in expanding])
+
+    def matching_ids(self, entity_type, query, class_ids=None, whiteboard_id=None):
+        """匹配的实体ID子查询，用于 Model.id.in_(...)；没有可检索的词时返回 None"""
+        where, params, expanding = self._filters(query, [entity_type], class_ids, whiteboard_id)
+        if where is None:
+            return None
+        statement = self._statement(f"SELECT entity_id FROM search_index WHERE {where}", expanding)
+        return statement.bindparams(**params).columns(entity_id=db.Integer)
+
+    def filter_query(self, query, entity_type, search, like_columns, class_ids=None, whiteboard_id=None):
+        """按搜索词筛选列表查询：有索引时用索引匹配，否则对 like_columns 做 LIKE 查询"""
+        model = ENTITIES[entity_type][0]
+        if not self.available:
+            search_pattern = f'%{search}%'
+            return query.filter(db.or_(*[column.like(search_pattern) for column in like_columns]))
+
+        ids = self.matching_ids(entity_type, search, class_ids, whiteboard_id)
+        if ids is None:
+            return query
+        return query.filter(model.id.in_(ids))
+
+    def search(self, query, entity_types=None, class_ids=None, whiteboard_id=None, page=1, per_page=20):
+        """按相关度排序的分页搜索，返回 (总数, [(实体类型, 实体ID, 得分)])"""
+        where, params, expanding = self._filters(query, entity_types, class_ids, whiteboard_id)
+        if where is None:
+            return 0, []
+
+        started_at = time.monotonic()
+        total = db.session.execute(
+            self._statement(f"SELECT count(*) FROM search_index WHERE {where}", expanding), params
+        ).scalar()
+        rows = db.session.execute(self._statement(
+            f"SELECT entity_type, entity_id, {self.backend.rank_column} AS rank FROM search_index "
+            f"WHERE {where} ORDER BY rank {self.backend.rank_order} LIMIT :limit OFFSET :offset",
+            expanding
+        ), dict(params, limit=per_page, offset=(page - 1) * per_page)).all()
+        metrics.observe('search_query_seconds', time.monotonic() - started_at)
+        metrics.inc('search_queries_total')
+
+        return total, [(row.entity_type, int(row.entity_id), self.backend.score(row.rank)) for row in rows]
+
+# 创建全局实例
+search_index = SearchIndex()
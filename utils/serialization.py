@@ -0,0 +1,66 @@
+import hashlib
+from datetime import datetime
+from flask import request, jsonify, Response
+from utils.time_utils import format_china_time, to_epoch
+
+try:
+    import msgpack
+except ImportError:  # 未安装时只提供 JSON
+    msgpack = None
+
+MSGPACK_MIMETYPE = 'application/msgpack'
+
+def prepare(data, timestamps='string'):
+    """将数据中的 datetime 转换为可编码的值
+
+    timestamps='string' 时转换为北京时间字符串（与原有 JSON 接口一致），
+    timestamps='epoch' 时转换为整数 Unix 时间戳。
+    """
+    if isinstance(data, datetime):
+        return to_epoch(data) if timestamps == 'epoch' else format_china_time(data)
+    if isinstance(data, dict):
+        return {key: prepare(value, timestamps) for key, value in data.items()}
+    if isinstance(data, (list, tuple)):
+        return [prepare(item, timestamps) for item in data]
+    return data
+
+def packb(data):
+    """编码为 MessagePack（时间为整数时间戳）"""
+    return msgpack.packb(prepare(data, 'epoch'), use_bin_type=True)
+
+def unpackb(payload):
+    return msgpack.unpackb(payload, raw=False)
+
+def msgpack_available():
+    return msgpack is not None
+
+def wants_msgpack():
+    """客户端是否通过 Accept 头选择了 MessagePack"""
+    if msgpack is None:
+        return False
+    # 同等权重时优先 JSON，*/* 或未带 Accept 的旧客户端不受影响
+    best = request.accept_mimetypes.best_match(['application/json', MSGPACK_MIMETYPE])
+    return best == MSGPACK_MIMETYPE
+
+def api_response(data, status=200, cache_key=None):
+    """按内容协商返回 JSON 或 MessagePack 响应
+
+    GET 请求的成功响应带 ETag，客户端通过 If-None-Match 重新验证，
+    内容未变化时返回 304。cache_key（如字段选择）会参与 ETag 计算。
+    """
+    if wants_msgpack():
+        response = Response(packb(data), status=status, mimetype=MSGPACK_MIMETYPE)
+    else:
+        response = jsonify(prepare(data))
+        response.status_code = status
+    response.vary.add('Accept')
+
+    if status == 200 and request.method in ('GET', 'HEAD'):
+        digest = hashlib.sha1()
+        if cache_key:
+            digest.update(cache_key.encode('utf-8'))
+        digest.update(response.get_data())
+        response.set_etag(digest.hexdigest())
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.make_conditional(request)
+    return response
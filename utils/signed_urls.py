@@ -0,0 +1,42 @@
+import hashlib
+import hmac
+import time
+from urllib.parse import quote
+from flask import current_app
+
+def _secret():
+    secret = current_app.config.get('FILE_URL_SECRET') or current_app.config['SECRET_KEY']
+    # 与会话签名使用不同的派生密钥
+    return hmac.new(secret.encode('utf-8'), b'note-file-url', hashlib.sha256).digest()
+
+def _signature(class_id, path, expires):
+    message = f'{class_id}\n{path}\n{expires}'.encode('utf-8')
+    return hmac.new(_secret(), message, hashlib.sha256).hexdigest()
+
+def expiry_time(now=None):
+    """签名的过期时间
+
+    按 FILE_URL_ROUND 秒向上取整，同一时间段内生成的链接相同，
+    笔记列表的 ETag 和浏览器缓存不会因为链接变化而失效。
+    """
+    ttl = current_app.config.get('FILE_URL_TTL', 6 * 3600)
+    step = max(1, current_app.config.get('FILE_URL_ROUND', 600))
+    now = int(time.time() if now is None else now)
+    return ((now + ttl) // step + 1) * step
+
+def signed_file_url(class_id, path, expires=None):
+    """生成带签名和过期时间的文件链接，访问时无需登录会话"""
+    if expires is None:
+        expires = expiry_time()
+    signature = _signature(class_id, path, expires)
+    return f"/files/{class_id}/{quote(path)}?expires={expires}&sig={signature}"
+
+def verify_file_signature(class_id, path, expires, signature):
+    """校验签名和过期时间，不访问数据库"""
+    try:
+        expires = int(expires)
+    except (TypeError, ValueError):
+        return False
+    if expires < time.time() or not signature:
+        return False
+    return hmac.compare_digest(_signature(class_id, path, expires), signature)
@@ -0,0 +1,217 @@
+import base64
+import mimetypes
+import os
+import tempfile
+from contextlib import contextmanager
+from urllib.parse import quote
+
+try:
+    import boto3
+    from botocore.config import Config as BotoConfig
+    from botocore.exceptions import ClientError
+except ImportError:  # boto3 为可选依赖，只有使用 S3 存储时需要安装
+    boto3 = None
+
+UPLOADS_ROOT = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'uploads')
+
+def note_key(class_id, file_path):
+    """文件在存储中的键：<班级ID>/<班级目录内的相对路径>"""
+    return f"{class_id}/{file_path}"
+
+def content_disposition(download_name, as_attachment):
+    disposition = 'attachment' if as_attachment else 'inline'
+    return f"{disposition}; filename*=UTF-8''{quote(download_name)}"
+
+class LocalStorage:
+    """本地磁盘存储，键对应 uploads/ 下的相对路径"""
+
+    name = 'local'
+    supports_direct_upload = False
+
+    def __init__(self, root):
+        self.root = root
+
+    def local_path(self, key):
+        return os.path.join(self.root, *key.split('/'))
+
+    def save(self, key, source_path):
+        """把本地文件移动到键对应的位置
+
+        移动会保留源文件的修改时间，之后更新为当前时间：核对上传目录时按修改时间识别
+        正在上传的文件，闲置较久的分片上传完成时不能被当作旧的孤立文件
+        """
+        path = self.local_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(source_path, path)
+        os.utime(path)
+
+    def exists(self, key):
+        return os.path.isfile(self.local_path(key))
+
+    def size(self, key):
+        try:
+            return os.path.getsize(self.local_path(key))
+        except OSError:
+            return None
+
+    def delete(self, key):
+        """删除文件，返回释放的字节数"""
+        path = self.local_path(key)
+        if not os.path.exists(path):
+            return 0
+        size = os.path.getsize(path)
+        os.remove(path)
+        return size
+
+    def open(self, key):
+        return open(self.local_path(key), 'rb')
+
+    @contextmanager
+    def local_copy(self, key):
+        yield self.local_path(key)
+
+    def download_url(self, key, download_name=None, mimetype=None, as_attachment=False):
+        return None
+
+class S3Storage:
+    """S3 兼容的对象存储（AWS S3、MinIO 等）
+
+    下载时重定向到预签名链接，文件内容不经过应用服务器；
+    客户端也可以通过预签名链接直接把文件上传到内容寻址的键下。
+    """
+
+    name = 's3'
+    supports_direct_upload = True
+
+    def __init__(self, bucket, prefix='', endpoint_url=None, public_endpoint_url=None,
+                 region=None, access_key=None, secret_key=None, url_ttl=300):
+        if boto3 is None:
+            raise RuntimeError('使用 S3 存储需要安装 boto3')
+
+        self.bucket = bucket
+        self.prefix = prefix.strip('/') + '/' if prefix.strip('/') else ''
+        self.url_ttl = url_ttl
+
+        def client(endpoint):
+            return boto3.client(
+                's3',
+                endpoint_url=endpoint,
+                region_name=region,
+                aws_access_key_id=access_key,
+                aws_secret_access_key=secret_key,
+                # MinIO 等自建服务使用路径形式的地址
+                config=BotoConfig(signature_version='s3v4', s3={'addressing_style': 'path' if endpoint else 'auto'})
+            )
+
+        self.client = client(endpoint_url)
+        # 生成预签名链接只在本地计算签名；应用访问的内网地址与客户端访问的地址可以不同
+        self.sign_client = client(public_endpoint_url) if public_endpoint_url else self.client
+
+    def _key(self, key):
+        return self.prefix + key
+
+    def local_path(self, key):
+        return None
+
+    def save(self, key, source_path):
+        """上传本地文件，成功后删除本地文件"""
+        mimetype = mimetypes.guess_type(key)[0] or 'application/octet-stream'
+        self.client.upload_file(source_path, self.bucket, self._key(key), ExtraArgs={'ContentType': mimetype})
+        os.remove(source_path)
+
+    def _head(self, key):
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+
+    def exists(self, key):
+        return self._head(key) is not None
+
+    def size(self, key):
+        head = self._head(key)
+        return head['ContentLength'] if head else None
+
+    def delete(self, key):
+        size = self.size(key)
+        if size is None:
+            return 0
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+        return size
+
+    def open(self, key):
+        return self.client.get_object(Bucket=self.bucket, Key=self._key(key))['Body']
+
+    @contextmanager
+    def local_copy(self, key):
+        """下载到临时文件，用于提取文本等需要本地文件的处理"""
+        temp_dir = os.path.join(UPLOADS_ROOT, '.tmp')
+        os.makedirs(temp_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=temp_dir, suffix='.download')
+        os.close(fd)
+        try:
+            self.client.download_file(self.bucket, self._key(key), temp_path)
+            yield temp_path
+        finally:
+            os.remove(temp_path)
+
+    def download_url(self, key, download_name=None, mimetype=None, as_attachment=False):
+        """预签名的下载链接，由对象存储设置 Content-Disposition 和 Content-Type"""
+        params = {'Bucket': self.bucket, 'Key': self._key(key)}
+        if download_name:
+            params['ResponseContentDisposition'] = content_disposition(download_name, as_attachment)
+        if mimetype:
+            params['ResponseContentType'] = mimetype
+        return self.sign_client.generate_presigned_url('get_object', Params=params, ExpiresIn=self.url_ttl)
+
+    def upload_url(self, key, size, sha256, mimetype):
+        """预签名的上传链接，返回 (链接, 上传时必须携带的请求头)
+
+        签名包含大小、类型和 SHA-256 校验和，对象存储会拒绝内容不符的上传。
+        """
+        checksum = base64.b64encode(bytes.fromhex(sha256)).decode('ascii')
+        url = self.sign_client.generate_presigned_url('put_object', Params={
+            'Bucket': self.bucket,
+            'Key': self._key(key),
+            'ContentLength': size,
+            'ContentType': mimetype,
+            'ChecksumSHA256': checksum
+        }, ExpiresIn=self.url_ttl)
+        return url, {'Content-Type': mimetype, 'x-amz-checksum-sha256': checksum}
+
+class NoteStorage:
+    """笔记文件存储
+
+    根据 NOTE_STORAGE_BACKEND 选择本地磁盘或 S3 兼容的对象存储，
+    其余代码通过键（<班级ID>/<相对路径>）读写文件，不直接访问 uploads 目录。
+    """
+
+    def __init__(self):
+        self.backend = LocalStorage(UPLOADS_ROOT)
+
+    def init_app(self, app):
+        if app.config.get('NOTE_STORAGE_BACKEND', 'local').lower() == 's3':
+            self.backend = S3Storage(
+                bucket=app.config['S3_BUCKET'],
+                prefix=app.config.get('S3_PREFIX', ''),
+                endpoint_url=app.config.get('S3_ENDPOINT_URL') or None,
+                public_endpoint_url=app.config.get('S3_PUBLIC_ENDPOINT_URL') or None,
+                region=app.config.get('S3_REGION') or None,
+                access_key=app.config.get('S3_ACCESS_KEY') or None,
+                secret_key=app.config.get('S3_SECRET_KEY') or None,
+                url_ttl=app.config.get('S3_PRESIGNED_URL_TTL', 300)
+            )
+        else:
+            self.backend = LocalStorage(UPLOADS_ROOT)
+
+    @property
+    def is_local(self):
+        return isinstance(self.backend, LocalStorage)
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+# 创建全局实例
+storage = NoteStorage()
@@ -0,0 +1,157 @@
+import atexit
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from utils.metrics import metrics
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow 为可选依赖，未安装时不生成缩略图
+    Image = None
+
+try:
+    import fitz  # PyMuPDF，用于渲染 PDF 首页
+except ImportError:
+    fitz = None
+
+IMAGE_TYPES = {'png', 'jpg', 'jpeg', 'gif', 'bmp'}
+PDF_TYPES = {'pdf'}
+
+def thumbnail_path(source_path, fmt='webp'):
+    """缩略图与原文件放在同一目录：<原文件名>.thumb.<格式>"""
+    root, _ = os.path.splitext(source_path)
+    return f'{root}.thumb.{fmt}'
+
+def is_thumbnail(path):
+    return '.thumb.' in os.path.basename(path)
+
+def render_thumbnail(source_path, target_path, file_type, max_size, fmt, quality):
+    """在子进程中生成缩略图，先写临时文件再替换，避免读到写了一半的文件"""
+    if file_type in PDF_TYPES:
+        with fitz.open(source_path) as document:
+            page = document[0]
+            scale = max_size / max(page.rect.width, page.rect.height)
+            pixmap = page.get_pixmap(matrix=fitz.Matrix(scale, scale), alpha=False)
+            image = Image.frombytes('RGB', (pixmap.width, pixmap.height), pixmap.samples)
+    else:
+        image = Image.open(source_path)
+        image.seek(0)  # GIF 只取第一帧
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_size, max_size))
+
+    if fmt == 'jpeg' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+
+    temp_path = f'{target_path}.{os.getpid()}.tmp'
+    image.save(temp_path, 'WEBP' if fmt == 'webp' else 'JPEG', quality=quality)
+    os.replace(temp_path, target_path)
+    return target_path
+
+class ThumbnailManager:
+    """笔记缩略图生成
+
+    上传完成后把生成任务交给有界的进程池，不阻塞请求线程；缩略图写在原文件旁边，
+    已存在时直接使用。排队的任务超过上限时放弃本次生成，下次访问缩略图时再补。
+    """
+
+    def __init__(self):
+        self.app = None
+        self.executor = None
+        self.workers = 2
+        self.max_size = 320
+        self.fmt = 'webp'
+        self.quality = 80
+        self.slots = threading.BoundedSemaphore(16)
+        self.lock = threading.Lock()
+        self.pending = set()
+
+    def init_app(self, app):
+        self.app = app
+        self.workers = max(1, app.config.get('THUMBNAIL_WORKERS', 2))
+        self.max_size = app.config.get('THUMBNAIL_MAX_SIZE', 320)
+        self.fmt = 'jpeg' if app.config.get('THUMBNAIL_FORMAT', 'webp').lower() in ('jpg', 'jpeg') else 'webp'
+        self.quality = app.config.get('THUMBNAIL_QUALITY', 80)
+        self.slots = threading.BoundedSemaphore(max(1, app.config.get('THUMBNAIL_QUEUE_SIZE', 16)))
+
+        metrics.describe('note_thumbnails_generated_total', '生成的笔记缩略图数')
+        metrics.describe('note_thumbnail_failures_total', '生成失败的笔记缩略图数')
+        metrics.describe('note_thumbnail_dropped_total', '因队列已满而放弃的缩略图任务数')
+        metrics.describe('note_thumbnail_seconds', '生成缩略图的耗时（秒）')
+        metrics.register_gauge('note_thumbnail_pending', lambda: len(self.pending))
+
+    def supports(self, file_type):
+        file_type = (file_type or '').lower()
+        if Image is None:
+            return False
+        return file_type in IMAGE_TYPES or (file_type in PDF_TYPES and fitz is not None)
+
+    def path_for(self, source_path):
+        return thumbnail_path(source_path, self.fmt)
+
+    def _executor(self):
+        with self.lock:
+            if self.executor is None:
+                # 优先用 fork 启动子进程：spawn 会在子进程中重新执行启动脚本，创建整个应用和定时任务。
+                # 子进程只做图片处理，不会用到从父进程继承的锁
+                context = None
+                if 'fork' in multiprocessing.get_all_start_methods():
+                    context = multiprocessing.get_context('fork')
+                self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+                atexit.register(self.executor.shutdown, wait=False, cancel_futures=True)
+            return self.executor
+
+    def schedule(self, source_path, file_type, wait=False):
+        """提交后台生成任务，返回 Future；已存在、不支持或队列已满时返回 None
+
+        source_path 为 None（文件保存在对象存储中）时不生成。
+        wait 为 True 时队列已满则等待空位（用于批量补生成）。
+        """
+        file_type = (file_type or '').lower()
+        if source_path is None or not self.supports(file_type) or not os.path.exists(source_path):
+            return None
+
+        target_path = self.path_for(source_path)
+        if os.path.exists(target_path):
+            return None
+
+        if not self.slots.acquire(blocking=wait):
+            metrics.inc('note_thumbnail_dropped_total')
+            return None
+        with self.lock:
+            if target_path in self.pending:
+                self.slots.release()
+                return None
+            self.pending.add(target_path)
+
+        started_at = time.monotonic()
+        try:
+            future = self._executor().submit(
+                render_thumbnail, source_path, target_path, file_type, self.max_size, self.fmt, self.quality
+            )
+        except Exception:
+            self._release(target_path)
+            raise
+
+        def done(future):
+            self._release(target_path)
+            if future.exception() is not None:
+                metrics.inc('note_thumbnail_failures_total')
+                print(f"生成缩略图失败: {source_path} {future.exception()}")
+            else:
+                metrics.inc('note_thumbnails_generated_total')
+                metrics.observe('note_thumbnail_seconds', time.monotonic() - started_at)
+
+        future.add_done_callback(done)
+        return future
+
+    def _release(self, target_path):
+        with self.lock:
+            self.pending.discard(target_path)
+        self.slots.release()
+
+# 创建全局实例
+thumbnails = ThumbnailManager()
@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 import pytz
 
 # 时区配置
@@ -26,6 +26,15 @@ def format_china_time(dt):
         # 如果出现异常，尝试简单格式化
         return dt.strftime('%Y-%m-%d %H:%M:%S') if dt else None
 
+def to_epoch(dt):
+    """将北京时间转换为 Unix 时间戳（秒）"""
+    if dt is None:
+        return None
+    
+    if dt.tzinfo is None:
+        dt = china_tz.localize(dt)
+    return int(dt.timestamp())
+
 def parse_china_time(time_str):
     """解析时间字符串为北京时间（无时区）"""
     if not time_str:
@@ -127,4 +136,47 @@ def parse_china_date(date_str):
         else:
             return parse_china_time(date_str)
     except Exception as e:
-        raise ValueError(f"日期格式无效: {date_str}")
\ No newline at end of file
+        raise ValueError(f"日期格式无效: {date_str}")
+
+def parse_date_range(date_str=None, from_str=None, to_str=None, max_days=31):
+    """解析单日（date）或日期范围（from/to，均包含当天）参数
+
+    返回 (开始时间, 结束时间（不含）, 是否为范围查询)，未指定时返回 (None, None, False)。
+    """
+    if from_str or to_str:
+        if not from_str:
+            raise ValueError('日期范围需要 from 参数')
+        try:
+            start = parse_china_date(from_str)
+            end = parse_china_date(to_str or from_str) + timedelta(days=1)
+        except ValueError:
+            raise ValueError('日期格式无效，请使用YYYY-MM-DD格式')
+        if end <= start:
+            raise ValueError('结束日期不能早于开始日期')
+        if (end - start).days > max_days:
+            raise ValueError(f'日期范围不能超过{max_days}天')
+        return start, end, True
+    
+    if date_str:
+        try:
+            start = parse_china_time(date_str + ' 00:00:00')
+        except ValueError:
+            raise ValueError('日期格式无效，请使用YYYY-MM-DD格式')
+        return start, start + timedelta(days=1), False
+    
+    return None, None, False
+
+def group_by_day(rows, start, end):
+    """将 (时间, 数据) 列表按天分组，返回从 start 到 end 的每一天（包括没有数据的日期）"""
+    days = {}
+    day = start
+    while day < end:
+        days[format_china_date(day)] = []
+        day += timedelta(days=1)
+    
+    for dt, item in rows:
+        key = format_china_date(dt)
+        if key in days:
+            days[key].append(item)
+    
+    return [{'date': key, 'data': items, 'count': len(items)} for key, items in days.items()]
\ No newline at end of file
@@ -0,0 +1,86 @@
+import io
+import zipfile
+from contextlib import closing
+from datetime import datetime
+
+READ_BLOCK_SIZE = 64 * 1024
+
+# 已压缩的格式直接存储，再压缩几乎不会变小，只会占用 CPU
+STORED_TYPES = {
+    'png', 'jpg', 'jpeg', 'gif', 'webp',
+    'pdf',
+    'pptx', 'docx', 'xlsx',
+    'zip', 'rar', '7z', 'gz',
+    'icstk',
+}
+
+class _StreamBuffer(io.RawIOBase):
+    """只能追加写入的缓冲区，zipfile 写入的数据由生成器取走后清空
+
+    不支持 tell/seek，zipfile 会按不可定位的流写入：文件头之后用数据描述符记录大小和 CRC。
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def zip_entry_name(name, used):
+    """压缩包内不重复的文件名，重名时在扩展名前加序号"""
+    name = name.replace('\\', '/').strip('/') or 'file'
+    if name not in used:
+        used.add(name)
+        return name
+
+    stem, dot, ext = name.rpartition('.')
+    if not dot or '/' in ext:
+        stem, ext = name, ''
+    index = 2
+    while True:
+        candidate = f"{stem} ({index}).{ext}" if ext else f"{stem} ({index})"
+        if candidate not in used:
+            used.add(candidate)
+            return candidate
+        index += 1
+
+def stream_zip(entries):
+    """边读文件边生成 ZIP 数据，不使用临时文件，也不在内存中保留整个压缩包
+
+    entries 为 (压缩包内的文件名, 文件大小, 修改时间, 打开文件的函数) 的可迭代对象，
+    打开函数返回可 read() 的二进制流；打开失败的文件跳过。
+    """
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, size, modified_at, open_file in entries:
+            try:
+                source = open_file()
+            except Exception as e:
+                print(f"打包时跳过文件: {name} {str(e)}")
+                continue
+
+            info = zipfile.ZipInfo(name, date_time=(modified_at or datetime.now()).timetuple()[:6])
+            ext = name.rsplit('.', 1)[-1].lower() if '.' in name else ''
+            info.compress_type = zipfile.ZIP_STORED if ext in STORED_TYPES else zipfile.ZIP_DEFLATED
+            # 预先给出大小，超过 4GB 时使用 ZIP64 格式的文件头
+            info.file_size = size
+
+            with closing(source), archive.open(info, 'w') as target:
+                for block in iter(lambda: source.read(READ_BLOCK_SIZE), b''):
+                    target.write(block)
+                    data = buffer.take()
+                    if data:
+                        yield data
+            yield buffer.take()
+
+    # 中央目录在关闭压缩包时写入
+    yield buffer.take()